@@ -1,6 +1,5 @@
 # type: ignore
 
-from .taggers import StanzaTagger, StanzaTaggerFactory
 from .utility import (
     check_cuda,
     expand_basenames,
@@ -10,3 +9,14 @@ from .utility import (
     sparv_datadir,
     stanza_dir,
 )
+
+# The tagger stack (stanza, torch) is imported on first use, not when e.g. the Snakefile imports this package
+_LAZY_ATTRIBUTES: dict[str, str] = {'StanzaTagger': 'taggers', 'StanzaTaggerFactory': 'taggers'}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        import importlib  # pylint: disable=import-outside-toplevel
+
+        return getattr(importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
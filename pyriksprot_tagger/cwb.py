@@ -1,236 +1,498 @@
-# Convert a pandas data frame to a CWB corpus.
-
+from __future__ import annotations
+
+import glob
+import gzip
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from os.path import basename, isdir
+from os.path import join as jj
+from typing import Any, Iterable, Iterator, TextIO
+
+import numpy as np
 import pandas as pd
+from loguru import logger
+from pyriksprot import interface
+from pyriksprot.corpus.tagged import persist
+from pyriksprot.utility import xml_escape
 
+from . import storage
 
-def df_to_vrt(df: pd.DataFrame, corpus_name, cwb_dir):  # pylint: disable=unused-argument
-    """This function converts a pandas data frame with columns token, lemma and pos to a VRT representation.
-    The columns in df are assumed to be named token, lemma and pos.
-    """
-
-
-# This function converts a pandas data frame with columns token, lemma and pos to a CWB corpus.
-
-
-def df_to_cwb(df: pd.DataFrame, column_specs: dict) -> str:  # pylint: disable=unused-argument
-    """To convert a text corpus to the CWB format, you would need to follow these general steps:
-
-    1. Install CWB: First, you need to install the Corpus Workbench software suite on your system. You can download the CWB from the official website (https://cwb.sourceforge.io/) and follow the installation instructions provided for your specific operating system.
-
-    2. Prepare your corpus: Organize your text corpus in a format suitable for CWB.
-        Each text document should be stored as a separate file.
-        Make sure your corpus files are encoded in a compatible character encoding (such as UTF-8) to avoid any encoding issues.
-
-    3. Create a corpus configuration file: In CWB, a corpus is defined by a configuration file that specifies the
-       structure and attributes of the corpus. The configuration file is typically written in
-       the Corpus Query Processor Markup Language (CQP-XML).
-       You need to create a configuration file that describes your corpus's structure, including the tokenization rules,
-       linguistic attributes, and any additional metadata you want to associate with the corpus.
-
-    4. Compile the corpus: Use the CWB tools to compile your corpus into the CWB format. The primary tool for this task is `cwb-encode`. It takes your corpus files and the configuration file as input and generates the index files and data files required for the CWB format. The specific command may vary depending on your operating system, but it generally follows this structure:
-
-    ```
-    cwb-encode -c <corpus_name> -f <config_file> -d <data_dir> <corpus_files>
-    ```
-
-    Replace `<corpus_name>` with the desired name for your corpus, `<config_file>` with the path to your corpus configuration file, `<data_dir>` with the directory where you want to store the compiled corpus files, and `<corpus_files>` with the path to your corpus text files.
-
-    5. Verify and index the corpus: After compiling, you need to verify the compiled corpus using `cwb-makeall`. This tool checks the integrity of the corpus and generates the necessary index files for efficient querying and analysis. The command typically looks like:
-
-    ```
-    cwb-makeall -r <corpus_name>
-    ```
-
-    Replace `<corpus_name>` with the name of your compiled corpus.
-
-    6. Query and analyze: Once your corpus is compiled and indexed, you can use various CWB tools and utilities to query and analyze the corpus, such as `cqp`, `cwb-scan`, `cwb- concordance`, etc. These tools allow you to search for specific linguistic patterns, retrieve concordances, perform statistical analyses, and more.
+"""Export of tagged protocols to CWB, as VRT (verticalized text) or as an encoded corpus.
 
-    Note that the above steps provide a general outline of the process, and the specific commands and options may vary depending on your operating system and the version of CWB you are using. It's recommended to consult the CWB documentation and user guides for detailed instructions and examples specific to your setup.
-    """
+Each year folder of tagged protocols is streamed into a gzip-compressed VRT file:
 
-    """
-    Certainly! Here's an example of a Corpus Query Processor Markup Language (CQP-XML) file:
-    ```xml
-    <?xml version="1.0" encoding="UTF-8"?>
-    <!DOCTYPE cwb-data SYSTEM "cwbdata.dtd">
-
-    <cwb-data>
-    <basic-encoding>UTF-8</basic-encoding>
-    <text>
-        <attribute name="word" type="string" />
-        <attribute name="pos" type="string" />
-        <attribute name="lemma" type="string" />
+    <text id="1970" year="1970">
+    <protocol title="prot-1970--ak--001" date="1970-01-12">
+    <speech id="i-..." who="..." speaker_note_id="..." page_number="1">
+    <s>
+    token   lemma   pos     xpos
+    </s>
+    </speech>
+    </protocol>
     </text>
-    <meta-information>
-        <attribute name="author" type="string" />
-        <attribute name="year" type="integer" />
-    </meta-information>
-    </cwb-data>
-    ```
-
-    Let's go through the components of this CQP-XML file:
-
-    - The `basic-encoding` element specifies the character encoding used in the corpus. In this example, it is set to UTF-8.
-
-    - The `text` element defines the linguistic attributes or features of the corpus texts. In this case, we have three attributes: `word`, `pos` (part-of-speech), and `lemma` (base form of the word). Each attribute has a name and a type. The type can be "string," "integer," "float," or "boolean," depending on the nature of the attribute.
-
-    - The `meta-information` section allows you to define additional metadata attributes for the corpus. In this example, we have two attributes: `author` and `year`. The `author` attribute stores the name of the author associated with each text, and the `year` attribute stores the publication year of each text. The `type` for `author` is "string," and the `type` for `year` is "integer."
-
-    This is a simple example to illustrate the structure of a CQP-XML file. In a real corpus configuration, you can define more attributes and specify additional information as per your corpus requirements. The CQP-XML file serves as a blueprint for CWB to understand the structure and attributes of your corpus during compilation and querying.
-"""
-
 
+Protocols are read one at a time, and written one speech at a time (Parquet archives are read one row group,
+i.e. one speech, at a time), so memory is bounded by the largest protocol regardless of the corpus size.
 """
-Certainly! Here's an example of a corpus document that aligns with the previously mentioned CQP-XML configuration, including the "sentence" attribute:
-
-sql
-Copy code
-word    pos     lemma    sentence
----------------------------------
-This    DET     this     s1
-is      VERB    be       s1
-the     DET     the      s1
-first   ADJ     first    s1
-sentence NOUN    sentence s1
-
-Here    ADV     here     s2
-is      VERB    be       s2
-the     DET     the      s2
-second  ADJ     second   s2
-sentence NOUN    sentence s2
-
-In this example, we have two sentences, each with five words. The "word," "pos," "lemma," and "sentence"
-attributes are aligned in separate columns. The values in the "sentence" column indicate the sentence
-identifier to which each word belongs.
-
-Here's a breakdown of the document structure:
-
-The "word" column represents the individual words in the corpus.
-The "pos" column contains the part-of-speech tags for each word.
-The "lemma" column provides the lemmatized form of each word.
-The "sentence" column specifies the sentence identifier for each word.
-Note that this is a simplified example, and in a real corpus, you would typically have many more sentences and a larger vocabulary. Each row in the corpus document corresponds to a word token in the corpus, and the attributes provide additional linguistic information associated with each word.
-
-When you compile this corpus document along with the corresponding CQP-XML configuration file using the CWB tools,
-CWB will generate the index and data files necessary for efficient querying and analysis of the corpus at
-the word and sentence levels.
-
-
-
 
-When using CWB tools to compile your corpus, make sure to specify the appropriate options
-to handle tab-separated values. For example, you might need to use the --input-separator '\t' 
-flag to indicate that the input file uses tabs as separators.
-
-Regenerate response
-
-Yes, you can supply a vocabulary mapping that maps each word to a unique word ID when working with the Corpus Workbench (CWB). This can be useful for various purposes, such as efficient storage, indexing, and querying of your corpus.
-
-To supply a vocabulary mapping, you typically use a separate file that associates each word with its corresponding word ID. The format of this file can vary depending on your specific needs, but a common approach is to use a tab-separated values (TSV) or a CSV file.
-
-Here's an example of how your vocabulary mapping file might look in a TSV format:
-
-```
-word    word_id
---------------
-This    1
-is      2
-the     3
-first   4
-sentence 5
-Here    6
-second  7
-```
-
-In this example, the "word" column contains the individual words from your corpus, and the "word_id" column corresponds to the unique ID assigned to each word. The file should include mappings for all the words present in your corpus.
-
-When you compile your corpus using the CWB tools, you can specify the vocabulary mapping file to ensure that the word IDs are correctly assigned. The specific command or option to provide the vocabulary mapping file may vary depending on the CWB tools you are using.
-
-By supplying a vocabulary mapping, CWB can efficiently store and index your corpus using the word IDs rather than the actual words. This can improve storage efficiency and speed up various corpus queries and analyses.
-
-Can I use word-id in the corpus document file?
-
-No, in the corpus document file itself, you should generally use the actual words rather than word IDs. The corpus document file typically contains the text data of your corpus in a human-readable format.
-
-Using word IDs directly in the corpus document file would make it less interpretable and harder to work with. The purpose of the word ID is to serve as an internal identifier within the Corpus Workbench (CWB) system, enabling efficient indexing and querying of the corpus. However, it is not meant to be used directly in the corpus document file itself.
-
-Instead, the word IDs are used in the indexing and data files generated by CWB during the compilation process. The mapping between words and their corresponding word IDs is maintained separately, typically in a vocabulary mapping file (as mentioned in the previous response).
-
-So, in the corpus document file, it is recommended to use the actual words as they appear in the text. This ensures that the corpus remains readable and understandable to humans, while the word IDs are used behind the scenes by CWB for indexing and querying purposes.
-
-Should I supply a vocabulary for lemma as well?
-
-Supplying a vocabulary for lemmas in addition to words can be beneficial in certain linguistic analyses and querying scenarios. It allows you to efficiently handle lemmatized forms of words and enables advanced linguistic processing.
-
-Including a vocabulary for lemmas is particularly useful in cases where you want to perform lemma-based queries or analyze patterns based on lemma frequency rather than surface word forms. By mapping lemmas to unique lemma IDs, you can enhance the efficiency of lemma-based operations within the Corpus Workbench (CWB).
-
-The vocabulary mapping file for lemmas follows a similar structure to the word vocabulary mapping file. It associates each lemma with its corresponding lemma ID. Here's an example of how the lemma vocabulary mapping file might look:
-
-```
-lemma    lemma_id
-----------------
-this     1
-be       2
-the      3
-first    4
-sentence 5
-here     6
-second   7
-```
-
-In this example, the "lemma" column represents the lemmatized forms of words, while the "lemma_id" column contains the corresponding lemma IDs.
-
-When compiling your corpus using CWB, you can provide both the word and lemma vocabulary mapping files to ensure that word forms and lemmas are correctly identified and associated with their respective IDs. This allows you to leverage the benefits of lemma-based analysis and querying within the CWB framework.
-
-Should I supply a vocabulary for lemma as well?
-
-Supplying a translation for part-of-speech (POS) tags to POS IDs can be helpful in certain linguistic analyses and queries, especially when you want to perform POS-based operations or examine patterns based on POS frequencies.
-
-Similar to the word and lemma vocabularies, a POS vocabulary mapping can be created to associate each POS tag with its corresponding POS ID. Here's an example of how the POS vocabulary mapping file might look:
-
-```
-pos    pos_id
--------------
-DET    1
-VERB   2
-ADJ    3
-NOUN   4
-ADV    5
-```
-
-In this example, the "pos" column contains the POS tags, such as determiners (DET), verbs (VERB), adjectives (ADJ), nouns (NOUN), and adverbs (ADV). The "pos_id" column contains the corresponding POS IDs assigned to each POS tag.
-
-Including a POS vocabulary mapping allows you to efficiently represent and query POS-related information in your corpus. It can be used to analyze POS distributions, perform POS-based searches, or combine POS patterns with other linguistic features in complex queries.
-
-When compiling your corpus using CWB, you can provide the POS vocabulary mapping file along with the word and lemma vocabulary files to ensure that POS tags are associated with their respective IDs correctly.
-
-Keep in mind that the decision to include a POS vocabulary mapping depends on the specific needs of your linguistic analysis or research. If your analysis does not heavily rely on POS-based operations, it may not be necessary to include a POS vocabulary mapping.
-
-Does CWB accept compressed files?
+VRT_COLUMNS: list[str] = ['token', 'lemma', 'pos', 'xpos']
+
+SENTENCE_END_TAGS: set[str] = {'MAD'}
+
+# Same as `taggers.stanza_tagger.SENTENCE_MARKER` (not imported to keep export workers free of Stanza/torch)
+SENTENCE_MARKER: str = "--SENTENCE--"
+
+
+@dataclass
+class VrtStats:
+    """Number of exported entities in a VRT file."""
+
+    target: str
+    protocols: int = 0
+    speeches: int = 0
+    sentences: int = 0
+    tokens: int = 0
+
+
+def _attribs(**attribs) -> str:
+    return " ".join(f'{k}="{xml_escape(str(v if v is not None else ""))}"' for k, v in attribs.items())
+
+
+def protocol_attribs(metadata: dict) -> dict[str, Any]:
+    return dict(title=metadata.get("name"), date=metadata.get("date"))
+
+
+def speech_attribs(first: interface.Utterance) -> dict[str, Any]:
+    return dict(id=first.u_id, who=first.who, speaker_note_id=first.speaker_note_id, page_number=first.page_number)
+
+
+def sentences_of(annotation: dict[str, list[str]]) -> Iterator[list[tuple[str, ...]]]:
+    """Split a parsed annotation into sentences of VRT rows.
+
+    Sentence boundaries are taken from (in order of preference) `sentence_id`, sentence marker tokens, or
+    sentence final punctuation (`MAD`) when the tagger ran without sentence splitting."""
+    num_tokens: int = len(annotation.get('token', []))
+    columns: list[list[str]] = [annotation.get(name) or [''] * num_tokens for name in VRT_COLUMNS]
+    sentence_ids: list[str] = annotation.get('sentence_id')
+    sentence: list[tuple[str, ...]] = []
+    previous_id: str = None
+
+    for i, row in enumerate(zip(*columns)):
+        if row[0] == SENTENCE_MARKER:
+            if sentence:
+                yield sentence
+            sentence = []
+            continue
+        if sentence_ids is not None:
+            if sentence and sentence_ids[i] != previous_id:
+                yield sentence
+                sentence = []
+            previous_id = sentence_ids[i]
+        sentence.append(row)
+        if sentence_ids is None and row[3] in SENTENCE_END_TAGS:
+            yield sentence
+            sentence = []
+
+    if sentence:
+        yield sentence
+
+
+def speech_to_vrt(utterances: list[interface.Utterance], fp: TextIO) -> tuple[int, int]:
+    """Write a speech (consecutive utterances) as VRT to `fp`. Return number of sentences and tokens."""
+    first: interface.Utterance = utterances[0]
+    num_sentences, num_tokens = 0, 0
+    fp.write(f'<speech {_attribs(**speech_attribs(first))}>\n')
+    for u in utterances:
+        for sentence in sentences_of(storage.parse_annotation(u.annotation)):
+            fp.write('<s>\n')
+            fp.write(''.join('\t'.join(xml_escape(v) for v in row) + '\n' for row in sentence))
+            fp.write('</s>\n')
+            num_sentences += 1
+            num_tokens += len(sentence)
+    fp.write('</speech>\n')
+    return num_sentences, num_tokens
+
+
+def _parquet_speeches(filename: str, metadata: dict) -> Iterator[list[interface.Utterance]]:
+    """Read a Parquet archive one row group (speech) at a time."""
+    with zipfile.ZipFile(filename, 'r') as zp:
+        parquet_file = storage.pq.ParquetFile(io.BytesIO(zp.read(f"{metadata['name']}.{storage.PARQUET}")))
+    tagged_columns: list[str] = [n for n in storage.TAGGED_COLUMNS if n in parquet_file.schema_arrow.names]
+    columns: list[str] = storage.UTTERANCE_COLUMNS + tagged_columns
+    for i in range(parquet_file.num_row_groups):
+        utterances: list[interface.Utterance] = []
+        for row in parquet_file.read_row_group(i, columns=columns).to_pylist():
+            annotation: dict[str, list[Any]] = {name: [str(v) for v in row.pop(name)] for name in tagged_columns}
+            utterances.append(interface.Utterance(**row, annotation=storage.to_annotation(annotation)))
+        if utterances:
+            yield utterances
+
+
+def iter_speeches(filename: str) -> tuple[dict, Iterator[list[interface.Utterance]]]:
+    """Return protocol metadata and an iterator over the speeches of a tagged protocol archive."""
+    metadata: dict = persist.load_metadata(filename)
+    if metadata is None:
+        return None, iter([])
+    if metadata.get('storage_format') == storage.PARQUET:
+        if storage.pq is None:
+            raise ModuleNotFoundError("parquet storage format requires pyarrow")
+        return metadata, _parquet_speeches(filename, metadata)
+    protocol: interface.Protocol = persist.load_protocol(filename)
+    return metadata, iter(storage.speech_groups(protocol.utterances if protocol else []))
+
+
+def protocols_to_vrt(filenames: Iterable[str], fp: TextIO, stats: VrtStats) -> VrtStats:
+    """Stream tagged protocol archives as VRT to `fp`."""
+    for filename in filenames:
+        metadata, speeches = iter_speeches(filename)
+        if metadata is None:
+            logger.warning(f"skipping {filename} (not a tagged protocol)")
+            continue
+        fp.write(f'<protocol {_attribs(**protocol_attribs(metadata))}>\n')
+        for speech in speeches:
+            num_sentences, num_tokens = speech_to_vrt(speech, fp)
+            stats.speeches += 1
+            stats.sentences += num_sentences
+            stats.tokens += num_tokens
+        fp.write('</protocol>\n')
+        stats.protocols += 1
+    return stats
+
+
+def year_to_vrt(source_folder: str, target: str) -> VrtStats:
+    """Export all tagged protocols in a year folder to a (gzipped if target ends with `.gz`) VRT file."""
+    year: str = basename(source_folder.rstrip(os.sep))
+    filenames: list[str] = sorted(glob.glob(jj(source_folder, "*.zip")))
+    stats: VrtStats = VrtStats(target=target)
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    with gzip.open(target, 'wt', encoding='utf-8') if target.endswith('.gz') else open(
+        target, 'w', encoding='utf-8'
+    ) as fp:
+        fp.write(f'<text {_attribs(id=year, year=year)}>\n')
+        protocols_to_vrt(filenames, fp, stats)
+        fp.write('</text>\n')
+    return stats
+
+
+def _year_to_vrt(args: tuple[str, str]) -> VrtStats:
+    return year_to_vrt(*args)
+
+
+def corpus_to_vrt(source_folder: str, target_folder: str, processes: int = 1) -> list[VrtStats]:
+    """Export tagged protocols in `source_folder/{year}/*.zip` to `target_folder/{year}.vrt.gz`.
+
+    Year folders are exported in parallel by `processes` workers, each streaming a single year at a time."""
+    year_folders: list[str] = sorted(f for f in glob.glob(jj(source_folder, "*")) if isdir(f))
+    jobs: list[tuple[str, str]] = [(f, jj(target_folder, f"{basename(f)}.vrt.gz")) for f in year_folders]
+
+    if processes <= 1 or len(jobs) <= 1:
+        results: list[VrtStats] = [_year_to_vrt(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(processes, len(jobs)), mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = list(executor.map(_year_to_vrt, jobs))
+
+    for stats in results:
+        logger.info(f"{stats.target}: {stats.protocols} protocols, {stats.speeches} speeches, {stats.tokens} tokens")
+
+    return results
+
+
+def df_to_vrt(df: pd.DataFrame, columns: list[str] = None) -> str:
+    """This function converts a pandas data frame with columns token, lemma and pos to a VRT representation.
+    The columns in df are assumed to be named token, lemma and pos.
+    """
+    columns = columns or [c for c in VRT_COLUMNS if c in df.columns]
+    return ''.join('\t'.join(xml_escape(str(v)) for v in row) + '\n' for row in df[columns].itertuples(index=False))
 
-Yes, the Corpus Workbench (CWB) supports working with compressed corpus files.
-CWB provides functionality to handle compressed files, allowing you to work with corpora
-stored in compressed formats such as gzip (.gz) or bzip2 (.bz2).
 
-When compiling your corpus with the CWB tools, you can specify the compressed corpus file as the input file. The CWB tools can automatically handle decompression during the compilation process, allowing you to work with the corpus seamlessly.
+"""Native CWB encoding.
 
-Here's an example of how you can compile a compressed corpus file using CWB:
+Writes the binary files of an (uncompressed) CWB corpus directly from the tagged protocols, i.e. what
+`cwb-encode` + `cwb-makeall` produce from the VRT export. For each positional attribute:
 
-```
-cwb-encode -d <corpus_directory> -f <cqp-xml_file> -R <registry_file> <corpus_file.gz>
-```
+    {att}.lexicon       null-terminated strings, ids in order of first occurrence
+    {att}.lexicon.idx   offset of each string in the lexicon
+    {att}.lexicon.srt   ids sorted by (bytewise) string
+    {att}.corpus        id at each corpus position
+    {att}.corpus.cnt    frequency of each id
+    {att}.corpus.rev    corpus positions grouped by id (reverse index)
+    {att}.corpus.rdx    offset of each id's positions in the reverse index
 
-In this example, `<corpus_file.gz>` represents your compressed corpus file. CWB will handle the decompression during the encoding process.
+For each structural attribute `{s}.rng` holds (start, end) pairs, and each annotation `{s}_{key}` has the
+same ranges plus `.avs` (null-terminated unique values) and `.avx` (region, value offset) pairs. All integers
+are 32-bit big-endian (network order). The corpus is streamed once, writing the corpus stream of each positional
+attribute into a growing memory-mapped file, and the reverse indexes are then computed from the memory-mapped
+corpus streams (one process per attribute).
 
-Similarly, when querying a corpus, you can specify the compressed corpus file as the input to the CWB query tools, and they will handle the decompression transparently.
+See https://cwb.sourceforge.io/files/CWB_Encoding_Tutorial.pdf
+"""
 
-It's worth noting that while CWB supports compressed files, the compression itself does not enhance the query performance or speed. During the querying process, the compressed corpus files will be temporarily decompressed in memory to perform the necessary operations. The advantage of using compressed files lies in reducing the disk space required to store the corpus, especially for large corpora.
+POSITIONAL_ATTRIBUTES: dict[str, str] = {'word': 'token', 'lemma': 'lemma', 'pos': 'pos', 'xpos': 'xpos'}
 
-Therefore, if storage space is a concern, using compressed corpus files with CWB can be a practical solution.
+STRUCTURAL_ATTRIBUTES: dict[str, list[str]] = {
+    'text': ['id', 'year'],
+    'protocol': ['title', 'date'],
+    'speech': ['id', 'who', 'speaker_note_id', 'page_number'],
+    's': [],
+}
 
-"""
-"""
+UNDEF_VALUE: str = "__UNDEF__"
 
-https://github.com/cran/rcqp/blob/master/src/cwb/man/cwb-decode.pod
+CWB_INT: np.dtype = np.dtype('>i4')
+CHUNK_SIZE: int = 1 << 20
 
-"""
+
+def text_attribs(year: str) -> dict[str, Any]:
+    return dict(id=year, year=year)
+
+
+def iter_corpus(source_folder: str) -> Iterator[tuple[dict[str, dict], list[tuple[str, ...]]]]:
+    """Yield (regions, sentence) for each sentence of the tagged protocols in `source_folder/{year}/*.zip`.
+
+    `regions` maps each structural attribute to the attributes of the enclosing region, the same dict
+    instance is yielded for all sentences within a region. Corpus order is the same as in the VRT export."""
+    for year_folder in sorted(f for f in glob.glob(jj(source_folder, "*")) if isdir(f)):
+        text: dict = text_attribs(basename(year_folder))
+        for filename in sorted(glob.glob(jj(year_folder, "*.zip"))):
+            metadata, speeches = iter_speeches(filename)
+            if metadata is None:
+                continue
+            protocol: dict = protocol_attribs(metadata)
+            for utterances in speeches:
+                speech: dict = speech_attribs(utterances[0])
+                for u in utterances:
+                    for sentence in sentences_of(storage.parse_annotation(u.annotation)):
+                        yield {'text': text, 'protocol': protocol, 'speech': speech, 's': {}}, sentence
+
+
+def _write_ints(filename: str, values: Iterable[int] | np.ndarray) -> None:
+    """Write integers as 32-bit big-endian through a memory-mapped file (arrays are copied in chunks)."""
+    values = values if isinstance(values, np.ndarray) else np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        open(filename, 'wb').close()  # pylint: disable=consider-using-with
+        return
+    if values.max() > np.iinfo(np.int32).max:
+        raise ValueError(f"{filename}: value exceeds 32-bit CWB limit")
+    data: np.memmap = np.memmap(filename, dtype=CWB_INT, mode='w+', shape=(values.size,))
+    for i in range(0, values.size, CHUNK_SIZE):
+        data[i : i + CHUNK_SIZE] = values[i : i + CHUNK_SIZE]
+    data.flush()
+    del data
+
+
+def _read_ints(filename: str) -> np.ndarray:
+    """Memory-map a file of 32-bit big-endian integers."""
+    if os.path.getsize(filename) == 0:
+        return np.zeros(0, dtype=CWB_INT)
+    return np.memmap(filename, dtype=CWB_INT, mode='r')
+
+
+class IntStream:
+    """Append integers to a file of 32-bit big-endian integers through a memory map.
+
+    The file is pre-sized `capacity` integers, grown by doubling when full, and truncated to the written size
+    on close."""
+
+    def __init__(self, filename: str, capacity: int = CHUNK_SIZE):
+        self.filename: str = filename
+        self.size: int = 0
+        self.data: np.memmap = np.memmap(filename, dtype=CWB_INT, mode='w+', shape=(max(capacity, 1),))
+
+    def _resize(self, capacity: int) -> None:
+        self.data.flush()
+        self.data = None
+        with open(self.filename, 'r+b') as fp:
+            fp.truncate(capacity * CWB_INT.itemsize)
+        self.data = np.memmap(self.filename, dtype=CWB_INT, mode='r+', shape=(capacity,))
+
+    def extend(self, values: list[int]) -> None:
+        if self.size + len(values) > len(self.data):
+            self._resize(max(2 * len(self.data), self.size + len(values)))
+        self.data[self.size : self.size + len(values)] = values
+        self.size += len(values)
+
+    def close(self) -> None:
+        self.data.flush()
+        self.data = None
+        with open(self.filename, 'r+b') as fp:
+            fp.truncate(self.size * CWB_INT.itemsize)
+
+
+def _offsets(sizes: Iterable[int]) -> np.ndarray:
+    sizes = np.asarray(list(sizes), dtype=np.int64)
+    return np.concatenate(([0], np.cumsum(sizes)[:-1])) if sizes.size else sizes
+
+
+def _write_strings(filename: str, strings: list[bytes]) -> np.ndarray:
+    """Write null-terminated strings. Return offset of each string."""
+    with open(filename, 'wb') as fp:
+        fp.write(b''.join(x + b'\0' for x in strings))
+    return _offsets(len(x) + 1 for x in strings)
+
+
+def write_lexicon(data_folder: str, attribute: str, lexicon: Iterable[str]) -> None:
+    """Write lexicon (strings in id order) of positional `attribute`."""
+    path: str = jj(data_folder, attribute)
+    _write_ints(f"{path}.lexicon.idx", _write_strings(f"{path}.lexicon", [x.encode('utf-8') for x in lexicon]))
+
+
+def index_positional(data_folder: str, attribute: str) -> int:
+    """Write sorted lexicon, frequencies and reverse index (i.e. `cwb-makeall`) of positional `attribute` from
+    its lexicon and (memory-mapped) corpus stream. Return corpus size."""
+    path: str = jj(data_folder, attribute)
+    with open(f"{path}.lexicon", 'rb') as fp:
+        strings: list[bytes] = fp.read().split(b'\0')[:-1]
+    ids: np.ndarray = _read_ints(f"{path}.corpus")
+    counts: np.ndarray = np.zeros(len(strings), dtype=np.int64)
+    for i in range(0, len(ids), CHUNK_SIZE):
+        counts += np.bincount(ids[i : i + CHUNK_SIZE], minlength=len(strings))
+
+    _write_ints(f"{path}.lexicon.srt", sorted(range(len(strings)), key=strings.__getitem__))
+    _write_ints(f"{path}.corpus.cnt", counts)
+    _write_ints(f"{path}.corpus.rev", np.argsort(ids, kind='stable'))
+    _write_ints(f"{path}.corpus.rdx", _offsets(counts))
+    return len(ids)
+
+
+def write_positional(data_folder: str, attribute: str, lexicon: list[str], ids: np.ndarray) -> None:
+    """Write lexicon, corpus stream and reverse index of positional `attribute`."""
+    write_lexicon(data_folder, attribute, lexicon)
+    _write_ints(jj(data_folder, f"{attribute}.corpus"), ids)
+    index_positional(data_folder, attribute)
+
+
+def write_structural(data_folder: str, attribute: str, ranges: list[tuple[int, int]], values: dict[str, list]) -> None:
+    """Write region boundaries of structural `attribute`, and its annotations."""
+    path: str = jj(data_folder, attribute)
+    _write_ints(f"{path}.rng", np.asarray(ranges, dtype=np.int64).ravel())
+    for key, key_values in values.items():
+        strings: list[bytes] = [str(v if v is not None else "").encode('utf-8') for v in key_values]
+        unique: dict[bytes, int] = dict.fromkeys(strings)
+        offsets: np.ndarray = _write_strings(f"{path}_{key}.avs", list(unique))
+        unique = dict(zip(unique, offsets))
+        _write_ints(f"{path}_{key}.rng", np.asarray(ranges, dtype=np.int64).ravel())
+        _write_ints(f"{path}_{key}.avx", [x for i, v in enumerate(strings) for x in (i, unique[v])])
+
+
+class StructuralRegions:
+    """Boundaries and annotations of the regions of all structural attributes, collected sentence by sentence."""
+
+    def __init__(self):
+        self.ranges: dict[str, list[tuple[int, int]]] = {name: [] for name in STRUCTURAL_ATTRIBUTES}
+        self.values: dict[str, dict[str, list]] = {
+            name: {k: [] for k in keys} for name, keys in STRUCTURAL_ATTRIBUTES.items()
+        }
+        self.current: dict[str, tuple[dict, int]] = {}
+
+    def add(self, regions: dict[str, dict], position: int) -> None:
+        """Add sentence starting at corpus `position` (a new region starts when its attributes instance changes)."""
+        for name, attribs in regions.items():
+            if name in self.current and self.current[name][0] is attribs:
+                continue
+            if name in self.current:
+                self.ranges[name].append((self.current[name][1], position - 1))
+            self.current[name] = (attribs, position)
+            for key in STRUCTURAL_ATTRIBUTES[name]:
+                self.values[name][key].append(attribs.get(key))
+
+    def write(self, data_folder: str, corpus_size: int) -> None:
+        for name, (_, start) in self.current.items():
+            self.ranges[name].append((start, corpus_size - 1))
+        self.current = {}
+        for name in STRUCTURAL_ATTRIBUTES:
+            write_structural(data_folder, name, self.ranges[name], self.values[name])
+
+
+def encode_corpus(source_folder: str, data_folder: str) -> int:
+    """Encode lexicons, corpus streams and structural attributes (i.e. `cwb-encode`) in a single pass over the
+    corpus. Ids of each positional attribute are streamed into a memory-mapped `{att}.corpus`. Return corpus size."""
+    columns: dict[str, int] = {a: VRT_COLUMNS.index(c) for a, c in POSITIONAL_ATTRIBUTES.items()}
+    lexicons: dict[str, dict[str, int]] = {a: {} for a in POSITIONAL_ATTRIBUTES}
+    streams: dict[str, IntStream] = {a: IntStream(jj(data_folder, f"{a}.corpus")) for a in POSITIONAL_ATTRIBUTES}
+    regions: StructuralRegions = StructuralRegions()
+    position: int = 0
+
+    try:
+        for attribs, sentence in iter_corpus(source_folder):
+            regions.add(attribs, position)
+            for attribute, stream in streams.items():
+                index, lexicon = columns[attribute], lexicons[attribute]
+                stream.extend([lexicon.setdefault(row[index] or UNDEF_VALUE, len(lexicon)) for row in sentence])
+            position += len(sentence)
+    finally:
+        for stream in streams.values():
+            stream.close()
+
+    regions.write(data_folder, position)
+    for attribute, lexicon in lexicons.items():
+        write_lexicon(data_folder, attribute, lexicon)
+
+    return position
+
+
+def _index_positional(args: tuple[str, str]) -> int:
+    return index_positional(*args)
+
+
+def write_registry(registry_folder: str, corpus_name: str, data_folder: str) -> str:
+    """Write CWB registry entry. Return filename."""
+    corpus_id: str = corpus_name.lower()
+    filename: str = jj(registry_folder, corpus_id)
+    os.makedirs(registry_folder, exist_ok=True)
+    lines: list[str] = [
+        "##",
+        f"## registry entry for corpus {corpus_id.upper()}",
+        "##",
+        "",
+        f'NAME "{corpus_name}"',
+        f"ID   {corpus_id}",
+        f"HOME {os.path.abspath(data_folder)}",
+        f"INFO {os.path.abspath(jj(data_folder, '.info'))}",
+        "",
+        '##:: charset  = "utf8"',
+        '##:: language = "sv"',
+        "",
+        *[f"ATTRIBUTE {name}" for name in POSITIONAL_ATTRIBUTES],
+        "",
+    ]
+    for name, keys in STRUCTURAL_ATTRIBUTES.items():
+        lines.extend([f"STRUCTURE {name}", *[f"STRUCTURE {name}_{key}" for key in keys]])
+    with open(filename, 'w', encoding='utf-8') as fp:
+        fp.write("\n".join(lines) + "\n")
+    return filename
+
+
+def corpus_to_cwb(
+    source_folder: str, data_folder: str, registry_folder: str = None, corpus_name: str = "riksprot", processes: int = 1
+) -> int:
+    """Encode tagged protocols in `source_folder/{year}/*.zip` as a CWB corpus in `data_folder`. Return corpus size.
+
+    The corpus is read once (see `encode_corpus`), and the reverse index of each positional attribute is then
+    computed by a separate worker process (at most `processes` in parallel)."""
+    os.makedirs(data_folder, exist_ok=True)
+    corpus_size: int = encode_corpus(source_folder, data_folder)
+    jobs: list[tuple[str, str]] = [(data_folder, a) for a in POSITIONAL_ATTRIBUTES]
+
+    if processes <= 1:
+        results: list[int] = [_index_positional(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(processes, len(jobs)), mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = list(executor.map(_index_positional, jobs))
+
+    if set(results) != {corpus_size}:
+        raise ValueError(f"CWB encoding failed: attribute sizes differ {dict(zip(POSITIONAL_ATTRIBUTES, results))}")
+
+    open(jj(data_folder, '.info'), 'a', encoding='utf-8').close()  # pylint: disable=consider-using-with
+    if registry_folder:
+        write_registry(registry_folder, corpus_name, data_folder)
+
+    logger.info(f"encoded {corpus_size} tokens in {data_folder}")
+    return corpus_size
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from os.path import isfile
+from os.path import join as jj
+from typing import Callable, overload
+
+from loguru import logger
+from pyriksprot import SwedishDehyphenator
+from pyriksprot.dehyphenation.swe_dehyphen import PARAGRAPH_MARKER, is_ignored_by_conjunction_word, merge_paragraphs
+
+from .frequency_index import FrequencyIndex, open_frequency_index
+
+"""Memoized dehyphenation preprocessor.
+
+`SwedishDehyphenator.dehyphen_text` decides, for each hyphenated word pair ("social- demokratiska"), whether to
+merge the parts or keep the hyphen. The same pairs recur throughout the corpus, so the decision is memoized in a
+bounded LRU, and each text is rewritten in a single regex pass. Word frequencies can be read from a memory-mapped
+index instead of an unpickled dict (see `frequency_index`).
+"""
+
+DASHED_WORD_PATTERN: re.Pattern = re.compile(r'\w+- \w+')
+
+
+def probe_frequencies_filename(data_folder: str, filename: str) -> str:
+    """Resolve TF `filename` as `SwedishDehyphenator` does (as is, or relative to `data_folder`)."""
+    for candidate in [filename, jj(data_folder or ".", filename)]:
+        if isfile(candidate):
+            return candidate
+    raise FileNotFoundError(f"expected TF file {filename} not found")
+
+
+class CachedDehyphenator:
+    """Dehyphen preprocessor that memoizes the merge/keep decision of each hyphenated word pair.
+
+    Note that the decision of a pair is fixed by the first time it is seen, whereas `SwedishDehyphenator` could
+    reach a different decision later on (e.g. after either part has been whitelisted by some other pair).
+    """
+
+    def __init__(self, dehyphenator: SwedishDehyphenator, cache_size: int = 1_000_000):
+        self.dehyphenator: SwedishDehyphenator = dehyphenator
+        self.decide: Callable[[str], str] = lru_cache(maxsize=cache_size)(dehyphenator.dehyphen_dashed_word)
+
+    @staticmethod
+    def create(
+        data_folder: str,
+        word_frequencies: str | dict = None,
+        cache_size: int = 1_000_000,
+        memmap_frequencies: bool = False,
+        frequency_index: str = None,
+    ) -> "CachedDehyphenator":
+        """Create dehyphenator. If `memmap_frequencies` is true and `word_frequencies` is a filename, then
+        frequencies are looked up in a memory-mapped `FrequencyIndex` if one is available: either the index next
+        to the pickle (built by the `word_frequency` rule) or `frequency_index` (built here if needed)."""
+        logger.info(f"dehyphen path: {data_folder}")
+        index: FrequencyIndex = (
+            open_frequency_index(probe_frequencies_filename(data_folder, word_frequencies), frequency_index)
+            if memmap_frequencies and isinstance(word_frequencies, str)
+            else None
+        )
+        if index is not None:
+            dehyphenator: SwedishDehyphenator = SwedishDehyphenator(data_folder=data_folder, word_frequencies={})
+            dehyphenator.word_frequencies = index
+        else:
+            dehyphenator = SwedishDehyphenator(data_folder=data_folder, word_frequencies=word_frequencies)
+        return CachedDehyphenator(dehyphenator, cache_size=cache_size)
+
+    def _replace(self, match: re.Match) -> str:
+        dashed_word: str = match.group(0)
+        if is_ignored_by_conjunction_word(dashed_word):
+            return dashed_word
+        return self.decide(dashed_word)
+
+    def dehyphen_text(self, text: str) -> str:
+        """Remove hyphens in text, same as `SwedishDehyphenator.dehyphen_text`."""
+        text = re.sub(r'\n{3,}', r'\n\n', text)
+        text = text.replace('\n\n', PARAGRAPH_MARKER)
+        text = re.sub(rf'-\s*{PARAGRAPH_MARKER}', '- ', text)
+        text = ' '.join(text.split())
+
+        if '- ' in text:
+            text = DASHED_WORD_PATTERN.sub(self._replace, text)
+
+        text = text.strip().replace(PARAGRAPH_MARKER, '\n\n')
+
+        return merge_paragraphs(text, self.dehyphenator.paragraph_merge_strategy)
+
+    def batch(self, texts: list[str]) -> list[str]:
+        """Dehyphen a list of texts (e.g. all paragraphs in a protocol)."""
+        return [self.dehyphen_text(text) for text in texts]
+
+    @overload
+    def __call__(self, text: str) -> str:
+        ...
+
+    @overload
+    def __call__(self, text: list[str]) -> list[str]:
+        ...
+
+    def __call__(self, text: str | list[str]) -> str | list[str]:
+        return self.batch(text) if isinstance(text, list) else self.dehyphen_text(text)
+
+    def cache_info(self):
+        return self.decide.cache_info()
+
+    def flush(self) -> None:
+        self.dehyphenator.flush()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+from dataclasses import dataclass, field
+from typing import Callable
+from os.path import abspath, basename, dirname, isfile, relpath
+from os.path import join as jj
+
+import pygit2
+from loguru import logger
+from pyriksprot.utility import read_yaml, strip_path_and_extension, write_yaml
+
+"""Git-diff driven incremental tagging.
+
+The corpus tag a target folder was tagged from is stored in `version.yml` (written by `tag_info`).
+Diffing that tag against the checked out corpus gives the protocols that must be (re)tagged, and
+the protocols whose tagged frames should be removed, independently of file timestamps. The corpus is
+usually a shallow clone, so the previously tagged revision is fetched (depth 1) before diffing if it is missing.
+"""
+
+VERSION_FILENAME: str = "version.yml"
+
+
+@dataclass
+class ProtocolDelta:
+    """Protocols (absolute paths) changed between two corpus revisions."""
+
+    from_ref: str
+    to_ref: str
+    updated: list[str] = field(default_factory=list)
+    deleted: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.updated) + len(self.deleted)
+
+
+def read_version_tag(folder: str, levels: int = 1) -> str | None:
+    """Read the corpus tag (or commit) stored in `version.yml` in `folder` or in up to `levels` parent folders."""
+    for _ in range(levels + 1):
+        filename: str = jj(folder, VERSION_FILENAME)
+        if isfile(filename):
+            data: dict = read_yaml(filename) or {}
+            return data.get("tag") or data.get("sha") or None
+        folder = dirname(abspath(folder))
+    return None
+
+
+def resolve_sha(source_folder: str, ref: str = "HEAD") -> str | None:
+    """Commit SHA of `ref` in the git repository that contains `source_folder`."""
+    repository_path: str = pygit2.discover_repository(abspath(source_folder))
+    if repository_path is None:
+        return None
+    try:
+        return str(pygit2.Repository(repository_path).revparse_single(ref).peel(pygit2.Commit).id)
+    except (KeyError, ValueError, pygit2.GitError):
+        return None
+
+
+def write_version_file(source_folder: str, target_folder: str) -> str | None:
+    """Write tag and commit of the corpus checked out in `source_folder` to `version.yml` in `target_folder`
+    (same keys as `tag_info`)."""
+    repository_path: str = pygit2.discover_repository(abspath(source_folder))
+    if repository_path is None:
+        logger.warning(f"incremental: {source_folder} is not in a git repository, {VERSION_FILENAME} not written")
+        return None
+    repository: pygit2.Repository = pygit2.Repository(repository_path)
+    sha: str = str(repository.head.peel(pygit2.Commit).id)
+    tag: str = next(
+        (
+            name[len("refs/tags/") :]
+            for name in repository.references
+            if name.startswith("refs/tags/") and str(repository.references[name].peel(pygit2.Commit).id) == sha
+        ),
+        "",
+    )
+    filename: str = jj(target_folder, VERSION_FILENAME)
+    os.makedirs(target_folder, exist_ok=True)
+    write_yaml(data=dict(tag=tag, ref=f"refs/tags/{tag}" if tag else "", sha=sha, sha8=sha[:8]), file=filename)
+    return filename
+
+
+def fetch_ref(workdir: str, ref: str, remote: str = "origin") -> bool:
+    """Fetch commit `ref` (a tag or a commit) from `remote` with depth 1 into the (shallow) clone in `workdir`."""
+    for refspec in [f"+refs/tags/{ref}:refs/tags/{ref}", ref]:
+        result: subprocess.CompletedProcess = subprocess.run(
+            ["git", "-C", workdir, "fetch", "--depth", "1", remote, refspec],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if result.returncode == 0:
+            logger.info(f"incremental: fetched {ref} from {remote}")
+            return True
+    logger.warning(f"incremental: unable to fetch {ref} from {remote} ({result.stderr.strip()})")
+    return False
+
+
+def glob_regex(pattern: str) -> re.Pattern:
+    """Regex matching (slash separated) paths as `glob(pattern, recursive=True)` does: `**/` matches zero or more
+    folders, `*`, `?` and `[...]` don't match across folders."""
+    parts: list[str] = []
+    i: int = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:[^/]*/)*")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+            end: int = pattern.index("]", i + 2)
+            chars: str = pattern[i + 1 : end].replace("\\", "\\\\")
+            parts.append(f"[{'^' + chars[1:] if chars.startswith('!') else chars}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(parts) + r"\Z")
+
+
+def resolve_commits(
+    repository: pygit2.Repository, from_ref: str, to_ref: str
+) -> tuple[pygit2.Commit, pygit2.Commit] | None:
+    try:
+        return (
+            repository.revparse_single(from_ref).peel(pygit2.Commit),
+            repository.revparse_single(to_ref).peel(pygit2.Commit),
+        )
+    except (KeyError, ValueError, pygit2.GitError):
+        return None
+
+
+def protocol_delta(
+    source_folder: str, from_ref: str, to_ref: str = "HEAD", pattern: str = "**/prot-*.xml", fetch: bool = False
+) -> ProtocolDelta | None:
+    """Diff `from_ref` against `to_ref` in the git repository that contains `source_folder`.
+
+    Only files matching `pattern` (relative to `source_folder`, as in `glob_source_files`) are included.
+    Renamed files are reported as a deletion plus an update. If `fetch` is true, revisions missing in the
+    repository (e.g. in a shallow clone) are fetched from origin.
+
+    Returns:
+        ProtocolDelta | None: None if the repository, or any of the revisions, cannot be resolved
+        (e.g. `from_ref` is missing in a shallow clone).
+    """
+    repository_path: str = pygit2.discover_repository(abspath(source_folder))
+    if repository_path is None:
+        logger.warning(f"incremental: {source_folder} is not in a git repository")
+        return None
+
+    repository: pygit2.Repository = pygit2.Repository(repository_path)
+    workdir: str = repository.workdir or dirname(repository_path.rstrip(os.sep))
+
+    commits: tuple[pygit2.Commit, pygit2.Commit] | None = resolve_commits(repository, from_ref, to_ref)
+    if commits is None and fetch and fetch_ref(workdir, from_ref):
+        repository = pygit2.Repository(repository_path)
+        commits = resolve_commits(repository, from_ref, to_ref)
+    if commits is None:
+        logger.warning(f"incremental: unable to resolve {from_ref}..{to_ref}")
+        return None
+    old_commit, new_commit = commits
+
+    diff: pygit2.Diff = repository.diff(old_commit, new_commit)
+    diff.find_similar()
+
+    prefix: str = relpath(abspath(source_folder), abspath(workdir))
+    prefix = "" if prefix == "." else f"{prefix.replace(os.sep, '/')}/"
+
+    # Diff paths are relative to the repository root
+    is_protocol: Callable[[str], bool] = glob_regex(f"{prefix}{pattern}").match
+
+    delta: ProtocolDelta = ProtocolDelta(from_ref=from_ref, to_ref=to_ref)
+
+    for item in diff.deltas:
+        status: str = item.status_char()
+        old_path, new_path = item.old_file.path, item.new_file.path
+        if status in ('D', 'R') and is_protocol(old_path):
+            delta.deleted.append(jj(workdir, old_path))
+        if status in ('A', 'M', 'R', 'C', 'T') and is_protocol(new_path):
+            delta.updated.append(jj(workdir, new_path))
+
+    logger.info(f"incremental: {from_ref}..{to_ref} {len(delta.updated)} updated, {len(delta.deleted)} deleted")
+
+    return delta
+
+
+def delta_target_files(
+    source_folder: str,
+    target_folder: str,
+    target_extension: str,
+    from_ref: str,
+    to_ref: str = "HEAD",
+    fetch: bool = False,
+) -> tuple[list[str], list[str]] | None:
+    """Target files (year-folder layout) to create, and to delete, for Snakemake. None if delta is unavailable.
+    Missing revisions are only fetched if `fetch` is true (the Snakefile calls this while it is parsed)."""
+    delta: ProtocolDelta = protocol_delta(source_folder, from_ref, to_ref, fetch=fetch)
+    if delta is None:
+        return None
+
+    def target_file(source_file: str) -> str:
+        year: str = basename(dirname(source_file))
+        return jj(target_folder, year, f"{strip_path_and_extension(source_file)}.{target_extension}")
+
+    return [target_file(f) for f in delta.updated], [target_file(f) for f in delta.deleted]
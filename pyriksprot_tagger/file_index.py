@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from os.path import join as jj
+from typing import Any
+
+from loguru import logger
+
+"""Persisted index of protocol files, used to expand Snakemake targets.
+
+Protocols are stored as `{folder}/{year}/{basename}.{extension}`. Instead of globbing the whole tree on each
+invocation, the basenames of each year folder are stored in a JSON index together with the folder's mtime.
+Adding, removing or renaming a file changes the mtime of its folder (and adding or removing a year folder
+changes the mtime of the root), so on refresh only year folders with a changed mtime are listed again.
+Year filtering is done against the index.
+"""
+
+INDEX_VERSION: int = 1
+
+
+def default_index_folder() -> str:
+    return jj(os.environ.get("XDG_CACHE_HOME") or jj(os.path.expanduser("~"), ".cache"), "pyriksprot_tagger")
+
+
+def year_regex(years: int | str | list[int | str] = None) -> re.Pattern:
+    """Regex matching year folder names: any digits, or folders starting with (one of) `years`."""
+    pattern: str = (
+        rf"{years}\d*"
+        if isinstance(years, (int, str))
+        else '|'.join(rf'{y}\d*' for y in years)
+        if isinstance(years, list)
+        else r"\d+"
+    )
+    return re.compile(f"(?:{pattern})")
+
+
+class FileIndex:
+    """Index of `{folder}/{year}/{basename}.{extension}` files, refreshed per year folder mtime."""
+
+    def __init__(self, folder: str, extension: str, filename: str = None):
+        self.folder: str = folder
+        self.extension: str = extension
+        self.filename: str = filename or jj(
+            default_index_folder(),
+            f"file-index-{hashlib.sha1(os.path.abspath(folder).encode('utf-8')).hexdigest()[:16]}.{extension}.json",
+        )
+        self.folders: dict[str, dict[str, Any]] = {}
+        self.mtime_ns: int = None
+        self.rescanned: int = 0
+
+    def load(self) -> "FileIndex":
+        try:
+            with open(self.filename, encoding="utf-8") as fp:
+                data: dict = json.load(fp)
+            if data.get('version') == INDEX_VERSION and data.get('folder') == os.path.abspath(self.folder):
+                self.folders, self.mtime_ns = data['folders'], data['mtime_ns']
+        except (OSError, ValueError, KeyError):
+            self.folders, self.mtime_ns = {}, None
+        return self
+
+    def store(self) -> None:
+        data: dict = dict(
+            version=INDEX_VERSION, folder=os.path.abspath(self.folder), mtime_ns=self.mtime_ns, folders=self.folders
+        )
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+            tmp_filename: str = f"{self.filename}.{os.getpid()}.tmp"
+            with open(tmp_filename, "w", encoding="utf-8") as fp:
+                json.dump(data, fp)
+            os.replace(tmp_filename, self.filename)
+        except OSError as ex:
+            logger.warning(f"file index: unable to store {self.filename} ({ex})")
+
+    def list_folder(self, name: str) -> list[str]:
+        suffix: str = f".{self.extension}"
+        with os.scandir(jj(self.folder, name)) as entries:
+            return sorted(e.name[: -len(suffix)] for e in entries if e.name.endswith(suffix) and e.is_file())
+
+    def refresh(self) -> "FileIndex":
+        """Bring index up to date with the file system (listing only changed year folders). Store if changed."""
+        if not self.folders:
+            self.load()
+
+        if not os.path.isdir(self.folder):
+            return self
+
+        mtime_ns: int = os.stat(self.folder).st_mtime_ns
+        names: list[str] = (
+            sorted(e.name for e in os.scandir(self.folder) if e.is_dir())
+            if mtime_ns != self.mtime_ns
+            else list(self.folders)
+        )
+
+        folders: dict[str, dict[str, Any]] = {}
+        for name in names:
+            try:
+                folder_mtime_ns: int = os.stat(jj(self.folder, name)).st_mtime_ns
+                cached: dict[str, Any] = self.folders.get(name)
+                if cached is None or cached['mtime_ns'] != folder_mtime_ns:
+                    cached = dict(mtime_ns=folder_mtime_ns, basenames=self.list_folder(name))
+                    self.rescanned += 1
+                folders[name] = cached
+            except FileNotFoundError:
+                continue
+
+        changed: bool = mtime_ns != self.mtime_ns or folders.keys() != self.folders.keys() or self.rescanned > 0
+        self.folders, self.mtime_ns = folders, mtime_ns
+        if changed:
+            self.store()
+        return self
+
+    def basenames(self, years: int | str | list[int | str] = None) -> tuple[list[str], list[str]]:
+        """Return (year, basename) of indexed files as two lists (like Snakemake's `glob_wildcards`)."""
+        regex: re.Pattern = year_regex(years)
+        pairs: list[tuple[str, str]] = [
+            (year, basename)
+            for year, entry in self.folders.items()
+            if regex.fullmatch(year)
+            for basename in entry['basenames']
+        ]
+        return [y for y, _ in pairs], [b for _, b in pairs]
+
+    def files(self, years: int | str | list[int | str] = None) -> list[str]:
+        return [jj(self.folder, year, f"{basename}.{self.extension}") for year, basename in zip(*self.basenames(years))]
+
+
+def indexed_source_files(source_folder: str, source_extension: str, years: int | str | list = None) -> list[str]:
+    """Return files `{source_folder}/{year}/*.{source_extension}` (optionally filtered on `years`)."""
+    return FileIndex(source_folder, source_extension).refresh().files(years)
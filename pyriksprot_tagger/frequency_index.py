@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import mmap
+import os
+import pickle
+import struct
+from typing import Iterator
+
+import numpy as np
+from loguru import logger
+
+"""Memory-mapped word frequency index (used by the dehyphenator).
+
+`SwedishDehyphenator` unpickles the corpus word frequencies (millions of entries) into a dict in each process.
+Here the pickle is converted once into a sorted string table next to it (`{tf_filename}.idx`):
+
+    header      magic (8 bytes), number of words n (uint64)
+    offsets     n + 1 uint64 offsets of each word in the string blob
+    counts      n int64 frequencies
+    blob        UTF-8 encoded words, sorted by their encoded bytes
+
+The file is memory mapped (shared page cache, no load time) and words are looked up with binary search.
+The index is built by the `word_frequency` rule, or by `open_frequency_index` in an explicitly configured
+(writable) location. If no up-to-date index is available, the dehyphenator uses the unpickled dict.
+"""
+
+MAGIC: bytes = b"TFIDX001"
+HEADER: struct.Struct = struct.Struct("<8sQ")
+INDEX_SUFFIX: str = ".idx"
+
+
+def index_filename(tf_filename: str) -> str:
+    return f"{tf_filename}{INDEX_SUFFIX}"
+
+
+def is_converted(tf_filename: str, filename: str = None) -> bool:
+    filename = filename or index_filename(tf_filename)
+    return os.path.isfile(filename) and os.path.getmtime(filename) >= os.path.getmtime(tf_filename)
+
+
+def write_index(frequencies: dict[str, int], filename: str) -> None:
+    """Write `frequencies` as a sorted string table to `filename`."""
+    items: list[tuple[bytes, int]] = sorted((w.encode('utf-8'), c) for w, c in frequencies.items())
+    offsets: np.ndarray = np.zeros(len(items) + 1, dtype='<u8')
+    np.cumsum([len(w) for w, _ in items], out=offsets[1:])
+    counts: np.ndarray = np.array([c for _, c in items], dtype='<i8')
+
+    tmp_filename: str = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, len(items)))
+        fp.write(offsets.tobytes())
+        fp.write(counts.tobytes())
+        fp.write(b''.join(w for w, _ in items))
+    os.replace(tmp_filename, filename)
+
+
+def convert_frequencies(tf_filename: str, filename: str = None, force: bool = False) -> str:
+    """Write index of pickled word frequencies `tf_filename` to `filename` (default: next to the pickle) unless
+    up to date. Return index filename."""
+    filename = filename or index_filename(tf_filename)
+    if force or not is_converted(tf_filename, filename):
+        logger.info(f"frequency index: converting {tf_filename}")
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        with open(tf_filename, 'rb') as fp:
+            write_index(pickle.load(fp), filename)
+    return filename
+
+
+def open_frequency_index(tf_filename: str, filename: str = None) -> "FrequencyIndex | None":
+    """Open index of pickled word frequencies `tf_filename`. An explicitly given `filename` is (re)built if
+    needed, the default index next to the pickle is only opened if it is up to date. Return None if no index
+    is available (or it cannot be written or read)."""
+    try:
+        if filename is None and not is_converted(tf_filename):
+            logger.info(f"frequency index: no up-to-date index of {tf_filename}, using unpickled frequencies")
+            return None
+        return FrequencyIndex(convert_frequencies(tf_filename, filename))
+    except (OSError, ValueError) as ex:
+        logger.warning(f"frequency index: unable to use index of {tf_filename} ({ex}), using unpickled frequencies")
+        return None
+
+
+class FrequencyIndex:
+    """Read-only, memory-mapped word => frequency lookup (supports the `dict.get` used by the dehyphenator)."""
+
+    def __init__(self, filename: str):
+        self.filename: str = filename
+        with open(filename, 'rb') as fp:
+            self.data: mmap.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a frequency index")
+        self.offsets: np.ndarray = np.frombuffer(self.data, dtype='<u8', count=self.size + 1, offset=HEADER.size)
+        self.counts: np.ndarray = np.frombuffer(
+            self.data, dtype='<i8', count=self.size, offset=HEADER.size + 8 * (self.size + 1)
+        )
+        self.blob_offset: int = HEADER.size + 8 * (2 * self.size + 1)
+
+    def word(self, i: int) -> bytes:
+        return self.data[self.blob_offset + int(self.offsets[i]) : self.blob_offset + int(self.offsets[i + 1])]
+
+    def find(self, word: str) -> int:
+        """Position of `word` in index, or -1 if not found."""
+        key: bytes = word.encode('utf-8')
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid: int = (lo + hi) // 2
+            if self.word(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.size and self.word(lo) == key else -1
+
+    def get(self, word: str, default: int = None) -> int:
+        i: int = self.find(word)
+        return int(self.counts[i]) if i >= 0 else default
+
+    def __getitem__(self, word: str) -> int:
+        i: int = self.find(word)
+        if i < 0:
+            raise KeyError(word)
+        return int(self.counts[i])
+
+    def __contains__(self, word: str) -> bool:
+        return self.find(word) >= 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.word(i).decode('utf-8') for i in range(self.size))
+
+    def close(self) -> None:
+        self.offsets = self.counts = None
+        self.data.close()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from os.path import getsize, isfile
+from os.path import join as jj
+
+from loguru import logger
+
+"""Crash-resumable run journal.
+
+An append-only SQLite table in the target folder records, for each tagged protocol, the source file's hash,
+the output file's hash and size, the tagger configuration fingerprint, the duration and a status:
+
+    done     the tagged frame was stored (outputs are written to a temporary file and renamed, so a
+             recorded output is always complete)
+    empty    the protocol has no text (an empty target file is stored)
+    failed   tagging or storing raised an error
+
+On restart, a protocol is skipped if its latest entry for the current fingerprint is `done` or `empty`, its
+source hash is unchanged and its output still has the recorded size. Only the journal and the protocol's own
+files are read, not the whole target tree.
+"""
+
+JOURNAL_FILENAME: str = ".tagging-journal.db"
+
+SQL_CREATE: str = """
+    create table if not exists entries (
+        id integer primary key autoincrement,
+        source_file text not null,
+        source_hash text not null,
+        target_file text not null,
+        output_hash text,
+        output_size integer,
+        fingerprint text not null,
+        seconds real,
+        status text not null,
+        created real not null
+    );
+    create index if not exists entries_source_file on entries(source_file);
+"""
+
+DONE: str = "done"
+EMPTY: str = "empty"
+FAILED: str = "failed"
+
+
+def file_hash(filename: str) -> str:
+    with open(filename, 'rb') as fp:
+        return hashlib.sha1(fp.read()).hexdigest()
+
+
+@dataclass
+class JournalEntry:
+    source_file: str
+    source_hash: str
+    target_file: str
+    output_hash: str
+    output_size: int
+    fingerprint: str
+    seconds: float
+    status: str
+
+
+class RunJournal:
+    """Append-only journal of tagged protocols, stored in `JOURNAL_FILENAME` in the target folder."""
+
+    def __init__(self, filename: str, fingerprint: str = ""):
+        self.filename: str = filename
+        self.fingerprint: str = fingerprint
+        self.lock: threading.Lock = threading.Lock()
+        self.source_hashes: dict[str, str] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+
+        self.db: sqlite3.Connection = self.connect()
+        self.db.executescript(SQL_CREATE)
+        self.entries: dict[str, JournalEntry] = self.latest_entries()
+
+    @staticmethod
+    def create(target_folder: str, fingerprint: str = "") -> "RunJournal":
+        return RunJournal(jj(target_folder, JOURNAL_FILENAME), fingerprint=fingerprint)
+
+    def connect(self) -> sqlite3.Connection:
+        db: sqlite3.Connection = sqlite3.connect(self.filename, timeout=60, check_same_thread=False)
+        db.execute("pragma journal_mode=wal")
+        return db
+
+    def reopen(self) -> None:
+        """Open a new connection (SQLite connections must not be used across fork)."""
+        self.db = self.connect()
+
+    def latest_entries(self) -> dict[str, JournalEntry]:
+        """Latest entry of each source file recorded with the current fingerprint."""
+        sql: str = """
+            select source_file, source_hash, target_file, output_hash, output_size, fingerprint, seconds, status
+            from entries
+            where id in (select max(id) from entries where fingerprint = ? group by source_file)
+        """
+        return {row[0]: JournalEntry(*row) for row in self.db.execute(sql, (self.fingerprint,))}
+
+    def source_hash(self, source_file: str) -> str:
+        if source_file not in self.source_hashes:
+            self.source_hashes[source_file] = file_hash(source_file)
+        return self.source_hashes[source_file]
+
+    def is_done(self, source_file: str, target_file: str) -> bool:
+        """True if `source_file` is verifiably tagged to `target_file` by a previous (or this) run."""
+        entry: JournalEntry = self.entries.get(source_file)
+        if entry is None or entry.status not in (DONE, EMPTY) or entry.target_file != target_file:
+            return False
+        if not isfile(target_file) or getsize(target_file) != entry.output_size:
+            return False
+        return entry.source_hash == self.source_hash(source_file)
+
+    def record(self, source_file: str, target_file: str, status: str, seconds: float = None) -> JournalEntry:
+        output: bool = status != FAILED and isfile(target_file)
+        entry: JournalEntry = JournalEntry(
+            source_file=source_file,
+            source_hash=self.source_hash(source_file),
+            target_file=target_file,
+            output_hash=file_hash(target_file) if output else None,
+            output_size=getsize(target_file) if output else None,
+            fingerprint=self.fingerprint,
+            seconds=round(seconds, 6) if seconds is not None else None,
+            status=status,
+        )
+        with self.lock, self.db:
+            self.db.execute(
+                "insert into entries(source_file, source_hash, target_file, output_hash, output_size, "
+                "fingerprint, seconds, status, created) values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*vars(entry).values(), time.time()),
+            )
+        self.entries[source_file] = entry
+        self.source_hashes.pop(source_file, None)
+        return entry
+
+    def close(self) -> None:
+        done: int = sum(e.status in (DONE, EMPTY) for e in self.entries.values())
+        logger.info(f"journal: {done} protocols done ({self.filename})")
+        self.db.close()
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterator, TextIO
+
+from loguru import logger
+
+"""Per-stage timing instrumentation of the tagging path.
+
+Hooks in the tagging code (XML parse, each preprocessor, Stanza processors, `_to_dict`, storing) record wall
+time, number of items and tokens per stage into the active `MetricsCollector`. The collector is disabled by
+default (the hooks are then no-ops). When enabled (see `tagit`), it writes structured JSONL events:
+
+    {"event": "protocol", "name": ..., "utterances": ..., "tokens": ..., "bytes": ..., "seconds": ...}
+    {"event": "stages", "elapsed": ..., "stages": {"tokenize": {"seconds": ..., "tokens_per_sec": ...}, ...}}
+
+and, optionally, a Prometheus textfile-collector file (rewritten atomically at each flush).
+"""
+
+PROMETHEUS_PREFIX: str = "riksprot_tagger"
+
+
+@dataclass
+class StageMetric:
+    """Accumulated wall time, calls, items and tokens of a stage."""
+
+    seconds: float = 0.0
+    calls: int = 0
+    items: int = 0
+    tokens: int = 0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.tokens / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self) | {'tokens_per_sec': round(self.tokens_per_sec, 1)}
+
+
+class StageTimer:
+    """Measures a single stage call, items and tokens can be set when known (i.e. after the call)."""
+
+    __slots__ = ('items', 'tokens')
+
+    def __init__(self, items: int = 1, tokens: int = 0):
+        self.items: int = items
+        self.tokens: int = tokens
+
+
+class MetricsCollector:
+    """Collects stage metrics, and writes them to JSONL and/or a Prometheus textfile."""
+
+    def __init__(
+        self,
+        jsonl_filename: str = None,
+        prometheus_filename: str = None,
+        flush_interval: float = 60.0,
+        enabled: bool = True,
+    ):
+        self.enabled: bool = enabled
+        self.jsonl_filename: str = jsonl_filename
+        self.prometheus_filename: str = prometheus_filename
+        self.flush_interval: float = flush_interval
+        self.stages: dict[str, StageMetric] = {}
+        self.protocols: int = 0
+        self.started: float = time.time()
+        self.last_flush: float = time.monotonic()
+        self.lock: threading.Lock = threading.Lock()
+        # pylint: disable=consider-using-with
+        self.fp: TextIO = open(jsonl_filename, 'a', encoding='utf-8') if jsonl_filename else None
+
+    def add(self, stage: str, seconds: float, items: int = 1, tokens: int = 0) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            metric: StageMetric = self.stages.get(stage)
+            if metric is None:
+                metric = self.stages[stage] = StageMetric()
+            metric.seconds += seconds
+            metric.calls += 1
+            metric.items += items
+            metric.tokens += tokens
+        self.maybe_flush()
+
+    def merge(self, stages: dict[str, StageMetric], protocols: int = 0) -> None:
+        """Add stage metrics (and number of stored protocols) recorded by another collector (e.g. in a worker
+        process, see `drain`)."""
+        if not self.enabled or not (stages or protocols):
+            return
+        with self.lock:
+            self.protocols += protocols
+            for stage, other in stages.items():
+                metric: StageMetric = self.stages.get(stage)
+                if metric is None:
+                    metric = self.stages[stage] = StageMetric()
+                metric.seconds += other.seconds
+                metric.calls += other.calls
+                metric.items += other.items
+                metric.tokens += other.tokens
+        self.maybe_flush()
+
+    def reopen(self) -> None:
+        """Prepare the copy of the collector inherited by a forked worker. Stages are recorded from zero (to be
+        drained and merged by the parent), events are appended line by line to the parent's JSONL file, and
+        snapshots (including the Prometheus file) are left to the parent."""
+        if not self.enabled:
+            return
+        self.lock = threading.Lock()
+        self.stages, self.protocols = {}, 0
+        self.prometheus_filename, self.flush_interval = None, float('inf')
+        if self.fp is not None:
+            self.fp.close()
+            # pylint: disable=consider-using-with
+            self.fp = open(self.jsonl_filename, 'a', encoding='utf-8', buffering=1)
+
+    def drain(self) -> dict[str, StageMetric]:
+        """Return stage metrics recorded since last drain, and reset them."""
+        with self.lock:
+            stages, self.stages = self.stages, {}
+        return stages
+
+    @contextmanager
+    def stage(self, stage: str, items: int = 1, tokens: int = 0) -> Iterator[StageTimer]:
+        """Time the body of the `with` statement as (a call of) `stage`."""
+        timer: StageTimer = StageTimer(items, tokens)
+        if not self.enabled:
+            yield timer
+            return
+        start: float = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            self.add(stage, time.perf_counter() - start, timer.items, timer.tokens)
+
+    def timed(self, fx: Callable, stage: str, tokens: Callable[[Any], int] = None) -> Callable:
+        """Wrap `fx` so that each call is recorded as `stage` (`tokens` counts the tokens of the result)."""
+
+        def timed_fx(*args, **kwargs):
+            start: float = time.perf_counter()
+            result: Any = fx(*args, **kwargs)
+            self.add(stage, time.perf_counter() - start, tokens=tokens(result) if tokens else 0)
+            return result
+
+        return timed_fx
+
+    def protocol(self, name: str, utterances: int, tokens: int, size: int, seconds: float = None) -> None:
+        """Record a stored protocol."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.protocols += 1
+        self.emit(dict(event="protocol", name=name, utterances=utterances, tokens=tokens, bytes=size, seconds=seconds))
+
+    def emit(self, event: dict[str, Any]) -> None:
+        if self.fp is None:
+            return
+        with self.lock:
+            self.fp.write(json.dumps({'ts': round(time.time(), 3)} | event) + "\n")
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            return dict(
+                event="stages",
+                elapsed=round(time.time() - self.started, 3),
+                protocols=self.protocols,
+                stages={name: metric.to_dict() for name, metric in self.stages.items()},
+            )
+
+    def maybe_flush(self) -> None:
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.enabled:
+            return
+        self.last_flush = time.monotonic()
+        snapshot: dict[str, Any] = self.snapshot()
+        self.emit(snapshot)
+        if self.fp is not None:
+            with self.lock:
+                self.fp.flush()
+        if self.prometheus_filename:
+            write_prometheus(self.prometheus_filename, snapshot)
+
+    def report(self) -> None:
+        for name, metric in self.snapshot()['stages'].items():
+            logger.info(
+                f"stage {name:<20} {metric['seconds']:10.2f}s {metric['calls']:8d} calls "
+                f"{metric['items']:10d} items {metric['tokens_per_sec']:12.1f} tokens/s"
+            )
+
+    def close(self) -> None:
+        if not self.enabled:
+            return
+        self.flush()
+        self.report()
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+def to_prometheus(snapshot: dict[str, Any], prefix: str = PROMETHEUS_PREFIX) -> str:
+    """Format a snapshot in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for key, kind, description in [
+        ('seconds', 'counter', 'Wall time spent in stage'),
+        ('calls', 'counter', 'Number of stage calls'),
+        ('items', 'counter', 'Number of items processed by stage'),
+        ('tokens', 'counter', 'Number of tokens processed by stage'),
+        ('tokens_per_sec', 'gauge', 'Average stage throughput'),
+    ]:
+        name: str = f"{prefix}_stage_{key}" + ("_total" if kind == 'counter' else "")
+        lines.extend([f"# HELP {name} {description}", f"# TYPE {name} {kind}"])
+        lines.extend(f'{name}{{stage="{stage}"}} {metric[key]}' for stage, metric in snapshot['stages'].items())
+    for key, kind, description in [
+        ('protocols', 'counter', 'Number of stored protocols'),
+        ('elapsed', 'gauge', 'Seconds since start of run'),
+    ]:
+        name: str = f"{prefix}_{key}" + ("_total" if kind == 'counter' else "_seconds")
+        lines.extend([f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name} {snapshot[key]}"])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(filename: str, snapshot: dict[str, Any]) -> None:
+    """Write snapshot to a textfile-collector file (via rename, so that partial files are never scraped)."""
+    tmp_filename: str = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as fp:
+        fp.write(to_prometheus(snapshot))
+    os.replace(tmp_filename, filename)
+
+
+class TimedPreprocessor:
+    """Preprocessor wrapper that records each call (or batch) as stage `preprocess:{name}`."""
+
+    def __init__(self, fx: Callable[[str], str], name: str):
+        self.fx: Callable[[str], str] = fx
+        self.stage: str = f"preprocess:{name}"
+        # Keep the name seen by `config_fingerprint` (cache keys must not change when metrics are enabled)
+        self.__qualname__: str = getattr(fx, '__qualname__', getattr(fx, '__name__', type(fx).__name__))
+        if hasattr(fx, 'batch'):
+            self.batch = self._batch
+
+    def __call__(self, text: str) -> str:
+        with collector().stage(self.stage, tokens=len(text.split())):
+            return self.fx(text)
+
+    def _batch(self, texts: list[str]) -> list[str]:
+        with collector().stage(self.stage, items=len(texts), tokens=sum(len(t.split()) for t in texts)):
+            return self.fx.batch(texts)
+
+
+_collector: MetricsCollector = MetricsCollector(enabled=False)
+
+
+def collector() -> MetricsCollector:
+    """The active metrics collector (disabled unless set by `set_collector`)."""
+    return _collector
+
+
+def set_collector(value: MetricsCollector | None) -> MetricsCollector:
+    """Activate `value` (None disables metrics). Return previously active collector."""
+    global _collector  # pylint: disable=global-statement
+    previous: MetricsCollector = _collector
+    _collector = value if value is not None else MetricsCollector(enabled=False)
+    return previous
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from os.path import getsize
+from typing import Any, Callable, Iterator
+
+from loguru import logger
+from pyriksprot import ITagger, ITaggerFactory
+from pyriksprot.interface import StorageFormat
+from pyriksprot.workflows.tag import ProcessorResolver
+from tqdm import tqdm
+
+from .journal import DONE, EMPTY, RunJournal
+from .metrics import MetricsCollector, StageMetric, collector, set_collector
+from .tagging import TagJob, chunked, glob_source_files, pending_files, prepare_job, store_job, tag_jobs
+
+"""Staged (overlapped) protocol tagging.
+
+    parse & preprocess (process pool) -> tag (main process) -> store (writer thread)
+
+Stages are joined by bounded queues so that the tagger model is kept busy while XML is parsed and
+tagged frames are written. Busy time of each stage is reported when all protocols are done.
+If metrics are enabled, stage metrics recorded in the worker processes (parse, preprocessors) are sent
+back with each job and added to the active collector.
+"""
+
+END = None
+
+_preprocessors: list[Callable[[str], str]] = None
+
+
+@dataclass
+class StageStats:
+    """Accumulated busy time of a pipeline stage."""
+
+    name: str
+    workers: int = 1
+    items: int = 0
+    busy: float = 0.0
+
+    def add(self, busy: float, items: int = 1) -> None:
+        self.items += items
+        self.busy += busy
+
+    def utilization(self, elapsed: float) -> float:
+        return self.busy / (elapsed * self.workers) if elapsed > 0 else 0.0
+
+    def report(self, elapsed: float) -> str:
+        return f"{self.name}: {self.items} items, busy {self.busy:.1f}s, utilization {self.utilization(elapsed):.0%}"
+
+
+class StageFailed(Exception):
+    """Wraps an error raised in a (non-main) pipeline stage."""
+
+
+def _init_worker(factory: ITaggerFactory, metrics: bool = False) -> None:
+    global _preprocessors  # pylint: disable=global-statement
+    if metrics:
+        # Record stages in memory, they are drained and returned with each job (see `_prepare_job`)
+        set_collector(MetricsCollector(flush_interval=float('inf')))
+    _preprocessors = ProcessorResolver.resolve_preprocessors(factory.create_preprocessor_tasks())
+
+
+def _prepare_job(
+    source_file: str, target_file: str, force: bool, storage_format: str
+) -> tuple[TagJob, float, dict[str, StageMetric]]:
+    start: float = time.perf_counter()
+    job: TagJob = prepare_job(source_file, target_file, _preprocessors, force, storage_format)
+    return job, time.perf_counter() - start, collector().drain()
+
+
+def tag_protocols_staged(
+    tagger: ITagger,
+    factory: ITaggerFactory,
+    source_folder: str,
+    target_folder: str,
+    force: bool,
+    recursive: bool = False,
+    pattern: str = "**/prot-*.xml",
+    pool_size: int = 8,
+    storage_format: str | StorageFormat = StorageFormat.JSON,
+    source_files: list[str] = None,
+    processes: int = 2,
+    queue_size: int = 32,
+    journal: RunJournal = None,
+) -> dict[str, StageStats]:
+    """Tags protocols like `tag_protocols_pooled`, but with parsing/preprocessing done by `processes` worker
+    processes (using preprocessors created by `factory.create_preprocessor_tasks()`) and storing done by a
+    writer thread. Return stage statistics."""
+
+    if source_files is None:
+        source_files = glob_source_files(source_folder, pattern, recursive)
+
+    storage_format = getattr(storage_format, 'value', storage_format)
+
+    parsed: queue.Queue = queue.Queue(maxsize=queue_size)
+    tagged: queue.Queue = queue.Queue(maxsize=max(queue_size // max(pool_size, 1), 2))
+    errors: list[BaseException] = []
+    stopping: threading.Event = threading.Event()
+
+    stats: dict[str, StageStats] = {
+        'parse': StageStats('parse', workers=processes),
+        'tag': StageStats('tag'),
+        'store': StageStats('store'),
+    }
+
+    def put(q: queue.Queue, item: Any) -> bool:
+        """Put `item` on bounded queue. Give up if pipeline is stopping."""
+        while not stopping.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: queue.Queue) -> Any:
+        """Get next item from queue. Return END if pipeline is stopping."""
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if stopping.is_set():
+                    return END
+
+    def produce() -> None:
+        # Spawned (not forked) workers, since the tagger process is multi-threaded and may have initialized CUDA
+        executor: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(factory, collector().enabled),
+        )
+        try:
+            futures: list[tuple[Future, str, str]] = []
+            for source_file, target_file in pending_files(tqdm(source_files), target_folder, force, recursive, journal):
+                future: Future = executor.submit(_prepare_job, source_file, target_file, force, storage_format)
+                futures.append((future, source_file, target_file))
+                # Keep at most `queue_size` protocols in flight, and deliver them in source order
+                while len(futures) >= queue_size or (futures and futures[0][0].done()):
+                    if not deliver(*futures.pop(0)):
+                        return
+            while futures:
+                if not deliver(*futures.pop(0)):
+                    return
+            put(parsed, END)
+        except BaseException as ex:  # pylint: disable=broad-except
+            errors.append(ex)
+            stopping.set()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def deliver(future: Future, source_file: str, target_file: str) -> bool:
+        job, busy, stages = future.result()
+        stats['parse'].add(busy)
+        collector().merge(stages)
+        if job is None and journal is not None:
+            # Nothing to tag: either an empty protocol (empty target), or a target whose checksum validates
+            journal.record(source_file, target_file, EMPTY if getsize(target_file) == 0 else DONE, busy)
+        return job is None or put(parsed, job)
+
+    def consume() -> None:
+        try:
+            while True:
+                jobs: list[TagJob] = get(tagged)
+                if jobs is END:
+                    break
+                start: float = time.perf_counter()
+                for job in jobs:
+                    store_job(job, storage_format=storage_format, journal=journal)
+                stats['store'].add(time.perf_counter() - start, len(jobs))
+        except BaseException as ex:  # pylint: disable=broad-except
+            errors.append(ex)
+            stopping.set()
+
+    def parsed_jobs() -> Iterator[TagJob]:
+        while True:
+            job: TagJob = get(parsed)
+            if job is END:
+                return
+            yield job
+
+    started: float = time.perf_counter()
+
+    producer: threading.Thread = threading.Thread(target=produce, name="tag-parse", daemon=True)
+    writer: threading.Thread = threading.Thread(target=consume, name="tag-store", daemon=True)
+    producer.start()
+    writer.start()
+
+    try:
+        for jobs in chunked(parsed_jobs(), max(pool_size, 1)):
+            if stopping.is_set():
+                break
+            start: float = time.perf_counter()
+            tag_jobs(tagger, jobs)
+            stats['tag'].add(time.perf_counter() - start, len(jobs))
+            if not put(tagged, jobs):
+                break
+    except BaseException:
+        stopping.set()
+        raise
+    finally:
+        put(tagged, END)
+        writer.join()
+        stopping.set()
+        producer.join()
+
+    if errors:
+        raise StageFailed(f"staged tagging failed: {errors[0]}") from errors[0]
+
+    elapsed: float = time.perf_counter() - started
+    for stage in stats.values():
+        logger.info(f"stage {stage.report(elapsed)}")
+
+    return stats
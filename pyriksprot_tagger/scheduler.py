@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from os.path import getsize
+from typing import Callable, Literal
+
+from loguru import logger
+
+"""Size-aware scheduling of protocols over tagging workers.
+
+Tagging time of a protocol is roughly proportional to its size, and protocol sizes (as well as year folder
+sizes) differ by orders of magnitude. Protocols are therefore handed out longest (most costly) first from a
+queue shared by all workers (dynamic LPT scheduling), so that no worker is left with a large protocol at
+the end of the run. Cost is estimated from file size or number of utterances.
+"""
+
+CostEstimate = Literal['size', 'utterances']
+
+COST_ESTIMATES: list[str] = ['size', 'utterances']
+
+
+def utterance_count(filename: str) -> int:
+    """Number of utterance elements in a Parla-Clarin protocol (counted without parsing the XML)."""
+    with open(filename, 'rb') as fp:
+        data: bytes = fp.read()
+    return data.count(b"<u ") + data.count(b"<u>")
+
+
+def cost_function(cost: CostEstimate = 'size') -> Callable[[str], float]:
+    if cost not in COST_ESTIMATES:
+        raise ValueError(f"unknown cost estimate {cost}, expected one of {', '.join(COST_ESTIMATES)}")
+    return getsize if cost == 'size' else utterance_count
+
+
+def longest_first(source_files: list[str], cost: CostEstimate = 'size') -> list[tuple[float, str]]:
+    """Return (cost, filename) of `source_files`, most costly first."""
+    fx: Callable[[str], float] = cost_function(cost)
+    return sorted(((fx(f), f) for f in source_files), key=lambda x: (-x[0], x[1]))
+
+
+def predict_makespan(costs: list[float], workers: int) -> float:
+    """Total cost of the busiest worker when `costs` are handed out in order to the first idle worker."""
+    loads: list[float] = [0.0] * max(workers, 1)
+    for cost in costs:
+        heapq.heappush(loads, heapq.heappop(loads) + cost)
+    return max(loads)
+
+
+@dataclass
+class WorkerStats:
+    files: int = 0
+    cost: float = 0.0
+    seconds: float = 0.0
+
+
+@dataclass
+class Schedule:
+    """Predicted and (once run) actual makespan of tagging `items` with `workers` workers."""
+
+    items: list[tuple[float, str]]
+    workers: int
+    cost: CostEstimate = 'size'
+
+    @property
+    def total_cost(self) -> float:
+        return sum(c for c, _ in self.items)
+
+    @property
+    def predicted_makespan(self) -> float:
+        """Predicted makespan in cost units."""
+        return predict_makespan([c for c, _ in self.items], self.workers)
+
+    @property
+    def ideal_makespan(self) -> float:
+        """Lower bound of makespan in cost units (perfectly balanced workers)."""
+        return self.total_cost / max(self.workers, 1)
+
+    def report(self, stats: list[WorkerStats], elapsed: float) -> dict[str, float]:
+        """Log predicted vs actual makespan. Predicted seconds use the run's average cost per second."""
+        busy: float = sum(s.seconds for s in stats)
+        rate: float = sum(s.cost for s in stats) / busy if busy > 0 else 0.0
+        predicted: float = self.predicted_makespan / rate if rate > 0 else 0.0
+        actual: float = max((s.seconds for s in stats), default=0.0)
+        for i, s in enumerate(stats):
+            logger.info(f"scheduler: worker {i} tagged {s.files} files ({self.cost} {s.cost:.0f}) in {s.seconds:.1f}s")
+        logger.info(
+            f"scheduler: makespan predicted {predicted:.1f}s, actual {actual:.1f}s "
+            f"(ideal {self.ideal_makespan / rate if rate > 0 else 0.0:.1f}s, elapsed {elapsed:.1f}s)"
+        )
+        return dict(predicted=predicted, actual=actual, elapsed=elapsed)
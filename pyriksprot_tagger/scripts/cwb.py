@@ -0,0 +1,31 @@
+"""
+Encodes tagged protocols (one folder per year) as a CWB corpus (without cwb-encode/cwb-makeall).
+
+"""
+import click
+
+from pyriksprot_tagger.cwb import corpus_to_cwb
+
+# pylint: disable=too-many-arguments, unused-argument
+
+
+@click.command()
+@click.argument('source_folder', type=click.STRING)
+@click.argument('data_folder', type=click.STRING)
+@click.option('--registry-folder', type=click.STRING, help='Write registry entry to this folder.', default=None)
+@click.option('--corpus-name', type=click.STRING, help='Corpus name (lower case is used as ID).', default="riksprot")
+@click.option('--processes', type=click.INT, help='Number of attributes encoded in parallel.', default=1)
+def main(
+    source_folder: str = None,
+    data_folder: str = None,
+    registry_folder: str = None,
+    corpus_name: str = "riksprot",
+    processes: int = 1,
+):
+    corpus_to_cwb(
+        source_folder, data_folder, registry_folder=registry_folder, corpus_name=corpus_name, processes=processes
+    )
+
+
+if __name__ == "__main__":
+    main()
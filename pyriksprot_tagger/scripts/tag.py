@@ -1,8 +1,20 @@
+from functools import partial
+from typing import Any, Callable
+
 import click
 from loguru import logger
 from pyriksprot import configuration
-from pyriksprot.workflows.tag import ITagger, TaggerProvider, tag_protocols
+from pyriksprot.workflows.tag import ITagger, ITaggerFactory, TaggerProvider, tag_protocols
+from pyriksprot_tagger.delta import ProtocolDelta, protocol_delta, read_version_tag
+from pyriksprot_tagger.journal import RunJournal
+from pyriksprot_tagger.metrics import MetricsCollector, set_collector
+from pyriksprot_tagger.pipeline import tag_protocols_staged
+from pyriksprot_tagger.scheduler import COST_ESTIMATES
+from pyriksprot_tagger.storage import STORAGE_FORMATS
+from pyriksprot_tagger.taggers.cache import config_fingerprint
+from pyriksprot_tagger.tagging import remove_protocols, tag_protocols_pooled
 from pyriksprot_tagger.utility import check_cuda
+from pyriksprot_tagger.workers import tag_protocols_forked
 
 
 @click.command()
@@ -12,6 +24,45 @@ from pyriksprot_tagger.utility import check_cuda
 @click.option('--force', is_flag=True, default=False, help='Force if exists')
 @click.option('--recursive', is_flag=True, default=True, help='Recurse subfolders')
 @click.option('--pattern', type=str, default="**/prot-*.xml", help='Recurse subfolders')
+@click.option(
+    '--pool-size', type=int, default=1, help='Number of protocols to tag in each tagger call (not used by --workers)'
+)
+@click.option('--server-address', type=str, default=None, help='Tag using tagging server listening on this socket')
+@click.option('--since-tag', type=str, default=None, help='Only tag protocols changed since this corpus tag')
+@click.option('--incremental', is_flag=True, default=False, help='Only tag protocols changed since tag in version.yml')
+@click.option(
+    '--parse-processes',
+    type=int,
+    default=0,
+    help='Parse and preprocess protocols in this many processes, overlapped with tagging and storing',
+)
+@click.option(
+    '--storage-format',
+    type=click.Choice(STORAGE_FORMATS),
+    default=None,
+    help='Storage format of tagged frames (default target:storage_format in config, or json)',
+)
+@click.option(
+    '--workers',
+    type=int,
+    default=1,
+    help='Tag in this many forked worker processes that share a single loaded CPU model (or tagging server)',
+)
+@click.option('--threads-per-worker', type=int, default=None, help='Torch threads per worker (default CPUs/workers)')
+@click.option(
+    '--schedule-by',
+    type=click.Choice(COST_ESTIMATES),
+    default='size',
+    help='Estimate cost of protocols (scheduled longest first over workers) by file size or utterance count',
+)
+@click.option(
+    '--journal',
+    is_flag=True,
+    default=False,
+    help='Record tagged protocols in a journal in the target folder, and skip verified protocols on restart',
+)
+@click.option('--metrics-file', type=str, default=None, help='Append per-stage timing metrics (JSONL) to this file')
+@click.option('--prometheus-file', type=str, default=None, help='Write metrics to this Prometheus textfile')
 def main(
     config_filename: str,
     source_folder: str,
@@ -19,6 +70,18 @@ def main(
     force: bool = False,
     recursive: bool = True,
     pattern: str = "**/prot-*.xml",
+    pool_size: int = 1,
+    server_address: str = None,
+    since_tag: str = None,
+    incremental: bool = False,
+    parse_processes: int = 0,
+    storage_format: str = None,
+    workers: int = 1,
+    threads_per_worker: int = None,
+    schedule_by: str = 'size',
+    journal: bool = False,
+    metrics_file: str = None,
+    prometheus_file: str = None,
 ) -> None:
     tagit(
         config_filename=config_filename,
@@ -27,6 +90,18 @@ def main(
         force=force,
         recursive=recursive,
         pattern=pattern,
+        pool_size=pool_size,
+        server_address=server_address,
+        since_tag=since_tag,
+        incremental=incremental,
+        parse_processes=parse_processes,
+        storage_format=storage_format,
+        workers=workers,
+        threads_per_worker=threads_per_worker,
+        schedule_by=schedule_by,
+        journal=journal,
+        metrics_file=metrics_file,
+        prometheus_file=prometheus_file,
     )
 
 
@@ -37,22 +112,127 @@ def tagit(
     force: bool = False,
     recursive: bool = True,
     pattern: str = "**/prot-*.xml",
+    pool_size: int = 1,
+    server_address: str = None,
+    since_tag: str = None,
+    incremental: bool = False,
+    parse_processes: int = 0,
+    storage_format: str = None,
+    workers: int = 1,
+    threads_per_worker: int = None,
+    schedule_by: str = 'size',
+    journal: bool = False,
+    metrics_file: str = None,
+    prometheus_file: str = None,
 ):
-    check_cuda()
+    if workers > 1 and parse_processes > 0:
+        raise ValueError("--workers cannot be combined with --parse-processes")
 
-    configuration.configure_context(source=config_filename, context="default")
+    delta: ProtocolDelta = None
+    if since_tag or incremental:
+        since_tag = since_tag or read_version_tag(target_folder)
+        if since_tag:
+            delta = protocol_delta(source_folder, since_tag, pattern=pattern, fetch=True)
+        if delta is None:
+            logger.warning("incremental: no usable corpus delta found, falling back to full tagging")
 
-    tagger: ITagger = TaggerProvider.tagger_factory().create()
+    if not server_address and workers <= 1:
+        check_cuda()
 
-    tag_protocols(
-        tagger=tagger,
-        source_folder=source_folder,
-        target_folder=target_folder,
-        force=force,
-        recursive=recursive,
-        pattern=pattern,
+    config: configuration.Config = configuration.configure_context(source=config_filename, context="default")
+
+    storage_format = storage_format or config.get("target:storage_format", default="json")
+
+    metrics_file = metrics_file or config.get("metrics:jsonl", default=None)
+    prometheus_file = prometheus_file or config.get("metrics:prometheus", default=None)
+    metrics: MetricsCollector = (
+        MetricsCollector(jsonl_filename=metrics_file, prometheus_filename=prometheus_file)
+        if metrics_file or prometheus_file
+        else None
+    )
+    previous_metrics: MetricsCollector = set_collector(metrics)
+
+    factory: ITaggerFactory = TaggerProvider.tagger_factory()
+
+    if server_address:
+        factory.opts['server_address'] = server_address
+
+    if workers > 1 and not server_address:
+        factory.opts['use_gpu'] = False
+
+    tagger: ITagger = factory.create()
+
+    run_journal: RunJournal = (
+        RunJournal.create(
+            target_folder,
+            fingerprint=config_fingerprint(
+                getattr(tagger, 'fingerprint', None) or [type(tagger).__name__, tagger.preprocessors], storage_format
+            ),
+        )
+        if journal or config.get("target:journal", default=False)
+        else None
+    )
+
+    tag_pooled: Callable[..., Any] = (
+        partial(tag_protocols_forked, workers=workers, threads=threads_per_worker, cost=schedule_by)
+        if workers > 1
+        else partial(tag_protocols_staged, factory=factory, processes=parse_processes)
+        if parse_processes > 0
+        else tag_protocols_pooled
     )
 
+    if delta is not None:
+        remove_protocols(delta.deleted, target_folder, recursive=recursive)
+        tag_pooled(
+            tagger=tagger,
+            source_folder=source_folder,
+            target_folder=target_folder,
+            force=True,
+            recursive=recursive,
+            pool_size=pool_size,
+            storage_format=storage_format,
+            source_files=delta.updated,
+            journal=run_journal,
+        )
+    elif (
+        pool_size > 1
+        or parse_processes > 0
+        or workers > 1
+        or storage_format != "json"
+        or metrics is not None
+        or run_journal is not None
+    ):
+        tag_pooled(
+            tagger=tagger,
+            source_folder=source_folder,
+            target_folder=target_folder,
+            force=force,
+            recursive=recursive,
+            pattern=pattern,
+            pool_size=pool_size,
+            storage_format=storage_format,
+            journal=run_journal,
+        )
+    else:
+        tag_protocols(
+            tagger=tagger,
+            source_folder=source_folder,
+            target_folder=target_folder,
+            force=force,
+            recursive=recursive,
+            pattern=pattern,
+        )
+
+    if hasattr(tagger, "close"):
+        tagger.close()
+
+    if run_journal is not None:
+        run_journal.close()
+
+    if metrics is not None:
+        metrics.close()
+    set_collector(previous_metrics)
+
     logger.info("workflow ended")
 
 
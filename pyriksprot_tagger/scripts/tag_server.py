@@ -0,0 +1,56 @@
+"""
+Runs a resident tagging server that holds one tagger and serves `pos_tag --server-address` clients.
+
+"""
+import click
+from loguru import logger
+from pyriksprot import configuration
+from pyriksprot.workflows.tag import ITaggerFactory, TaggerProvider
+from pyriksprot_tagger.server import TaggingServer, shutdown_server
+from pyriksprot_tagger.utility import check_cuda
+
+# pylint: disable=too-many-arguments
+
+
+@click.command()
+@click.argument('config_filename', required=False)
+@click.option('--address', type=str, required=True, help='Unix socket path to listen on')
+@click.option('--max-batch-texts', type=int, default=1024, help='Max number of texts merged into one tagger call')
+@click.option('--max-wait-ms', type=int, default=20, help='Max time to wait for more requests before tagging')
+@click.option('--stop', is_flag=True, default=False, help='Stop server listening on address')
+def main(
+    config_filename: str = None,
+    address: str = None,
+    max_batch_texts: int = 1024,
+    max_wait_ms: int = 20,
+    stop: bool = False,
+) -> None:
+    if stop:
+        shutdown_server(address)
+        return
+
+    if not config_filename:
+        raise click.UsageError("config_filename is required when starting a server")
+
+    serve(config_filename=config_filename, address=address, max_batch_texts=max_batch_texts, max_wait_ms=max_wait_ms)
+
+
+def serve(config_filename: str, address: str, max_batch_texts: int = 1024, max_wait_ms: int = 20) -> None:
+    check_cuda()
+
+    configuration.configure_context(source=config_filename, context="default")
+
+    factory: ITaggerFactory = TaggerProvider.tagger_factory()
+
+    TaggingServer(
+        tagger=factory.create_tagger(),
+        address=address,
+        max_batch_texts=max_batch_texts,
+        max_wait=max_wait_ms / 1000.0,
+    ).serve_forever()
+
+    logger.info("server ended")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
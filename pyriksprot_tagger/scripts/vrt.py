@@ -0,0 +1,21 @@
+"""
+Exports tagged protocols (one folder per year) to gzipped VRT files (one per year).
+
+"""
+import click
+
+from pyriksprot_tagger.cwb import corpus_to_vrt
+
+# pylint: disable=too-many-arguments, unused-argument
+
+
+@click.command()
+@click.argument('source_folder', type=click.STRING)
+@click.argument('target_folder', type=click.STRING)
+@click.option('--processes', type=click.INT, help='Number of year folders exported in parallel.', default=1)
+def main(source_folder: str = None, target_folder: str = None, processes: int = 1):
+    corpus_to_vrt(source_folder, target_folder, processes=processes)
+
+
+if __name__ == "__main__":
+    main()
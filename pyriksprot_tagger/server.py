@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, List, Union
+
+from loguru import logger
+from pyriksprot import ITagger, TaggedDocument
+
+from .taggers import batching
+
+"""Resident tagging server.
+
+A single process holds the (expensive) tagger and serves many lightweight clients over a local
+Unix socket. Requests that arrive close in time are merged into one tagger call (micro-batching),
+so model load time and memory no longer grow with the number of XML-parsing workers.
+"""
+
+# pylint: disable=too-many-arguments
+
+
+@dataclass
+class TagRequest:
+    texts: list[str]
+    preprocess: bool = False
+    done: threading.Event = field(default_factory=threading.Event)
+    result: list[TaggedDocument] = None
+    error: str = None
+
+
+class TaggingServer:
+    """Serves `tagger` on Unix socket `address`."""
+
+    def __init__(
+        self,
+        tagger: ITagger,
+        address: str,
+        max_batch_texts: int = 1024,
+        max_wait: float = 0.02,
+        authkey: bytes = None,
+    ):
+        self.tagger: ITagger = tagger
+        self.address: str = address
+        self.max_batch_texts: int = max_batch_texts
+        self.max_wait: float = max_wait
+        self.authkey: bytes = authkey
+        self.requests: queue.Queue[TagRequest] = queue.Queue()
+        self.stopped: threading.Event = threading.Event()
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+        threading.Thread(target=self._batch_loop, daemon=True, name="tag-batcher").start()
+
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"tagging server: listening on {self.address}")
+            while not self.stopped.is_set():
+                try:
+                    connection: Connection = listener.accept()
+                except OSError:
+                    if self.stopped.is_set():
+                        break
+                    raise
+                threading.Thread(target=self._serve_client, args=(connection,), daemon=True).start()
+
+        logger.info("tagging server: stopped")
+
+    def shutdown(self) -> None:
+        self.stopped.set()
+        # Wake up the blocking accept() call
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+
+    def _serve_client(self, connection: Connection) -> None:
+        with connection:
+            while True:
+                try:
+                    message: tuple = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                command: str = message[0]
+
+                if command == 'tag':
+                    request: TagRequest = TagRequest(texts=message[1], preprocess=message[2])
+                    self.requests.put(request)
+                    request.done.wait()
+                    connection.send(('error', request.error) if request.error else ('ok', request.result))
+                elif command == 'ping':
+                    connection.send(('ok', None))
+                elif command == 'shutdown':
+                    connection.send(('ok', None))
+                    self.shutdown()
+                    return
+                else:
+                    connection.send(('error', f"unknown command: {command}"))
+
+    def _next_batch(self) -> list[TagRequest]:
+        """Block for the first request, then collect more until full or `max_wait` has passed."""
+        batch: list[TagRequest] = [self.requests.get()]
+        num_texts: int = len(batch[0].texts)
+        deadline: float = time.monotonic() + self.max_wait
+        while num_texts < self.max_batch_texts:
+            timeout: float = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request: TagRequest = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            num_texts += len(request.texts)
+        return batch
+
+    def _batch_loop(self) -> None:
+        while not self.stopped.is_set():
+            batch: list[TagRequest] = self._next_batch()
+            for preprocess in (False, True):
+                requests: list[TagRequest] = [r for r in batch if r.preprocess == preprocess]
+                if requests:
+                    self._tag_requests(requests, preprocess)
+
+    def _tag_requests(self, requests: list[TagRequest], preprocess: bool) -> None:
+        try:
+            texts, sizes = batching.pool([r.texts for r in requests])
+            documents: list[TaggedDocument] = self.tagger.tag(texts, preprocess=preprocess) if texts else []
+            for request, result in zip(requests, batching.unpool(documents, sizes)):
+                request.result = result
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.exception("tagging server: batch failed")
+            for request in requests:
+                request.error = f"{type(ex).__name__}: {ex}"
+        finally:
+            for request in requests:
+                request.done.set()
+
+
+class TaggingClient(ITagger):
+    """Tagger that forwards texts to a `TaggingServer`. Preprocessing is done client side."""
+
+    def __init__(self, address: str, preprocessors: Any = None, authkey: bytes = None):
+        super().__init__(preprocessors=preprocessors or [])
+        self.address: str = address
+        self.authkey: bytes = authkey
+        self._connection: Connection = None
+
+    @property
+    def connection(self) -> Connection:
+        if self._connection is None:
+            self._connection = Client(self.address, authkey=self.authkey)
+        return self._connection
+
+    def request(self, *message: Any) -> Any:
+        self.connection.send(message)
+        status, payload = self.connection.recv()
+        if status != 'ok':
+            raise RuntimeError(f"tagging server {self.address}: {payload}")
+        return payload
+
+    def _tag(self, text: Union[str, List[str]]) -> List[TaggedDocument]:
+        return self.request('tag', [text] if isinstance(text, str) else list(text), False)
+
+    def _to_dict(self, tagged_document: Any) -> TaggedDocument:
+        return tagged_document
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def shutdown_server(address: str, authkey: bytes = None) -> None:
+    with Client(address, authkey=authkey) as connection:
+        connection.send(('shutdown',))
+        connection.recv()
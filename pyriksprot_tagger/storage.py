@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+from typing import Any, Iterable
+
+import loguru
+import pandas as pd
+from pyriksprot import interface
+from pyriksprot.corpus.tagged import persist
+from pyriksprot.utility import is_empty
+from pyriksprot.workflows.tag import TAGGED_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pylint: disable=bare-except
+    loguru.logger.info("pyarrow not installed (parquet storage format unavailable)")
+    pa = pq = None
+
+"""Parquet storage format for tagged protocols.
+
+The protocol is stored in the same ZIP container (with `metadata.json`) as the JSON/CSV formats, so
+checksum validation and target file naming are unchanged. The utterances are stored as `{name}.parquet`
+with one row per utterance, token level data as list columns (lemma, pos and xpos dictionary encoded),
+and one row group per speech.
+"""
+
+PARQUET: str = "parquet"
+
+STORAGE_FORMATS: list[str] = [f.value for f in interface.StorageFormat] + [PARQUET]
+
+UTTERANCE_COLUMNS: list[str] = ['u_id', 'who', 'speaker_note_id', 'prev_id', 'next_id', 'page_number']
+
+DICTIONARY_COLUMNS: list[str] = ['who', 'speaker_note_id', 'lemma', 'pos', 'xpos']
+
+
+def _column_types() -> dict[str, Any]:
+    category: Any = pa.dictionary(pa.int32(), pa.string())
+    return {
+        'u_id': pa.string(),
+        'who': category,
+        'speaker_note_id': category,
+        'prev_id': pa.string(),
+        'next_id': pa.string(),
+        'page_number': pa.int32(),
+        'paragraphs': pa.string(),
+        'num_tokens': pa.int32(),
+        'num_words': pa.int32(),
+        'speech_index': pa.int32(),
+        'token': pa.list_(pa.string()),
+        'lemma': pa.list_(category),
+        'pos': pa.list_(category),
+        'xpos': pa.list_(category),
+        'sentence_id': pa.list_(pa.int32()),
+    }
+
+
+def storage_format_of(storage_format: str | interface.StorageFormat) -> str | interface.StorageFormat:
+    """Resolve a configured storage format name. Return PARQUET or a pyriksprot `StorageFormat`."""
+    value: str = getattr(storage_format, 'value', storage_format) or interface.StorageFormat.JSON.value
+    if value not in STORAGE_FORMATS:
+        raise ValueError(f"unknown storage format: {value} (expected one of {', '.join(STORAGE_FORMATS)})")
+    return PARQUET if value == PARQUET else interface.StorageFormat(value)
+
+
+def speech_groups(utterances: list[interface.Utterance]) -> list[list[interface.Utterance]]:
+    """Split utterances (in document order) into speeches, a new speech starts at each utterance without `prev_id`.
+    Unlike pyriksprot's merge strategies, every utterance is kept and nothing is reordered."""
+    groups: list[list[interface.Utterance]] = []
+    for u in utterances:
+        if not groups or not u.prev_id:
+            groups.append([])
+        groups[-1].append(u)
+    return groups
+
+
+def parse_annotation(annotation: str, sep: str = '\t') -> dict[str, list[str]]:
+    """Split a tagged TSV string (as created by `ITagger.to_csv`) into columns."""
+    if not annotation:
+        return {}
+    lines: list[str] = annotation.split('\n')
+    columns: list[str] = lines[0].split(sep)
+    rows: list[list[str]] = [line.split(sep) for line in lines[1:] if line]
+    return {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+
+
+def to_annotation(data: dict[str, list[Any]], sep: str = '\t') -> str:
+    """Inverse of `parse_annotation`."""
+    columns: list[str] = list(data)
+    return sep.join(columns) + '\n' + '\n'.join(sep.join(str(v) for v in row) for row in zip(*data.values()))
+
+
+def to_table(protocol: interface.Protocol) -> tuple["pa.Table", list[int]]:
+    """Convert protocol to an Arrow table. Return table and the number of utterances in each speech."""
+    if pa is None:
+        raise ModuleNotFoundError("parquet storage format requires pyarrow")
+
+    column_types: dict[str, Any] = _column_types()
+    data: dict[str, list[Any]] = {name: [] for name in column_types}
+    tagged_columns: set[str] = set()
+    speech_sizes: list[int] = []
+
+    for speech_index, utterances in enumerate(speech_groups(protocol.utterances)):
+        speech_sizes.append(len(utterances))
+        for u in utterances:
+            for name in UTTERANCE_COLUMNS:
+                data[name].append(getattr(u, name))
+            data['paragraphs'].append(interface.PARAGRAPH_MARKER.join(u.paragraphs))
+            data['num_tokens'].append(getattr(u, 'num_tokens', None))
+            data['num_words'].append(getattr(u, 'num_words', None))
+            data['speech_index'].append(speech_index)
+            annotation: dict[str, list[str]] = parse_annotation(u.annotation)
+            tagged_columns.update(annotation)
+            for name in TAGGED_COLUMNS:
+                data[name].append(annotation.get(name, []))
+
+    data['sentence_id'] = [[int(x) for x in values] for values in data['sentence_id']]
+    names: list[str] = [name for name in column_types if name not in TAGGED_COLUMNS or name in tagged_columns]
+
+    table: pa.Table = pa.table(
+        {name: pa.array(data[name], type=column_types[name]) for name in names},
+    )
+    return table, speech_sizes
+
+
+def write_parquet(table: "pa.Table", speech_sizes: list[int]) -> bytes:
+    """Serialize table to Parquet, one row group per speech."""
+    buffer: io.BytesIO = io.BytesIO()
+    with pq.ParquetWriter(buffer, table.schema, compression='zstd', use_dictionary=True) as writer:
+        offset: int = 0
+        for size in speech_sizes:
+            writer.write_table(table.slice(offset, size), row_group_size=max(size, 1))
+            offset += size
+    return buffer.getvalue()
+
+
+def store_protocol(
+    output_filename: str,
+    protocol: interface.Protocol,
+    checksum: str,
+    storage_format: str | interface.StorageFormat = interface.StorageFormat.JSON,
+) -> None:
+    """Store tagged protocol in `output_filename`. Delegates JSON and CSV to `pyriksprot`."""
+    storage_format = storage_format_of(storage_format)
+
+    if storage_format != PARQUET:
+        persist.store_protocol(output_filename, protocol=protocol, checksum=checksum, storage_format=storage_format)
+        return
+
+    if not output_filename.endswith("zip"):
+        raise ValueError("Only Zip store currently implemented")
+
+    table, speech_sizes = to_table(protocol)
+    data: bytes = write_parquet(table, speech_sizes)
+
+    # Parquet data is already compressed, deflating it again only costs time
+    with zipfile.ZipFile(output_filename, 'w', zipfile.ZIP_STORED) as fp:
+        metadata: dict = dict(name=protocol.name, date=protocol.date, checksum=checksum, storage_format=PARQUET)
+        fp.writestr(persist.METADATA_FILENAME, json.dumps(metadata, indent=4))
+        fp.writestr(f'{protocol.name}.{PARQUET}', data)
+
+
+def read_table(filename: str, columns: Iterable[str] = None) -> "pa.Table | None":
+    """Read the Parquet table stored in `filename`. Return None if there is no Parquet table."""
+    if pq is None:
+        raise ModuleNotFoundError("parquet storage format requires pyarrow")
+
+    if is_empty(filename) or not zipfile.is_zipfile(filename):
+        return None
+
+    metadata: dict = persist.load_metadata(filename)
+    if metadata is None:
+        return None
+
+    with zipfile.ZipFile(filename, 'r') as fp:
+        stored_filename: str = f"{metadata['name']}.{PARQUET}"
+        if stored_filename not in fp.namelist():
+            return None
+        return pq.read_table(pa.BufferReader(fp.read(stored_filename)), columns=list(columns) if columns else None)
+
+
+def load_tagged_frame(filename: str, columns: Iterable[str] = None) -> pd.DataFrame | None:
+    """Load token level data as a data frame with one row per token (dictionary columns as categoricals).
+    Utterance attributes in `columns` are repeated for each token."""
+    table: pa.Table = read_table(filename, columns=columns)
+    if table is None:
+        return None
+    list_columns: list[str] = [name for name in table.column_names if pa.types.is_list(table.schema.field(name).type)]
+    frame: pd.DataFrame = table.to_pandas()
+    if list_columns:
+        frame = frame.explode(list_columns, ignore_index=True).dropna(subset=list_columns[:1])
+    for name in list_columns:
+        if name in DICTIONARY_COLUMNS:
+            frame[name] = frame[name].astype('category')
+    return frame
+
+
+def load_protocol(filename: str) -> interface.Protocol | None:
+    """Load a tagged protocol stored in any of the supported storage formats."""
+    table: pa.Table = read_table(filename) if pq is not None else None
+
+    if table is None:
+        return persist.load_protocol(filename)
+
+    metadata: dict = persist.load_metadata(filename)
+    tagged_columns: list[str] = [name for name in TAGGED_COLUMNS if name in table.column_names]
+    utterances: list[interface.Utterance] = []
+
+    for row in table.to_pylist():
+        annotation: dict[str, list[Any]] = {name: row.pop(name) for name in tagged_columns}
+        num_tokens, num_words = row.pop('num_tokens'), row.pop('num_words')
+        u: interface.Utterance = interface.Utterance(
+            **row, annotation=to_annotation(annotation) if tagged_columns else None
+        )
+        u.num_tokens, u.num_words = num_tokens, num_words
+        utterances.append(u)
+
+    metadata.pop('storage_format', None)
+    return interface.Protocol(utterances=utterances, **metadata, speaker_notes={}, page_references=[])
+
+
+def validate_checksum(filename: str, checksum: str, storage_format: str | interface.StorageFormat = None) -> bool:
+    """True if `filename` is stored from a protocol with `checksum` (and, if given, in `storage_format`)."""
+    metadata: dict = persist.load_metadata(filename)
+    if metadata is None or checksum != metadata.get('checksum'):
+        return False
+    if storage_format is None:
+        return True
+    # JSON and CSV zips have no `storage_format` attribute, tell them apart by stored filename
+    stored_format: str = metadata.get('storage_format')
+    if stored_format is None:
+        with zipfile.ZipFile(filename, 'r') as fp:
+            stored_format = next(
+                (f for f in STORAGE_FORMATS if f"{metadata.get('name')}.{f}" in fp.namelist()),
+                None,
+            )
+    return stored_format == getattr(storage_format_of(storage_format), 'value', PARQUET)
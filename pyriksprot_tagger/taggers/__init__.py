@@ -1,3 +1,12 @@
 # type: ignore
 
-from .stanza_tagger import StanzaTagger, StanzaTaggerFactory, create_tagger_factory, tagger_factory
+# Imported on first use, so that e.g. `taggers.batching` can be used without loading stanza and torch
+_LAZY_ATTRIBUTES: list[str] = ['StanzaTagger', 'StanzaTaggerFactory', 'create_tagger_factory', 'tagger_factory']
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        from . import stanza_tagger  # pylint: disable=import-outside-toplevel
+
+        return getattr(stanza_tagger, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
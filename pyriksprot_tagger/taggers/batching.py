@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import gc
+import os
+import resource
+from typing import Any, Callable, Sequence, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+"""Length-bucketed batching of texts sent to the tagger.
+
+Texts are sorted by (estimated) token length and packed into batches so that each batch's
+padded size (number of texts x longest text) stays within a token budget. Short interjections
+are then batched with other short texts instead of being padded to the longest speech.
+
+`AdaptiveBatcher` additionally backs off when a batch runs out of memory (CUDA OOM, or a CPU allocation
+failure or an RSS ceiling): the batch is split in halves and retried, and the smaller budget is kept.
+"""
+
+OUT_OF_MEMORY_MESSAGES: tuple[str, ...] = ("out of memory", "can't allocate memory", "cannot allocate memory")
+
+
+def estimate_token_count(text: str) -> int:
+    """Cheap token count estimate (whitespace split) used for bucketing."""
+    return len(text.split())
+
+
+def length_buckets(lengths: Sequence[int], batch_tokens: int, max_batch_size: int = None) -> list[list[int]]:
+    """Group item indices into batches of similar length.
+
+    Args:
+        lengths (Sequence[int]): Token length of each item.
+        batch_tokens (int): Max padded token count (batch size x longest item) per batch.
+        max_batch_size (int, optional): Max number of items per batch. Defaults to None (no limit).
+
+    Returns:
+        list[list[int]]: Indices into `lengths`, longest items first. An item that alone exceeds
+        `batch_tokens` is put in a batch of its own.
+    """
+    order: list[int] = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches: list[list[int]] = []
+    batch: list[int] = []
+    longest: int = 0
+
+    for i in order:
+        size: int = max(lengths[i], 1)
+        is_full: bool = max(longest, size) * (len(batch) + 1) > batch_tokens or (
+            bool(max_batch_size) and len(batch) >= max_batch_size
+        )
+        if batch and is_full:
+            batches.append(batch)
+            batch, longest = [], 0
+        batch.append(i)
+        longest = max(longest, size)
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def tag_in_buckets(
+    texts: Sequence[str],
+    tag: Callable[[list[str]], list[Any]],
+    batch_tokens: int,
+    max_batch_size: int = None,
+    lengths: Sequence[int] = None,
+) -> list[Any]:
+    """Tag `texts` bucket by bucket using `tag`. Return results in the original order."""
+    lengths = lengths if lengths is not None else [estimate_token_count(t) for t in texts]
+    results: list[Any] = [None] * len(texts)
+    for bucket in length_buckets(lengths, batch_tokens, max_batch_size):
+        for i, document in zip(bucket, tag([texts[i] for i in bucket])):
+            results[i] = document
+    return results
+
+
+def is_out_of_memory(error: BaseException) -> bool:
+    """True if `error` is an out-of-memory error (torch reports both CUDA and CPU OOM as RuntimeError)."""
+    if isinstance(error, MemoryError):
+        return True
+    return isinstance(error, RuntimeError) and any(m in str(error).lower() for m in OUT_OF_MEMORY_MESSAGES)
+
+
+def release_memory() -> None:
+    """Free what can be freed after an out-of-memory error."""
+    gc.collect()
+    try:
+        import torch  # pylint: disable=import-outside-toplevel
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+def current_rss_mb() -> float:
+    """Current resident set size of this process (peak RSS if /proc is not available)."""
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class AdaptiveBatcher:
+    """Token budget batching (see `tag_in_buckets`) that learns the largest budget that fits in memory.
+
+    A batch that fails with an out-of-memory error is split in halves and retried, and the budget is lowered
+    to half the failed batch's padded size for the rest of the run. A single text that does not fit is retried
+    as long as `on_out_of_memory` (e.g. lowering the model's internal batch sizes) returns True.
+    If `max_rss_mb` is set, a batch that grows RSS beyond it lowers the budget the same way (on CPU, exhausting
+    memory usually kills the process instead of raising an error).
+    """
+
+    def __init__(
+        self,
+        batch_tokens: int,
+        max_batch_size: int = None,
+        max_rss_mb: float = None,
+        min_batch_tokens: int = 1,
+        on_out_of_memory: Callable[[], bool] = None,
+    ):
+        self.batch_tokens: int = batch_tokens
+        self.max_batch_size: int = max_batch_size
+        self.max_rss_mb: float = max_rss_mb
+        self.min_batch_tokens: int = min_batch_tokens
+        self.on_out_of_memory: Callable[[], bool] = on_out_of_memory
+        self.backoffs: int = 0
+
+    def shrink(self, padded_size: int, reason: str) -> None:
+        batch_tokens: int = max(min(self.batch_tokens, padded_size // 2), self.min_batch_tokens)
+        if batch_tokens < self.batch_tokens:
+            logger.warning(f"batching: {reason}, batch_tokens {self.batch_tokens} -> {batch_tokens}")
+            self.batch_tokens = batch_tokens
+        self.backoffs += 1
+
+    def tag(self, texts: Sequence[str], tag: Callable[[list[str]], list[Any]], lengths: Sequence[int] = None) -> list:
+        """Tag `texts` in buckets using `tag`. Return results in the original order."""
+        lengths = lengths if lengths is not None else [estimate_token_count(t) for t in texts]
+        results: list[Any] = [None] * len(texts)
+        for bucket in length_buckets(lengths, self.batch_tokens, self.max_batch_size):
+            documents: list[Any] = self._tag([texts[i] for i in bucket], [lengths[i] for i in bucket], tag)
+            for i, document in zip(bucket, documents):
+                results[i] = document
+        return results
+
+    def _tag(self, texts: list[str], lengths: list[int], tag: Callable[[list[str]], list[Any]]) -> list[Any]:
+        padded_size: int = max(max(lengths, default=1), 1) * len(texts)
+        rss_before: float = current_rss_mb() if self.max_rss_mb else 0.0
+        try:
+            documents: list[Any] = tag(texts)
+        except Exception as ex:  # pylint: disable=broad-except
+            if not is_out_of_memory(ex):
+                raise
+            release_memory()
+            if len(texts) > 1:
+                self.shrink(padded_size, f"out of memory ({len(texts)} texts, {padded_size} padded tokens)")
+                half: int = len(texts) // 2
+                return self._tag(texts[:half], lengths[:half], tag) + self._tag(texts[half:], lengths[half:], tag)
+            if self.on_out_of_memory is not None and self.on_out_of_memory():
+                self.backoffs += 1
+                return self._tag(texts, lengths, tag)
+            raise
+
+        if self.max_rss_mb:
+            rss_after: float = current_rss_mb()
+            if rss_after > self.max_rss_mb and rss_after > rss_before:
+                release_memory()
+                self.shrink(padded_size, f"RSS {rss_after:.0f} MB exceeds {self.max_rss_mb:.0f} MB")
+
+        return documents
+
+
+def pool(groups: Sequence[Sequence[T]]) -> tuple[list[T], list[int]]:
+    """Flatten `groups` into a single list. Return flattened items and group sizes."""
+    return [x for group in groups for x in group], [len(group) for group in groups]
+
+
+def unpool(items: Sequence[T], sizes: Sequence[int]) -> list[list[T]]:
+    """Split `items` back into groups of given `sizes` (inverse of `pool`)."""
+    groups: list[list[T]] = []
+    offset: int = 0
+    for size in sizes:
+        groups.append(list(items[offset : offset + size]))
+        offset += size
+    return groups
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Sequence
+
+from loguru import logger
+from pyriksprot import TaggedDocument
+
+"""Persistent, content-addressed cache of tagged documents.
+
+Keys are hashes of the (preprocessed) text plus a fingerprint of the tagger configuration, so
+entries survive corpus releases but are never reused by a differently configured tagger.
+The cache is bounded by number of items and evicts least recently used entries.
+
+`Deduplicator` is the in-memory counterpart used within a run: identical texts (chair formulas, "Herr talman!",
+vote announcements) are tagged once per batch, and short texts are remembered across batches.
+"""
+
+SQL_CREATE: str = """
+    create table if not exists documents (
+        key text primary key,
+        document blob not null,
+        accessed integer not null
+    );
+    create index if not exists documents_accessed on documents(accessed);
+"""
+
+SQL_CREATE_LEMMAS: str = """
+    create table if not exists lemmas (
+        word text not null,
+        upos text not null,
+        lemma text not null,
+        primary key (word, upos)
+    ) without rowid;
+    create table if not exists lemmas_meta (
+        key text primary key,
+        value text not null
+    );
+"""
+
+SQLITE_MAX_VARIABLES: int = 900
+
+
+def config_fingerprint(*values: Any) -> str:
+    """Compute a stable hash of (JSON serializable) configuration `values`."""
+
+    def default(value: Any) -> str:
+        if callable(value):
+            return getattr(value, '__qualname__', getattr(value, '__name__', type(value).__name__))
+        return repr(value)
+
+    data: str = json.dumps(values, sort_keys=True, default=default)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(filename: str) -> tuple[str, int, int] | None:
+    """Identify a (model) file by name, size and modification time."""
+    if not filename or not os.path.isfile(filename):
+        return None
+    stat: os.stat_result = os.stat(filename)
+    return (os.path.basename(filename), stat.st_size, int(stat.st_mtime))
+
+
+def chunks(items: Sequence[Any], size: int = SQLITE_MAX_VARIABLES) -> Iterable[Sequence[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class TaggedDocumentCache:
+    """SQLite backed LRU cache that maps text to `TaggedDocument`."""
+
+    def __init__(self, filename: str, fingerprint: str = "", max_items: int = 5_000_000):
+        self.filename: str = filename
+        self.fingerprint: str = fingerprint
+        self.max_items: int = max_items
+        self.hits: int = 0
+        self.misses: int = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+
+        self.db: sqlite3.Connection = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self.db.execute("pragma journal_mode=wal")
+        self.db.execute("pragma synchronous=normal")
+        self.db.executescript(SQL_CREATE)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.fingerprint}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> list[TaggedDocument | None]:
+        keys: list[str] = [self.key(t) for t in texts]
+        found: dict[str, TaggedDocument] = {}
+        for chunk in chunks(list(set(keys))):
+            sql: str = f"select key, document from documents where key in ({','.join('?' * len(chunk))})"
+            found.update((key, pickle.loads(data)) for key, data in self.db.execute(sql, chunk))
+
+        if found:
+            now: int = time.time_ns()
+            with self.db:
+                self.db.executemany("update documents set accessed = ? where key = ?", ((now, k) for k in found))
+
+        documents: list[TaggedDocument | None] = [found.get(k) for k in keys]
+        num_hits: int = sum(d is not None for d in documents)
+        self.hits += num_hits
+        self.misses += len(documents) - num_hits
+        return documents
+
+    def put_many(self, texts: Sequence[str], documents: Sequence[TaggedDocument]) -> None:
+        now: int = time.time_ns()
+        with self.db:
+            self.db.executemany(
+                "insert or replace into documents(key, document, accessed) values (?, ?, ?)",
+                ((self.key(t), pickle.dumps(dict(d), pickle.HIGHEST_PROTOCOL), now) for t, d in zip(texts, documents)),
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove least recently used items exceeding `max_items`. Return number of removed items."""
+        if not self.max_items:
+            return 0
+        (count,) = self.db.execute("select count(*) from documents").fetchone()
+        excess: int = count - self.max_items
+        if excess <= 0:
+            return 0
+        with self.db:
+            self.db.execute(
+                "delete from documents where key in (select key from documents order by accessed limit ?)", (excess,)
+            )
+        return excess
+
+    def tag(self, texts: Sequence[str], tag: Callable[[list[str]], list[TaggedDocument]]) -> list[TaggedDocument]:
+        """Return cached documents for `texts`, tagging only cache misses with `tag`."""
+        documents: list[TaggedDocument | None] = self.get_many(texts)
+        missing: list[int] = [i for i, d in enumerate(documents) if d is None]
+        if missing:
+            missing_texts: list[str] = [texts[i] for i in missing]
+            tagged_documents: list[TaggedDocument] = tag(missing_texts)
+            self.put_many(missing_texts, tagged_documents)
+            for i, document in zip(missing, tagged_documents):
+                documents[i] = document
+        return documents
+
+    @property
+    def hit_rate(self) -> float:
+        total: int = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        logger.info(f"tagging cache: {self.hits} hits, {self.misses} misses (hit rate {self.hit_rate:.1%})")
+        self.db.close()
+
+
+class LemmaTable:
+    """SQLite backed (word, upos) -> lemma table that grows across runs (see `CachedLemmatizer`).
+
+    The table is tied to a lemmatizer model by `fingerprint`, and is emptied if the fingerprint changes.
+    Pairs seen during a run are also kept in memory, the number of distinct pairs is small compared to the corpus.
+    """
+
+    def __init__(self, filename: str, fingerprint: str = ""):
+        self.filename: str = filename
+        self.fingerprint: str = fingerprint
+        self.lemmas: dict[tuple[str, str], str] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+
+        self.db: sqlite3.Connection = self.connect()
+        self.db.executescript(SQL_CREATE_LEMMAS)
+
+        stored: tuple | None = self.db.execute("select value from lemmas_meta where key = 'fingerprint'").fetchone()
+        if stored is None or stored[0] != fingerprint:
+            if stored is not None:
+                logger.warning(f"lemma cache: model changed, clearing {filename}")
+            with self.db:
+                self.db.execute("delete from lemmas")
+                self.db.execute(
+                    "insert or replace into lemmas_meta(key, value) values ('fingerprint', ?)", (fingerprint,)
+                )
+
+    def connect(self) -> sqlite3.Connection:
+        db: sqlite3.Connection = sqlite3.connect(self.filename, timeout=60, check_same_thread=False)
+        db.execute("pragma journal_mode=wal")
+        db.execute("pragma synchronous=normal")
+        return db
+
+    def reopen(self) -> None:
+        """Open a new connection (SQLite connections must not be used across fork)."""
+        self.db = self.connect()
+
+    def get_many(self, pairs: Sequence[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        """Return lemmas of known (distinct) `pairs`."""
+        lemmas: dict[tuple[str, str], str] = self.lemmas
+        found: dict[tuple[str, str], str] = {p: lemmas[p] for p in pairs if p in lemmas}
+        unknown: list[tuple[str, str]] = [p for p in pairs if p not in found]
+
+        for chunk in chunks(unknown, SQLITE_MAX_VARIABLES // 2):
+            sql: str = (
+                "select word, upos, lemma from lemmas "
+                f"where (word, upos) in (values {','.join(['(?, ?)'] * len(chunk))})"
+            )
+            rows: list[tuple[str, str, str]] = self.db.execute(sql, [x for p in chunk for x in p]).fetchall()
+            found.update(((word, upos), lemma) for word, upos, lemma in rows)
+
+        lemmas.update(found)
+        self.hits += len(found)
+        self.misses += len(pairs) - len(found)
+        return found
+
+    def put_many(self, lemmas: dict[tuple[str, str], str]) -> None:
+        self.lemmas.update(lemmas)
+        with self.db:
+            self.db.executemany(
+                "insert or ignore into lemmas(word, upos, lemma) values (?, ?, ?)",
+                ((word, upos, lemma) for (word, upos), lemma in lemmas.items()),
+            )
+
+    def __len__(self) -> int:
+        (count,) = self.db.execute("select count(*) from lemmas").fetchone()
+        return count
+
+    @property
+    def hit_rate(self) -> float:
+        total: int = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        logger.info(f"lemma cache: {self.hits} hits, {self.misses} misses (hit rate {self.hit_rate:.1%})")
+        self.db.close()
+
+
+class Deduplicator:
+    """Tags each distinct text once: duplicates within a batch share the document, and texts of at most
+    `max_length` characters are kept in a bounded in-memory LRU (`max_items`) for the rest of the run."""
+
+    def __init__(self, max_items: int = 100_000, max_length: int = 1_000):
+        self.max_items: int = max_items
+        self.max_length: int = max_length
+        self.memo: OrderedDict[str, TaggedDocument] = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+        self.texts: int = 0
+        self.batch_hits: int = 0
+        self.run_hits: int = 0
+
+    def lookup(self, text: str) -> TaggedDocument | None:
+        with self.lock:
+            document: TaggedDocument = self.memo.get(text)
+            if document is not None:
+                self.memo.move_to_end(text)
+            return document
+
+    def remember(self, texts: Sequence[str], documents: Sequence[TaggedDocument]) -> None:
+        if not self.max_items:
+            return
+        with self.lock:
+            for text, document in zip(texts, documents):
+                if len(text) <= self.max_length:
+                    self.memo[text] = document
+            while len(self.memo) > self.max_items:
+                self.memo.popitem(last=False)
+
+    def tag(self, texts: Sequence[str], tag: Callable[[list[str]], list[TaggedDocument]]) -> list[TaggedDocument]:
+        """Return documents for `texts`, tagging only distinct texts not seen before in this run with `tag`."""
+        documents: list[TaggedDocument | None] = [self.lookup(t) for t in texts]
+        positions: dict[str, list[int]] = {}
+        for i, text in enumerate(texts):
+            if documents[i] is None:
+                positions.setdefault(text, []).append(i)
+
+        unique_texts: list[str] = list(positions)
+        if unique_texts:
+            tagged_documents: list[TaggedDocument] = tag(unique_texts)
+            self.remember(unique_texts, tagged_documents)
+            for text, document in zip(unique_texts, tagged_documents):
+                for i in positions[text]:
+                    documents[i] = document
+
+        self.texts += len(texts)
+        self.run_hits += len(texts) - sum(len(p) for p in positions.values())
+        self.batch_hits += sum(len(p) for p in positions.values()) - len(unique_texts)
+        return documents
+
+    @property
+    def hits(self) -> int:
+        return self.batch_hits + self.run_hits
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.texts if self.texts else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return dict(
+            texts=self.texts, batch_hits=self.batch_hits, run_hits=self.run_hits, hit_rate=round(self.hit_rate, 4)
+        )
+
+    def close(self) -> None:
+        logger.info(
+            f"dedup: {self.hits} of {self.texts} texts were duplicates ({self.batch_hits} within batch, "
+            f"{self.run_hits} earlier in run, hit rate {self.hit_rate:.1%})"
+        )
+        self.memo.clear()
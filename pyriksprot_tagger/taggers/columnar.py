@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+from pyriksprot.workflows.tag import TAGGED_COLUMNS
+
+"""Columnar, dictionary-encoded tagged documents.
+
+Instead of parallel lists of Python strings, each column is stored as a compact NumPy array of
+ids into a per-run `Vocabulary`. Columns are decoded to lists of strings only when accessed (and not
+kept), so a `ColumnarTaggedDocument` can be used wherever a `TaggedDocument` (Mapping[str, list[str]])
+is expected.
+"""
+
+ENCODED_COLUMNS: dict[str, type] = {
+    'token': np.int32,
+    'lemma': np.int32,
+    'pos': np.uint8,
+    'xpos': np.uint8,
+}
+
+
+class TokenIds(dict):
+    """token => id mapping, unknown tokens are assigned the next id when looked up."""
+
+    def __init__(self, id2token: list[str]):
+        super().__init__()
+        self.id2token: list[str] = id2token
+
+    def __missing__(self, token: str) -> int:
+        token_id: int = len(self.id2token)
+        self[token] = token_id
+        self.id2token.append(token)
+        return token_id
+
+
+class Vocabulary:
+    """Bidirectional string <-> id mapping that grows as new strings are encoded."""
+
+    def __init__(self, dtype: type = np.int32):
+        self.dtype: type = dtype
+        self.capacity: int = np.iinfo(dtype).max + 1
+        self.id2token: list[str] = []
+        self.token2id: TokenIds = TokenIds(self.id2token)
+
+    def __len__(self) -> int:
+        return len(self.id2token)
+
+    def add(self, token: str) -> int:
+        return self.token2id[token]
+
+    def encode(self, tokens: Iterable[str], count: int = None) -> np.ndarray:
+        """Encode `tokens` straight into an array (new tokens are added in order of first occurrence). If
+        `count` is given, `tokens` can be any iterable of `count` tokens (no intermediate list is built)."""
+        if count is None:
+            tokens = tokens if isinstance(tokens, list) else list(tokens)
+            count = len(tokens)
+        ids: Iterator[int] = map(self.token2id.__getitem__, tokens)
+        if len(self.id2token) + count <= self.capacity:
+            return np.fromiter(ids, dtype=self.dtype, count=count)
+        # New tokens may outgrow the dtype, encode into a dtype that fits any new ids
+        wide_ids: np.ndarray = np.fromiter(ids, dtype=self.fitting_dtype(len(self.id2token) + count), count=count)
+        self.widen()
+        return wide_ids.astype(self.dtype, copy=False)
+
+    def fitting_dtype(self, size: int) -> type:
+        """Smallest dtype (`dtype` or wider) that holds `size` ids."""
+        dtype: type = self.dtype
+        while size > np.iinfo(dtype).max + 1:
+            dtype = np.uint16 if dtype == np.uint8 else np.int64
+        return dtype
+
+    def widen(self) -> None:
+        # Tag set outgrew the small dtype, widen it rather than overflow
+        self.dtype = self.fitting_dtype(len(self.id2token))
+        self.capacity = np.iinfo(self.dtype).max + 1
+
+    def decode(self, ids: np.ndarray) -> list[str]:
+        id2token: list[str] = self.id2token
+        return [id2token[i] for i in ids.tolist()]
+
+
+class Vocabularies:
+    """Shared (per-run) vocabularies, one per encoded column."""
+
+    def __init__(self):
+        self.vocabs: dict[str, Vocabulary] = {name: Vocabulary(dtype) for name, dtype in ENCODED_COLUMNS.items()}
+
+    def __getitem__(self, column: str) -> Vocabulary:
+        return self.vocabs[column]
+
+
+class ColumnarTaggedDocument(Mapping):
+    """Read-only mapping of column name to values, decoded lazily from id arrays."""
+
+    def __init__(self, vocabs: Vocabularies, columns: dict[str, np.ndarray], scalars: dict[str, Any] = None):
+        self.vocabs: Vocabularies = vocabs
+        self.columns: dict[str, np.ndarray] = columns
+        self.scalars: dict[str, Any] = scalars or {}
+
+    @staticmethod
+    def encode(vocabs: Vocabularies, data: dict[str, Any]) -> "ColumnarTaggedDocument":
+        columns: dict[str, np.ndarray] = {}
+        scalars: dict[str, Any] = {}
+        for key, value in data.items():
+            if key in ENCODED_COLUMNS:
+                columns[key] = vocabs[key].encode(value)
+            elif key == 'sentence_id':
+                columns[key] = np.array(value, dtype=np.int32)
+            else:
+                scalars[key] = value
+        return ColumnarTaggedDocument(vocabs, columns, scalars)
+
+    def __getitem__(self, key: str) -> Any:
+        """Scalar, or decoded column (decoded on each access, use `to_dict` to decode all columns once)."""
+        if key in self.scalars:
+            return self.scalars[key]
+        ids: np.ndarray = self.columns[key]
+        return self.vocabs[key].decode(ids) if key in ENCODED_COLUMNS else ids.tolist()
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.columns
+        yield from self.scalars
+
+    def __len__(self) -> int:
+        return len(self.columns) + len(self.scalars)
+
+    def ids(self, key: str) -> np.ndarray:
+        """Encoded ids of `key` (without decoding)."""
+        return self.columns[key]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {key: self[key] for key in self}
+
+    def to_csv(self, sep: str = '\t') -> str:
+        """Same TSV as `ITagger.to_csv`, each column decoded once."""
+        word_count: int = len(self.columns['token'])
+        names: list[str] = [c for c in TAGGED_COLUMNS if c in self.columns and len(self.columns[c]) == word_count]
+        values: list[list[str]] = [self[c] if c in ENCODED_COLUMNS else list(map(str, self[c])) for c in names]
+        return sep.join(names) + '\n' + '\n'.join(map(sep.join, zip(*values)))
+
+    def __reduce__(self):
+        # Pickle as a plain dict (vocabularies are per-run and not shared with other processes)
+        return (dict, (self.to_dict(),))
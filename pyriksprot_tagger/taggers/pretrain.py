@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+import pickle
+from typing import Any
+
+import numpy as np
+import torch
+from loguru import logger
+from stanza.models.common.foundation_cache import FoundationCache
+from stanza.models.common.pretrain import Pretrain, PretrainedWordVocab
+
+"""Memory-mapped pretrained word embeddings.
+
+Stanza loads a pretrain file (vocabulary and embedding matrix, e.g. `full_sv_talbanken.pretrain.pt`) into
+private memory in each process. Here the file is converted once into two sidecar files next to it:
+
+    {pretrain}.vocab.pkl    the vocabulary's state dict
+    {pretrain}.emb.npy      the embedding matrix
+
+The matrix is then loaded as a (copy-on-write) NumPy memmap, so all tagger processes share the same page
+cache pages and startup doesn't need to unpickle the matrix. Sidecars are recreated if the pretrain file
+is newer.
+"""
+
+VOCAB_SUFFIX: str = ".vocab.pkl"
+EMB_SUFFIX: str = ".emb.npy"
+
+_memory_maps: list[np.ndarray] = []
+
+
+def sidecar_filenames(filename: str) -> tuple[str, str]:
+    return f"{filename}{VOCAB_SUFFIX}", f"{filename}{EMB_SUFFIX}"
+
+
+def is_converted(filename: str) -> bool:
+    mtime: float = os.path.getmtime(filename)
+    return all(os.path.isfile(f) and os.path.getmtime(f) >= mtime for f in sidecar_filenames(filename))
+
+
+def convert_pretrain(filename: str, force: bool = False) -> tuple[str, str]:
+    """Write vocabulary and embedding sidecars of Stanza pretrain `filename` (unless up to date)."""
+    vocab_filename, emb_filename = sidecar_filenames(filename)
+    if not force and is_converted(filename):
+        return vocab_filename, emb_filename
+
+    logger.info(f"pretrain: converting {filename} to memory mappable sidecars")
+    # Pretrains hold a NumPy matrix, which newer torch versions refuse to load with `weights_only`
+    data: dict[str, Any] = torch.load(filename, lambda storage, loc: storage, weights_only=False)
+    if 'emb' not in data or 'vocab' not in data:
+        raise ValueError(f"{filename} is not a Stanza pretrain file")
+
+    emb: np.ndarray = np.ascontiguousarray(data['emb'])
+    for target, write in [
+        (vocab_filename, lambda fp: pickle.dump(data['vocab'], fp, pickle.HIGHEST_PROTOCOL)),
+        (emb_filename, lambda fp: np.save(fp, emb)),
+    ]:
+        tmp_filename: str = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_filename, 'wb') as fp:
+            write(fp)
+        os.replace(tmp_filename, target)
+
+    return vocab_filename, emb_filename
+
+
+class MemmapPretrain(Pretrain):
+    """Stanza `Pretrain` that reads the embedding matrix as a memmap of the sidecar (see `convert_pretrain`)."""
+
+    def load(self) -> None:
+        vocab_filename, emb_filename = convert_pretrain(self.filename)
+        with open(vocab_filename, 'rb') as fp:
+            self._vocab = PretrainedWordVocab.load_state_dict(pickle.load(fp))
+        # Copy-on-write, since torch requires writable arrays (the frozen embedding is never written)
+        self._emb = np.load(emb_filename, mmap_mode='c')
+        _memory_maps.append(self._emb)
+        logger.info(f"pretrain: memory mapped {emb_filename} {self._emb.shape}")
+
+
+class MemmapFoundationCache(FoundationCache):
+    """Foundation cache that loads pretrains as `MemmapPretrain` (falls back to Stanza's loader on failure)."""
+
+    def load_pretrain(self, filename: str) -> Pretrain:
+        if filename is None:
+            return None
+        with self.lock:
+            if filename not in self.pretrains:
+                pretrain: Pretrain = MemmapPretrain(filename)
+                try:
+                    pretrain.load()
+                except OSError as ex:
+                    logger.warning(f"pretrain: unable to memory map {filename} ({ex}), loading into memory")
+                    pretrain = Pretrain(filename)
+                self.pretrains[filename] = pretrain
+            return self.pretrains[filename]
+
+
+def is_memory_mapped(tensor: torch.Tensor) -> bool:
+    """True if `tensor` shares memory with a memory-mapped pretrain."""
+    address: int = tensor.data_ptr()
+    return any(m.ctypes.data <= address < m.ctypes.data + m.nbytes for m in _memory_maps)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import copy
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+import stanza
+import torch
+from loguru import logger
+from pyriksprot import TaggedDocument
+
+"""Optional int8 dynamic quantization of Stanza's POS and lemma models (CPU only).
+
+After the pipeline is loaded, the `Linear`, `LSTM` and `LSTMCell` layers of the POS tagger and the seq2seq
+lemmatizer are replaced by dynamically quantized versions (int8 weights, activations quantized on the fly).
+Embeddings, including the (memory-mapped) pretrain, are left as is.
+
+Quantization is gated on accuracy: a calibration sample is tagged with both the fp32 and the quantized models,
+and the quantized models are only kept if token-level agreement of lemma, upos and xpos are all at least
+`min_agreement`. Otherwise the fp32 models are restored.
+"""
+
+QUANTIZE_MODES: dict[str, torch.dtype] = {'int8': torch.qint8}
+QUANTIZED_LAYERS: set[type] = {torch.nn.Linear, torch.nn.LSTM, torch.nn.LSTMCell}
+AGREEMENT_COLUMNS: list[str] = ['lemma', 'pos', 'xpos']
+DEFAULT_MIN_AGREEMENT: float = 0.98
+
+DEFAULT_CALIBRATION_TEXTS: list[str] = [
+    "Herr talman! Jag vill börja med att tacka statsrådet för svaret på min interpellation.",
+    "Regeringen har i budgetpropositionen föreslagit att anslaget till kommunerna ska höjas med två miljarder kronor.",
+    "Utskottet föreslår att riksdagen avslår motionerna om ändrade regler för arbetslöshetsförsäkringen.",
+    "Det är inte rimligt att äldre människor ska behöva vänta i månader på att få en plats i särskilt boende.",
+    "Vi socialdemokrater anser att skolan ska vara likvärdig i hela landet, oavsett var man bor.",
+    "Jag yrkar bifall till reservationen och avslag på utskottets förslag i övrigt.",
+    "Försvarsministern redogjorde i går för läget i Östersjön och för de beslut som fattats i Bryssel.",
+    "Kammaren beslutade att ärendet skulle bordläggas till nästa sammanträde.",
+    "Fru talman! Frågan om bostadsbyggandet har diskuterats i riksdagen under många år utan att något har hänt.",
+    "Den ekonomiska utvecklingen under 1970-talet innebar stora påfrestningar för industrin i Norrland.",
+]
+
+
+def processor_trainers(nlp: stanza.Pipeline, processors: tuple[str, ...] = ('pos', 'lemma')) -> dict[str, Any]:
+    """Return Stanza trainers (holding `model`) of `processors` that have a neural model."""
+    trainers: dict[str, Any] = {}
+    for name in processors:
+        processor = nlp.processors.get(name)
+        if processor is None:
+            continue
+        trainer = getattr(processor, '_trainer', None) or getattr(getattr(processor, '_variant', None), 'trainer', None)
+        if isinstance(getattr(trainer, 'model', None), torch.nn.Module):
+            trainers[name] = trainer
+    return trainers
+
+
+def check_mode(mode: str) -> None:
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"unknown quantization {mode}, expected one of {', '.join(QUANTIZE_MODES)}")
+
+
+def quantize_module(module: torch.nn.Module, mode: str = 'int8') -> torch.nn.Module:
+    """Return a dynamically quantized copy of `module`. Frozen parameters (e.g. memory-mapped pretrained
+    embeddings) are shared with `module`, not copied."""
+    check_mode(mode)
+    frozen: dict[int, torch.nn.Parameter] = {id(p): p for p in module.parameters() if not p.requires_grad}
+    return torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(module, memo=frozen), QUANTIZED_LAYERS, dtype=QUANTIZE_MODES[mode], inplace=True
+    )
+
+
+def quantize_models(nlp: stanza.Pipeline, mode: str = 'int8') -> dict[str, torch.nn.Module]:
+    """Replace POS and lemma models of `nlp` with quantized copies. Return the original models (see `restore_models`)."""
+    check_mode(mode)
+    originals: dict[str, torch.nn.Module] = {}
+    for name, trainer in processor_trainers(nlp).items():
+        originals[name] = trainer.model
+        trainer.model = quantize_module(trainer.model, mode)
+    return originals
+
+
+def restore_models(nlp: stanza.Pipeline, originals: dict[str, torch.nn.Module]) -> None:
+    for name, trainer in processor_trainers(nlp, tuple(originals)).items():
+        trainer.model = originals[name]
+
+
+def token_agreement(reference: list[TaggedDocument], candidate: list[TaggedDocument]) -> dict[str, float]:
+    """Fraction of tokens with equal lemma, pos and xpos in `reference` and `candidate` (unaligned tokens disagree)."""
+    agreement: dict[str, float] = {}
+    for column in AGREEMENT_COLUMNS:
+        matches, total = 0, 0
+        for x, y in zip(reference, candidate):
+            matches += sum(a == b for a, b in zip(x[column], y[column]))
+            total += max(len(x[column]), len(y[column]))
+        agreement[column] = matches / total if total > 0 else 1.0
+    return agreement
+
+
+@dataclass
+class QuantizationReport:
+    mode: str
+    min_agreement: float
+    tokens: int = 0
+    agreement: dict[str, float] = field(default_factory=dict)
+    seconds: float = 0.0
+    quantized_seconds: float = 0.0
+    activated: bool = False
+
+    @property
+    def speedup(self) -> float:
+        return self.seconds / self.quantized_seconds if self.quantized_seconds > 0 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self) | {'speedup': round(self.speedup, 3)}
+
+
+def compare_quantized(
+    nlp: stanza.Pipeline,
+    tag: Callable[[list[str]], list[TaggedDocument]],
+    texts: list[str],
+    mode: str = 'int8',
+    min_agreement: float = DEFAULT_MIN_AGREEMENT,
+) -> QuantizationReport:
+    """Tag `texts` with fp32 and quantized models of `nlp`. Keep quantized models only if agreement of all
+    columns is at least `min_agreement`, otherwise restore the fp32 models."""
+    check_mode(mode)
+    report: QuantizationReport = QuantizationReport(mode=mode, min_agreement=min_agreement)
+
+    tag(texts[:1])  # warm up, so that one-time costs aren't attributed to the fp32 models
+
+    start: float = time.perf_counter()
+    reference: list[TaggedDocument] = tag(texts)
+    report.seconds = time.perf_counter() - start
+
+    originals: dict[str, torch.nn.Module] = quantize_models(nlp, mode)
+
+    start = time.perf_counter()
+    candidate: list[TaggedDocument] = tag(texts)
+    report.quantized_seconds = time.perf_counter() - start
+
+    report.tokens = sum(len(d['token']) for d in reference)
+    report.agreement = token_agreement(reference, candidate)
+    report.activated = bool(originals) and min(report.agreement.values()) >= min_agreement
+
+    if report.activated:
+        logger.info(
+            f"quantize: {mode} {', '.join(originals)} models activated, agreement "
+            f"{', '.join(f'{k}={v:.4f}' for k, v in report.agreement.items())} (speed-up {report.speedup:.2f}x)"
+        )
+    else:
+        restore_models(nlp, originals)
+        logger.warning(
+            f"quantize: {mode} refused, agreement {', '.join(f'{k}={v:.4f}' for k, v in report.agreement.items())} "
+            f"below {min_agreement} (or no models to quantize), using fp32 models"
+        )
+    return report
+
+
+def read_calibration_texts(calibration: str | list[str] = None) -> list[str]:
+    """Calibration texts: given list, lines of a text file, or `DEFAULT_CALIBRATION_TEXTS`."""
+    if calibration is None:
+        return DEFAULT_CALIBRATION_TEXTS
+    if isinstance(calibration, str):
+        with open(calibration, encoding="utf-8") as fp:
+            return [line.strip() for line in fp if line.strip()]
+    return list(calibration)
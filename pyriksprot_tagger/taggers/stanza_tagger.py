@@ -1,17 +1,34 @@
 from __future__ import annotations
 
 import os
+from itertools import chain
+from operator import attrgetter
 from os.path import isdir
-from typing import Any, Callable, List, Literal, Union
+from typing import Any, Callable, Iterator, List, Literal, NamedTuple, Union
 
+import numpy as np
 import stanza
 import stanza.pipeline.processor as spp
+import torch
 from loguru import logger
-from pyriksprot import ITagger, ITaggerFactory, SwedishDehyphenator, TaggedDocument
+from pyriksprot import ITagger, ITaggerFactory, TaggedDocument
 from pyriksprot.configuration import ConfigValue, inject_config
 from pyriksprot.foss import sparv_tokenize
+from stanza.models.common.doc import ID, TEXT, Sentence, Token, Word
+from stanza.models.common.utils import default_device
+from stanza.models.lemma.data import DataLoader as LemmaDataLoader
+from stanza.models.lemma.trainer import Trainer as LemmaTrainer
+from stanza.pipeline._constants import POS, TOKENIZE
+from stanza.pipeline.lemma_processor import LemmaProcessor
 
 from .. import utility
+from ..dehyphen import CachedDehyphenator
+from ..metrics import MetricsCollector, TimedPreprocessor, collector
+from . import batching
+from . import quantize as quantization
+from .cache import Deduplicator, LemmaTable, TaggedDocumentCache, config_fingerprint, file_fingerprint
+from .columnar import ColumnarTaggedDocument, Vocabularies
+from .pretrain import MemmapFoundationCache
 
 """PoS tagging using Stanford's Stanza library.
 NOTE! THIS CODE IS IN PART BASED ON https://github.com/spraakbanken/sparv-pipeline/blob/master/sparv/modules/stanza/stanza.py
@@ -19,6 +36,30 @@ NOTE! THIS CODE IS IN PART BASED ON https://github.com/spraakbanken/sparv-pipeli
 
 SENTENCE_MARKER = "--SENTENCE--"
 
+
+class MarkerWord(NamedTuple):
+    """Stand-in for a word in sentence marker rows (see `_to_columnar`)."""
+
+    text: str
+    lemma: str
+    upos: str = 'MAD'
+    xpos: str = 'MAD'
+
+
+def _lemma(word: Word | Token | MarkerWord) -> str:
+    return word.lemma or word.text.lower()
+
+
+# Value of each encoded column, per word
+COLUMN_VALUES: dict[str, Callable[[Word | Token | MarkerWord], str]] = {
+    'token': attrgetter('text'),
+    'lemma': _lemma,
+    'pos': attrgetter('upos'),
+    'xpos': attrgetter('xpos'),
+}
+
+DEFAULT_ADAPTIVE_BATCH_TOKENS: int = 50_000
+
 jj = os.path.join
 
 # pylint: disable=too-many-arguments
@@ -48,6 +89,42 @@ STANZA_DEFAULT_OPTS: dict = {
 }
 
 
+class SparvSentence(Sentence):
+    """Stanza sentence built directly from (token, start_char, end_char) spans.
+
+    Replaces `Sentence._process_tokens`, which expects one CoNLL-U dict per token, with a loop that creates
+    words and tokens by copying the attributes of a template Word/Token (created once by the Stanza constructors,
+    so that new Stanza attributes are picked up) and skips the multi-word token and dependency handling.
+    """
+
+    word_defaults: dict[str, Any] = None
+    token_defaults: dict[str, Any] = None
+
+    def _process_tokens(self, tokens: list[tuple[str, int, int]]) -> None:
+        if SparvSentence.word_defaults is None:
+            entry: dict[str, Any] = {ID: (0,), TEXT: '_'}
+            SparvSentence.word_defaults = dict(vars(Word(self, entry)))
+            SparvSentence.token_defaults = dict(vars(Token(self, entry)))
+
+        word_defaults, token_defaults = SparvSentence.word_defaults, SparvSentence.token_defaults
+        new = object.__new__
+        words: list[Word] = []
+        entries: list[Token] = []
+
+        for idx, (text, start_char, end_char) in enumerate(tokens):
+            word: Word = new(Word)
+            token: Token = new(Token)
+            vars(word).update(word_defaults, _id=idx, _text=text, _start_char=start_char, _end_char=end_char)
+            vars(token).update(token_defaults, _id=(idx,), _text=text, _start_char=start_char, _end_char=end_char)
+            word._sent = token._sent = self  # pylint: disable=protected-access
+            word._parent = token  # pylint: disable=protected-access
+            token._words = [word]  # pylint: disable=protected-access
+            words.append(word)
+            entries.append(token)
+
+        self.tokens, self.words = entries, words
+
+
 @spp.register_processor_variant('tokenize', 'sparv')
 class BetterSparvTokenizer(spp.ProcessorVariant):
     def __init__(self, config: dict):
@@ -66,24 +143,133 @@ class BetterSparvTokenizer(spp.ProcessorVariant):
         text: str = doc.text if isinstance(doc, stanza.Document) else doc
 
         tokenize: Callable = self.tokenize
-        if self.no_ssplit:
-            sentences: list[dict[str, str | int]] = [
-                [
-                    {'id': idx, 'text': token, 'start_char': start_char, 'end_char': end_char}
-                    for idx, (token, start_char, end_char) in enumerate(tokenize(text))
-                ]
-            ]
+        sentences: list[list[tuple[str, int, int]]] = (
+            [list(tokenize(text))] if self.no_ssplit else [list(sentence) for sentence in tokenize(text)]
+        )
 
-        else:
-            sentences: list[dict[str, str | int]] = [
+        return self.create_document(text, sentences)
+
+    def bulk_process(self, docs: list[stanza.Document]) -> list[stanza.Document]:
+        """Tokenize a batch of documents (called by `Pipeline` when it is given a list of documents)."""
+        return [self.process(doc) for doc in docs]
+
+    @staticmethod
+    def create_document(text: str, sentences: list[list[tuple[str, int, int]]]) -> stanza.Document:
+        """Create a stanza Document from token spans without intermediate CoNLL-U dicts."""
+        document: stanza.Document = stanza.Document([], text=text)
+        for tokens in sentences:
+            if not tokens:
+                continue
+            sentence: SparvSentence = SparvSentence(tokens, doc=document)
+            sentence.text = text[tokens[0][1] : tokens[-1][2]]
+            sentence.index = len(document.sentences)
+            document.sentences.append(sentence)
+        document.num_tokens = document.num_words = sum(len(sentence.tokens) for sentence in document.sentences)
+        return document
+
+    @staticmethod
+    def create_document_from_dicts(text: str, sentences: list[list[tuple[str, int, int]]]) -> stanza.Document:
+        """Reference implementation (one CoNLL-U dict per token), kept for benchmarking and tests."""
+        return stanza.Document(
+            sentences=[
                 [
                     {'id': idx, 'text': token, 'start_char': start_char, 'end_char': end_char}
                     for idx, (token, start_char, end_char) in enumerate(sentence)
                 ]
-                for sentence in tokenize(text)
-            ]
+                for sentence in sentences
+                if sentence
+            ],
+            text=text,
+        )
 
-        return stanza.Document(sentences=sentences, text=text)
+
+@spp.register_processor_variant('lemma', 'cache')
+class CachedLemmatizer(spp.ProcessorVariant):
+    """Stanza lemmatizer with a persistent (word, upos) -> lemma table in front of it.
+
+    Lemmatization is context free, so each distinct (word, upos) pair is lemmatized once (by Stanza's
+    dictionary and seq2seq models, as in `LemmaProcessor`) and stored in a `LemmaTable`. Only pairs not found in
+    the table are sent to the model. Enabled by pipeline options `lemma_with_cache` and `lemma_cache_filename`.
+
+    If the models are to be quantized (`lemma_quantize`), the table is not opened until `open_table` is called
+    with the quantization actually kept, so that the agreement check is done by the models (not the table), and
+    lemmas of fp32 and quantized models are not mixed. Without a table, all pairs are lemmatized by the model.
+    """
+
+    OVERRIDE = True
+    REQUIRES_DEFAULT = {TOKENIZE, POS}
+
+    def __init__(self, config: dict):
+        self.config: dict = config
+        self.trainer: LemmaTrainer = LemmaTrainer(
+            args={'charlm_forward_file': None, 'charlm_backward_file': None},
+            model_file=config['model_path'],
+            device=config.get('device') or default_device(),
+        )
+        self.batch_size: int = config.get('batch_size', LemmaProcessor.DEFAULT_BATCH_SIZE)
+        self.beam_size: int = config.get('beam_size', self.trainer.args.get('beam_size', 1))
+        self.ensemble_dict: bool = config.get('ensemble_dict', self.trainer.args.get('ensemble_dict', False))
+        self.table: LemmaTable = None if config.get('quantize') else self.open_table()
+
+    def open_table(self, quantized: str = None) -> LemmaTable:
+        """Open lemma table of the lemma model (quantized with `quantized`, if set)."""
+        self.table = LemmaTable(
+            self.config['cache_filename'],
+            fingerprint=config_fingerprint(
+                file_fingerprint(self.config['model_path']), *([quantized] if quantized else [])
+            ),
+        )
+        return self.table
+
+    def process(self, doc: stanza.Document) -> stanza.Document:
+        self.lemmatize_words([w for sentence in doc.sentences for w in sentence.words])
+        return doc
+
+    def bulk_process(self, docs: list[stanza.Document]) -> list[stanza.Document]:
+        self.lemmatize_words([w for doc in docs for sentence in doc.sentences for w in sentence.words])
+        return docs
+
+    def lemmatize_words(self, words: list[Word]) -> None:
+        """Set lemma of `words`, lemmatizing only (word, upos) pairs not found in the table."""
+        pairs: list[tuple[str, str]] = [(w.text, w.upos or '_') for w in words]
+        distinct_pairs: list[tuple[str, str]] = list(dict.fromkeys(pairs))
+        lemmas: dict[tuple[str, str], str] = self.table.get_many(distinct_pairs) if self.table is not None else {}
+        missing: list[tuple[str, str]] = [p for p in distinct_pairs if p not in lemmas]
+        if missing:
+            predicted: dict[tuple[str, str], str] = dict(zip(missing, self.lemmatize(missing)))
+            if self.table is not None:
+                self.table.put_many(predicted)
+            lemmas.update(predicted)
+        for word, pair in zip(words, pairs):
+            word.lemma = lemmas[pair]
+
+    def lemmatize(self, pairs: list[tuple[str, str]]) -> list[str]:
+        """Lemmatize (word, upos) pairs as `LemmaProcessor.process` does (dictionary, then seq2seq)."""
+        trainer: LemmaTrainer = self.trainer
+        skip: list[bool] = trainer.skip_seq2seq(pairs) if self.ensemble_dict else [False] * len(pairs)
+        unknown: list[tuple[str, str]] = [p for p, s in zip(pairs, skip) if not s]
+
+        preds, edits = [], []
+        if unknown:
+            document: stanza.Document = stanza.Document(
+                [[{'id': i + 1, 'text': word, 'upos': upos} for i, (word, upos) in enumerate(unknown)]]
+            )
+            batches: LemmaDataLoader = LemmaDataLoader(
+                document, self.batch_size, self.config, vocab=trainer.vocab, evaluation=True
+            )
+            with torch.no_grad():
+                for batch in batches:
+                    ps, es = trainer.predict(batch, self.beam_size)
+                    preds += ps
+                    if es is not None:
+                        edits += es
+            preds = trainer.postprocess([word for word, _ in unknown], preds, edits=edits)
+
+        if self.ensemble_dict:
+            predictions: Iterator[str] = iter(preds)
+            preds = trainer.ensemble(pairs, ['' if s else next(predictions) for s in skip])
+
+        return [lemma or '_' for lemma in preds]
 
 
 class StanzaTagger(ITagger):
@@ -102,6 +288,22 @@ class StanzaTagger(ITagger):
         num_threads: int = None,
         preprocessors: Callable[[str], str] = "pretokenize",
         word_or_token: Literal['words', 'tokens'] = 'words',
+        batch_tokens: int = None,
+        max_batch_size: int = None,
+        cache_filename: str = None,
+        cache_max_items: int = 5_000_000,
+        columnar: bool = False,
+        pos_batch_size: int = None,
+        lemma_batch_size: int = None,
+        adaptive_batching: bool = False,
+        max_rss_mb: float = None,
+        lemma_cache_filename: str = None,
+        memmap_pretrain: bool = True,
+        quantize: str = None,
+        quantize_min_agreement: float = quantization.DEFAULT_MIN_AGREEMENT,
+        quantize_calibration: str | list[str] = None,
+        dedup: bool = True,
+        dedup_max_items: int = 100_000,
         verbose: bool = False,
     ):
         super().__init__(preprocessors=preprocessors or "pretokenize")
@@ -116,6 +318,22 @@ class StanzaTagger(ITagger):
             tokenize_pretokenized (bool, optional): If true, then already tokenized. Defaults to True.
             tokenize_no_ssplit (bool, optional): [description]. Defaults to True.
             use_gpu (bool, optional): If true, use GPU if exists. Defaults to True.
+            batch_tokens (int, optional): If set, tag texts in length-sorted buckets of at most this many (padded) tokens. Defaults to None.
+            max_batch_size (int, optional): Max number of texts per bucket. Defaults to None.
+            cache_filename (str, optional): If set, cache tagged documents in this SQLite file. Defaults to None.
+            cache_max_items (int, optional): Max number of cached documents. Defaults to 5 000 000.
+            columnar (bool, optional): If true, return dictionary-encoded `ColumnarTaggedDocument`s. Defaults to False.
+            pos_batch_size (int, optional): Stanza's POS batch size (sentences). Defaults to None (Stanza's default).
+            lemma_batch_size (int, optional): Stanza's lemma batch size (words). Defaults to None (Stanza's default).
+            adaptive_batching (bool, optional): If true, back off on out-of-memory errors (see `batching.AdaptiveBatcher`). Defaults to False.
+            max_rss_mb (float, optional): RSS ceiling for adaptive batching (for CPU). Defaults to None.
+            lemma_cache_filename (str, optional): If set, look up lemmas in this SQLite (word, upos) table (see `CachedLemmatizer`). Defaults to None.
+            memmap_pretrain (bool, optional): If true, memory map pretrained embeddings (shared by processes, see `pretrain`). Defaults to True.
+            quantize (str, optional): If 'int8', dynamically quantize POS and lemma models (CPU only, see `quantize`). Defaults to None.
+            quantize_min_agreement (float, optional): Quantization is refused if token agreement with fp32 is below this. Defaults to 0.98.
+            quantize_calibration (str | list[str], optional): Texts (or text file) used for the agreement check. Defaults to a built-in sample.
+            dedup (bool, optional): If true, tag identical (preprocessed) texts only once per run (see `Deduplicator`). Defaults to True.
+            dedup_max_items (int, optional): Max number of short texts remembered across batches. Defaults to 100 000.
         """
         stanza_datadir = stanza_datadir or os.environ.get("STANZA_DATADIR")
 
@@ -134,6 +352,21 @@ class StanzaTagger(ITagger):
             'tokenize_no_ssplit': tokenize_no_ssplit,
         } | ({'tokenize_with_sparv': True} if tokenize_with_sparv else {})
 
+        if quantize and use_gpu and torch.cuda.is_available():
+            logger.warning("quantize: dynamic quantization is CPU only, ignored")
+            quantize = None
+
+        lemma_opts: dict = (
+            {
+                'lemma_with_cache': True,
+                'lemma_cache_filename': lemma_cache_filename,
+                'lemma_quantize': quantize,
+                'lemma_device': 'cuda' if use_gpu and torch.cuda.is_available() else 'cpu',
+            }
+            if lemma_cache_filename
+            else {}
+        )
+
         pos_opts: dict = {
             'pretrain_pos_model': jj(stanza_datadir, config["pretrain_pos_model"]),
             'pos_model_path': jj(stanza_datadir, config["pos_model"]),
@@ -149,16 +382,96 @@ class StanzaTagger(ITagger):
                 'verbose': verbose,
             }
             | tokenize_opts
+            | lemma_opts
             | pos_opts
+            | ({'pos_batch_size': pos_batch_size} if pos_batch_size else {})
+            | ({'lemma_batch_size': lemma_batch_size} if lemma_batch_size else {})
         )
 
-        self.nlp: stanza.Pipeline = stanza.Pipeline(**opts)
+        self.nlp: stanza.Pipeline = stanza.Pipeline(
+            **opts, foundation_cache=MemmapFoundationCache() if memmap_pretrain else None
+        )
+        if collector().enabled:
+            instrument_pipeline(self.nlp, collector())
         self.word_or_token: Literal['word', 'token'] = word_or_token
         self.ssplit: bool = not tokenize_no_ssplit
+        self.batch_tokens: int = batch_tokens
+        self.max_batch_size: int = max_batch_size
+        self.vocabs: Vocabularies = Vocabularies() if columnar else None
+        self.batcher: batching.AdaptiveBatcher = (
+            batching.AdaptiveBatcher(
+                batch_tokens or DEFAULT_ADAPTIVE_BATCH_TOKENS,
+                max_batch_size=max_batch_size,
+                max_rss_mb=max_rss_mb,
+                on_out_of_memory=self.shrink_processor_batches,
+            )
+            if adaptive_batching
+            else None
+        )
+        self.cache: TaggedDocumentCache = None
+        self.dedup: Deduplicator = None
+
+        self.quantization: quantization.QuantizationReport = None
+        if quantize:
+            self.quantization = quantization.compare_quantized(
+                self.nlp,
+                lambda texts: self._tag_texts([self.preprocess(t) for t in texts]),
+                quantization.read_calibration_texts(quantize_calibration),
+                mode=quantize,
+                min_agreement=quantize_min_agreement,
+            )
+        quantized: list[str] = [quantize] if self.quantization is not None and self.quantization.activated else []
+        if self.lemmatizer is not None and self.lemmatizer.table is None:
+            self.lemmatizer.open_table(*quantized)
+
+        self.fingerprint: str = config_fingerprint(
+            {
+                k: v
+                for k, v in opts.items()
+                if k not in ('dir', 'verbose', 'use_gpu', 'pos_batch_size', 'lemma_batch_size') and k not in lemma_opts
+            },
+            [file_fingerprint(opts.get(k)) for k in ('lemma_model_path', 'pos_model_path', 'pretrain_pos_model')],
+            self.preprocessors,
+            word_or_token,
+            *quantized,
+        )
+        self.cache = (
+            TaggedDocumentCache(cache_filename, fingerprint=self.fingerprint, max_items=cache_max_items)
+            if cache_filename
+            else None
+        )
+        self.dedup = Deduplicator(max_items=dedup_max_items) if dedup else None
 
     def _tag(self, text: Union[str, List[str]]) -> List[TaggedDocument]:
         """Tag text. Return dict if lists."""
 
+        if self.dedup is not None:
+            return self.dedup.tag(text, self._tag_distinct)
+
+        return self._tag_distinct(text)
+
+    def _tag_distinct(self, text: List[str]) -> List[TaggedDocument]:
+        """Tag (deduplicated) texts, through the persistent cache if enabled."""
+
+        if self.cache is not None:
+            return self.cache.tag(text, self._tag_texts)
+
+        return self._tag_texts(text)
+
+    def _tag_texts(self, text: List[str]) -> List[TaggedDocument]:
+        """Tag texts, in length-sorted buckets if `batch_tokens` is set (or adaptive batching is enabled)."""
+
+        if self.batcher is not None:
+            return self.batcher.tag(text, self._tag_batch)
+
+        if self.batch_tokens and len(text) > 1:
+            return batching.tag_in_buckets(text, self._tag_batch, self.batch_tokens, self.max_batch_size)
+
+        return self._tag_batch(text)
+
+    def _tag_batch(self, text: List[str]) -> List[TaggedDocument]:
+        """Tag a single batch of texts in one pipeline call."""
+
         documents: list[stanza.Document] = [stanza.Document([], text=d) for d in text]
 
         tagged_documents: List[stanza.Document] = self.nlp(documents)
@@ -166,7 +479,45 @@ class StanzaTagger(ITagger):
         if isinstance(tagged_documents, stanza.Document):
             tagged_documents = [tagged_documents]
 
-        return [self._to_dict(d) for d in tagged_documents]
+        to_document: Callable[[stanza.Document], TaggedDocument] = (
+            self._to_columnar if self.vocabs is not None else self._to_dict
+        )
+
+        with collector().stage("to_dict", items=len(tagged_documents)) as timer:
+            timer.tokens = sum(d.num_tokens for d in tagged_documents) if collector().enabled else 0
+            return [to_document(d) for d in tagged_documents]
+
+    def shrink_processor_batches(self) -> bool:
+        """Halve the internal batch size of Stanza's POS and lemma processors. Return False if already minimal."""
+        shrunk: bool = False
+        for name in ('pos', 'lemma'):
+            processor = self.nlp.processors.get(name)
+            batch_size: int = processor.config.get('batch_size') if processor is not None else None
+            if batch_size and batch_size > 1:
+                processor.config['batch_size'] = batch_size // 2
+                logger.warning(f"batching: out of memory, {name}_batch_size {batch_size} -> {batch_size // 2}")
+                shrunk = True
+        return shrunk
+
+    @property
+    def lemmatizer(self) -> CachedLemmatizer | None:
+        variant: spp.ProcessorVariant = getattr(self.nlp.processors.get('lemma'), '_variant', None)
+        return variant if isinstance(variant, CachedLemmatizer) else None
+
+    @property
+    def lemma_table(self) -> LemmaTable | None:
+        return self.lemmatizer.table if self.lemmatizer is not None else None
+
+    def close(self) -> None:
+        if self.dedup is not None:
+            collector().emit(dict(event="dedup") | self.dedup.stats())
+            self.dedup.close()
+            self.dedup = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        if self.lemma_table is not None:
+            self.lemma_table.close()
 
     def _to_dict(
         self,
@@ -174,40 +525,86 @@ class StanzaTagger(ITagger):
         add_sentence_marker: bool = False,
         sentence_marker: str = SENTENCE_MARKER,
     ) -> TaggedDocument:
-        """Extract tokens from tagged document. Return dict of list."""
+        """Extract tokens from tagged document. Return dict of list. If sentences are split, then sentences are
+        either separated by marker tokens (`add_sentence_marker`) or identified by a `sentence_id` column."""
         tokens, lemmas, pos, xpos, sentence_ids = [], [], [], [], []
         add_sentence_marker: bool = self.ssplit and add_sentence_marker
         add_sentence_id: bool = self.ssplit and not add_sentence_marker
 
-        sentence_id: int = -1
-        for sentence in tagged_document.sentences:
-            sentence_id += 1
+        for sentence_id, sentence in enumerate(tagged_document.sentences):
             for w in getattr(sentence, self.word_or_token):
                 tokens.append(w.text)
                 lemmas.append(w.lemma or w.text.lower())
                 pos.append(w.upos)
                 xpos.append(w.xpos)
-                if add_sentence_marker:
+                if add_sentence_id:
                     sentence_ids.append(sentence_id)
 
-            if add_sentence_id:
+            if add_sentence_marker:
                 tokens.append(sentence_marker)
                 lemmas.append(sentence_marker)
                 pos.append('MAD')
                 xpos.append('MAD')
 
-        return (
-            dict(
-                token=tokens,
-                lemma=lemmas,
-                pos=pos,
-                xpos=xpos,
-                num_tokens=tagged_document.num_tokens,
-                num_words=tagged_document.num_words,
-            )
-            | ({'sentence_id': sentence_ids} if add_sentence_id else {})
+        return dict(
+            token=tokens,
+            lemma=lemmas,
+            pos=pos,
+            xpos=xpos,
+            num_tokens=tagged_document.num_tokens,
+            num_words=tagged_document.num_words,
+        ) | ({'sentence_id': sentence_ids} if add_sentence_id else {})
+
+    def _to_columnar(
+        self,
+        tagged_document: stanza.Document,
+        add_sentence_marker: bool = False,
+        sentence_marker: str = SENTENCE_MARKER,
+    ) -> ColumnarTaggedDocument:
+        """Extract tokens from tagged document (as `_to_dict`). Return dictionary-encoded columns. Each column
+        is encoded straight from the sentences' words into an array (no intermediate lists)."""
+        add_sentence_marker: bool = self.ssplit and add_sentence_marker
+        add_sentence_id: bool = self.ssplit and not add_sentence_marker
+        sentences: list[list[Word | Token]] = [
+            getattr(sentence, self.word_or_token) for sentence in tagged_document.sentences
+        ]
+        size: int = sum(len(s) for s in sentences) + (len(sentences) if add_sentence_marker else 0)
+        marker: tuple[MarkerWord] = (MarkerWord(sentence_marker, sentence_marker),)
+
+        def words() -> Iterator[Word | Token | MarkerWord]:
+            if add_sentence_marker:
+                return chain.from_iterable(chain(s, marker) for s in sentences)
+            return chain.from_iterable(sentences)
+
+        vocabs: Vocabularies = self.vocabs
+        columns: dict[str, np.ndarray] = {
+            name: vocabs[name].encode(map(value, words()), count=size) for name, value in COLUMN_VALUES.items()
+        }
+        if add_sentence_id:
+            columns['sentence_id'] = np.repeat(np.arange(len(sentences), dtype=np.int32), [len(s) for s in sentences])
+
+        return ColumnarTaggedDocument(
+            vocabs,
+            columns,
+            scalars=dict(num_tokens=tagged_document.num_tokens, num_words=tagged_document.num_words),
         )
 
+    @staticmethod
+    def to_csv(tagged_document: TaggedDocument, sep='\t') -> str:
+        if isinstance(tagged_document, ColumnarTaggedDocument):
+            return tagged_document.to_csv(sep=sep)
+        return ITagger.to_csv(tagged_document, sep=sep)
+
+
+def instrument_pipeline(nlp: stanza.Pipeline, metrics: MetricsCollector) -> None:
+    """Record each Stanza processor's `bulk_process` calls as a stage (named by processor, e.g. `pos`)."""
+
+    def num_tokens(documents: list[stanza.Document]) -> int:
+        return sum(d.num_tokens for d in documents)
+
+    for name, processor in nlp.processors.items():
+        processor.bulk_process = metrics.timed(processor.bulk_process, name, tokens=num_tokens)
+
 
 # pylint: disable=unused-argument
 
@@ -233,9 +630,12 @@ class StanzaTaggerFactory(ITaggerFactory):
         return StanzaTaggerFactory(**(STANZA_DEFAULT_OPTS | opts))
 
     def create_dehyphen_task(self) -> Callable[[str], str]:
-        return SwedishDehyphenator.create_dehypen(
+        return CachedDehyphenator.create(
             data_folder=self.opts.get("dehyphen_datadir"),
             word_frequencies=self.opts.get("word_frequencies"),
+            cache_size=self.opts.get("dehyphen_cache_size", 1_000_000),
+            memmap_frequencies=self.opts.get("dehyphen_memmap_frequencies", True),
+            frequency_index=self.opts.get("dehyphen_frequency_index"),
         )
 
     def create_preprocessor_tasks(self) -> dict:
@@ -245,14 +645,43 @@ class StanzaTaggerFactory(ITaggerFactory):
             pipeline=self.opts.get('preprocessors'),
             fxs_tasks=fxs_tasks,
         )
+        if collector().enabled:
+            tasks = [TimedPreprocessor(fx, name) for fx, name in zip(tasks, self.opts.get('preprocessors').split(","))]
         return tasks
 
     def create(self) -> ITagger:
+        if self.opts.get("server_address"):
+            return self.create_client(self.opts.get("server_address"))
+        return self.create_tagger()
+
+    def create_client(self, address: str) -> ITagger:
+        """Create a client that tags using a resident tagging server (see `pyriksprot_tagger.server`)"""
+        from ..server import TaggingClient  # pylint: disable=import-outside-toplevel
+
+        return TaggingClient(address=address, preprocessors=self.create_preprocessor_tasks())
+
+    def create_tagger(self) -> StanzaTagger:
         tagger: StanzaTagger = StanzaTagger(
             stanza_datadir=self.opts.get("stanza_datadir"),
             preprocessors=self.create_preprocessor_tasks(),
             use_gpu=self.opts.get("use_gpu", True),
             num_threads=self.opts.get("num_threads", 2),
+            batch_tokens=self.opts.get("batch_tokens"),
+            max_batch_size=self.opts.get("max_batch_size"),
+            cache_filename=self.opts.get("cache_filename"),
+            cache_max_items=self.opts.get("cache_max_items", 5_000_000),
+            columnar=self.opts.get("columnar", False),
+            pos_batch_size=self.opts.get("pos_batch_size"),
+            lemma_batch_size=self.opts.get("lemma_batch_size"),
+            adaptive_batching=self.opts.get("adaptive_batching", False),
+            max_rss_mb=self.opts.get("max_rss_mb"),
+            lemma_cache_filename=self.opts.get("lemma_cache_filename"),
+            memmap_pretrain=self.opts.get("memmap_pretrain", True),
+            quantize=self.opts.get("quantize"),
+            quantize_min_agreement=self.opts.get("quantize_min_agreement", quantization.DEFAULT_MIN_AGREEMENT),
+            quantize_calibration=self.opts.get("quantize_calibration"),
+            dedup=self.opts.get("dedup", True),
+            dedup_max_items=self.opts.get("dedup_max_items", 100_000),
         )
 
         return tagger
@@ -288,6 +717,7 @@ def create_tagger_factory(tagger_opts: dict, dehyphen_opts: dict) -> ITaggerFact
         {
             'dehyphen_datadir': dehyphen_opts.get("folder"),
             'word_frequencies': dehyphen_opts.get("tf_filename"),
+            'dehyphen_frequency_index': dehyphen_opts.get("frequency_index"),
             'stanza_datadir': stanza_datadir,
         }
         | STANZA_DEFAULT_OPTS
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from glob import glob
+from os.path import basename, dirname, getsize, isfile
+from os.path import join as jj
+from typing import Callable, Iterable, Iterator
+
+from loguru import logger
+from pyriksprot import ITagger, TaggedDocument, interface
+from pyriksprot.interface import StorageFormat
+from pyriksprot.corpus.parlaclarin import parse
+from pyriksprot.utility import ensure_path, strip_path_and_extension, touch, unlink
+from pyriksprot.workflows.tag import expired, resolve_target_filename
+from tqdm import tqdm
+
+from . import storage
+from .journal import DONE, EMPTY, FAILED, RunJournal
+from .metrics import collector
+from .taggers import batching
+from .utility import preprocess_texts
+
+"""Protocol level tagging used by the `pos_tag` CLI (scripts/tag.py).
+Mirrors `pyriksprot.workflows.tag` but lets several protocols share the same tagger calls.
+"""
+
+
+@dataclass
+class TagJob:
+    """A parsed and preprocessed protocol waiting to be tagged."""
+
+    source_file: str
+    target_file: str
+    protocol: interface.Protocol
+    checksum: str
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def texts(self) -> list[str]:
+        return [u.text for u in self.protocol.utterances]
+
+
+def prepare_job(
+    source_file: str,
+    target_file: str,
+    preprocessors: list[Callable[[str], str]],
+    force: bool,
+    storage_format: str | StorageFormat = None,
+    journal: RunJournal = None,
+) -> TagJob | None:
+    """Parse and preprocess (e.g. `tagger.preprocessors`) `source_file`. Return None if there is nothing to tag.
+    An existing `target_file` is kept if its checksum validates and it is stored in `storage_format` (if given)."""
+    try:
+        started: float = time.perf_counter()
+        ensure_path(target_file)
+
+        with collector().stage("parse"):
+            protocol: interface.Protocol = parse.ProtocolMapper.parse(source_file)
+
+        if not protocol.has_text:
+            unlink(target_file)
+            touch(target_file)
+            if journal is not None:
+                journal.record(source_file, target_file, EMPTY, time.perf_counter() - started)
+            return None
+
+        preprocess_protocol(protocol, preprocessors)
+        checksum: str = protocol.checksum()
+
+        if not force and storage.validate_checksum(target_file, checksum, storage_format):
+            logger.info(f"skipped: {strip_path_and_extension(source_file)} (checksum validates OK)")
+            touch(target_file)
+            if journal is not None:
+                journal.record(source_file, target_file, DONE, time.perf_counter() - started)
+            return None
+
+        return TagJob(
+            source_file=source_file, target_file=target_file, protocol=protocol, checksum=checksum, started=started
+        )
+
+    except Exception:
+        logger.error(f"FAILED: {source_file}")
+        unlink(target_file)
+        if journal is not None:
+            journal.record(source_file, target_file, FAILED)
+        raise
+
+
+def preprocess_protocol(protocol: interface.Protocol, preprocessors: list[Callable[[str], str]]) -> None:
+    """Same as `protocol.preprocess`, but each preprocessor is applied to all paragraphs in one go."""
+    paragraphs: list[str] = [p.strip() for u in protocol.utterances for p in u.paragraphs]
+    paragraphs = preprocess_texts(preprocessors, paragraphs)
+    offset: int = 0
+    for u in protocol.utterances:
+        u.paragraphs, offset = paragraphs[offset : offset + len(u.paragraphs)], offset + len(u.paragraphs)
+
+
+def tag_jobs(tagger: ITagger, jobs: list[TagJob]) -> list[TagJob]:
+    """Tag utterances of all `jobs` in a single (pooled) tagger call."""
+    texts, sizes = batching.pool([job.texts for job in jobs])
+
+    with collector().stage("tag", items=len(texts)) as timer:
+        documents: list[TaggedDocument] = tagger.tag(texts, preprocess=False) if texts else []
+        timer.tokens = sum(d.get("num_tokens") or 0 for d in documents)
+
+    for job, job_documents in zip(jobs, batching.unpool(documents, sizes)):
+        for utterance, document in zip(job.protocol.utterances, job_documents):
+            utterance.annotation = tagger.to_csv(document)
+            utterance.num_tokens = document.get("num_tokens")
+            utterance.num_words = document.get("num_words")
+
+    return jobs
+
+
+def temporary_filename(target_file: str) -> str:
+    """Hidden file, in the same folder as `target_file`, that is renamed to `target_file` when complete."""
+    return jj(dirname(target_file), f".{os.getpid()}.{basename(target_file)}")
+
+
+def store_job(
+    job: TagJob, storage_format: str | StorageFormat = StorageFormat.JSON, journal: RunJournal = None
+) -> None:
+    """Store tagged protocol (written to a temporary file that is renamed, so that a target file is never partial)."""
+    tmp_file: str = temporary_filename(job.target_file)
+    try:
+        unlink(job.target_file)
+        logger.info(f"tagged: {strip_path_and_extension(job.source_file)}")
+        num_tokens: int = sum(getattr(u, 'num_tokens', None) or 0 for u in job.protocol.utterances)
+        start: float = time.perf_counter()
+        with collector().stage("store", tokens=num_tokens):
+            storage.store_protocol(
+                tmp_file, protocol=job.protocol, checksum=job.checksum, storage_format=storage_format
+            )
+            os.replace(tmp_file, job.target_file)
+        if journal is not None:
+            journal.record(job.source_file, job.target_file, DONE, time.perf_counter() - job.started)
+        if collector().enabled:
+            collector().protocol(
+                name=job.protocol.name,
+                utterances=len(job.protocol.utterances),
+                tokens=num_tokens,
+                size=getsize(job.target_file),
+                seconds=round(time.perf_counter() - start, 6),
+            )
+    except Exception:
+        logger.error(f"FAILED: {job.source_file}")
+        unlink(tmp_file)
+        unlink(job.target_file)
+        if journal is not None:
+            journal.record(job.source_file, job.target_file, FAILED)
+        raise
+
+
+def tag_protocol_file(
+    source_file: str,
+    target_file: str,
+    tagger: ITagger,
+    force: bool = False,
+    storage_format: str | StorageFormat = StorageFormat.JSON,
+) -> None:
+    """Tag a single protocol. Same as `pyriksprot.tag_protocol_xml`, but supports the Parquet storage format."""
+    job: TagJob = prepare_job(source_file, target_file, tagger.preprocessors, force, storage_format)
+    if job is not None:
+        store_job(tag_jobs(tagger, [job])[0], storage_format=storage_format)
+
+
+def chunked(items: Iterable[TagJob], size: int) -> Iterator[list[TagJob]]:
+    chunk: list[TagJob] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def glob_source_files(source_folder: str, pattern: str, recursive: bool) -> list[str]:
+    return glob(jj(source_folder, pattern), recursive=recursive)
+
+
+def pending_files(
+    source_files: Iterable[str], target_folder: str, force: bool, recursive: bool, journal: RunJournal = None
+) -> Iterator[tuple[str, str]]:
+    """Yield (source, target) file pairs to tag. Targets that are up to date are touched and skipped.
+    If a `journal` is given, only targets verified by the journal are considered up to date."""
+    for source_file in source_files:
+        target_file: str = resolve_target_filename(source_file, target_folder, recursive)
+        if journal is not None:
+            if not force and journal.is_done(source_file, target_file):
+                continue
+        elif not force and not expired(target_file, source_file):
+            touch(target_file)
+            continue
+        yield source_file, target_file
+
+
+def tag_protocols_pooled(
+    tagger: ITagger,
+    source_folder: str,
+    target_folder: str,
+    force: bool,
+    recursive: bool = False,
+    pattern: str = "**/prot-*.xml",
+    pool_size: int = 8,
+    storage_format: str | StorageFormat = StorageFormat.JSON,
+    source_files: list[str] = None,
+    journal: RunJournal = None,
+) -> None:
+    """Tags protocols in `source_folder` (or `source_files` if given), `pool_size` protocols per tagger call.
+    Pooling lets a length-bucketing tagger (see `StanzaTagger.batch_tokens`) balance batches across protocols.
+    Progress is recorded in `journal` (if given), see `journal.RunJournal`.
+    """
+    if source_files is None:
+        source_files = glob_source_files(source_folder, pattern, recursive)
+
+    def jobs() -> Iterator[TagJob]:
+        for source_file, target_file in pending_files(tqdm(source_files), target_folder, force, recursive, journal):
+            job: TagJob = prepare_job(source_file, target_file, tagger.preprocessors, force, storage_format, journal)
+            if job is not None:
+                yield job
+
+    for chunk in chunked(jobs(), max(pool_size, 1)):
+        for job in tag_jobs(tagger, chunk):
+            store_job(job, storage_format=storage_format, journal=journal)
+
+
+def remove_protocols(source_files: list[str], target_folder: str, recursive: bool = False) -> list[str]:
+    """Remove tagged frames of (deleted) `source_files`. Return removed target files."""
+    removed: list[str] = []
+    for source_file in source_files:
+        target_file: str = resolve_target_filename(source_file, target_folder, recursive)
+        if isfile(target_file):
+            logger.info(f"removed: {strip_path_and_extension(source_file)}")
+            unlink(target_file)
+            removed.append(target_file)
+    return removed
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import pickle
+import sqlite3
+from collections import defaultdict
+from os.path import splitext
+from typing import Iterable
+
+from loguru import logger
+from pyriksprot.utility import strip_path_and_extension
+
+from .journal import file_hash
+
+"""Incremental corpus term frequencies (used by the dehyphenator).
+
+Term counts are stored per protocol in an SQLite table, one row per (protocol, term, count), together with
+each protocol's size, mtime and content hash. On update, only protocols that are new or whose content has
+changed are counted (a changed size or mtime with an unchanged hash just refreshes the stat), and protocols
+no longer in the source set are removed. The global frequencies (`word-frequencies.pkl`) are then rebuilt
+by aggregating the stored counts.
+"""
+
+SQL_CREATE: str = """
+    create table if not exists protocols (
+        name text primary key,
+        size integer not null,
+        mtime_ns integer not null,
+        hash text not null
+    );
+    create table if not exists counts (
+        protocol text not null,
+        term text not null,
+        count integer not null,
+        primary key (protocol, term)
+    ) without rowid;
+"""
+
+
+def count_protocol_terms(filename: str, segment_skip_size: int = 10) -> dict[str, int]:
+    """Term counts of a single ParlaClarin protocol (counted as in pyriksprot's `compute_term_frequencies`)."""
+    # pylint: disable=import-outside-toplevel
+    from pyriksprot.corpus.parlaclarin import XmlUntangleSegmentIterator
+    from pyriksprot.workflows.tf import TermFrequencyCounter
+
+    texts = XmlUntangleSegmentIterator(
+        filenames=[filename], segment_level=None, segment_skip_size=segment_skip_size, multiproc_processes=None
+    )
+    return dict(TermFrequencyCounter(progress=False).ingest(texts).frequencies)
+
+
+def _count_task(args: tuple[str, int]) -> tuple[str, dict[str, int]]:
+    return args[0], count_protocol_terms(*args)
+
+
+class TermFrequencyStore:
+    """Per-protocol term counts stored in SQLite `filename`."""
+
+    def __init__(self, filename: str):
+        self.filename: str = filename
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.db: sqlite3.Connection = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self.db.execute("pragma journal_mode=wal")
+        self.db.executescript(SQL_CREATE)
+
+    def protocols(self) -> dict[str, tuple[int, int, str]]:
+        """Return name => (size, mtime_ns, hash) of stored protocols."""
+        return {row[0]: tuple(row[1:]) for row in self.db.execute("select name, size, mtime_ns, hash from protocols")}
+
+    def changed_files(self, filenames: Iterable[str]) -> tuple[list[str], list[str]]:
+        """Return (changed or new files, names of stored protocols not in `filenames`)."""
+        stored: dict[str, tuple[int, int, str]] = self.protocols()
+        changed: list[str] = []
+        names: set[str] = set()
+        with self.db:
+            for filename in filenames:
+                name: str = strip_path_and_extension(filename)
+                names.add(name)
+                stat: os.stat_result = os.stat(filename)
+                entry: tuple[int, int, str] = stored.get(name)
+                if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                if entry is not None and entry[2] == file_hash(filename):
+                    self.db.execute(
+                        "update protocols set size = ?, mtime_ns = ? where name = ?",
+                        (stat.st_size, stat.st_mtime_ns, name),
+                    )
+                    continue
+                changed.append(filename)
+        return changed, sorted(set(stored) - names)
+
+    def put(self, filename: str, counts: dict[str, int]) -> None:
+        name: str = strip_path_and_extension(filename)
+        stat: os.stat_result = os.stat(filename)
+        with self.db:
+            self.db.execute("delete from counts where protocol = ?", (name,))
+            self.db.executemany(
+                "insert into counts(protocol, term, count) values (?, ?, ?)",
+                ((name, term, count) for term, count in counts.items()),
+            )
+            self.db.execute(
+                "insert or replace into protocols(name, size, mtime_ns, hash) values (?, ?, ?, ?)",
+                (name, stat.st_size, stat.st_mtime_ns, file_hash(filename)),
+            )
+
+    def delete(self, names: list[str]) -> None:
+        with self.db:
+            for name in names:
+                self.db.execute("delete from counts where protocol = ?", (name,))
+                self.db.execute("delete from protocols where name = ?", (name,))
+
+    def update(self, filenames: list[str], segment_skip_size: int = 10, processes: int = 1) -> int:
+        """Bring store up to date with `filenames`. Return number of counted and deleted protocols."""
+        changed, deleted = self.changed_files(filenames)
+        self.delete(deleted)
+
+        args: list[tuple[str, int]] = [(f, segment_skip_size) for f in changed]
+        if (processes or 1) > 1 and len(args) > 1:
+            with multiprocessing.Pool(processes) as pool:
+                for filename, counts in pool.imap_unordered(_count_task, args):
+                    self.put(filename, counts)
+        else:
+            for filename, counts in map(_count_task, args):
+                self.put(filename, counts)
+
+        logger.info(f"term frequency: counted {len(changed)}, deleted {len(deleted)} of {len(filenames)} protocols")
+        return len(changed) + len(deleted)
+
+    def frequencies(self) -> defaultdict[str, int]:
+        """Corpus term frequencies (aggregated over stored protocols)."""
+        frequencies: defaultdict[str, int] = defaultdict(int)
+        frequencies.update(self.db.execute("select term, sum(count) from counts group by term"))
+        return frequencies
+
+    def store_frequencies(self, filename: str) -> None:
+        """Store aggregated frequencies to pickle `filename` (same format as `TermFrequencyCounter.store`)."""
+        tmp_filename: str = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, 'wb') as fp:
+            pickle.dump(self.frequencies(), fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def compute_term_frequencies_incremental(
+    source_files: list[str],
+    filename: str,
+    store_filename: str = None,
+    segment_skip_size: int = 10,
+    processes: int = 1,
+) -> int:
+    """Update per-protocol term counts of `source_files` in `store_filename` (default: `filename` with
+    extension `.db`) and rebuild global frequencies in `filename` if anything changed (or it doesn't exist).
+    Return number of counted and deleted protocols."""
+    store: TermFrequencyStore = TermFrequencyStore(store_filename or f"{splitext(filename)[0]}.db")
+    try:
+        updated: int = store.update(source_files, segment_skip_size=segment_skip_size, processes=processes)
+        if updated > 0 or not os.path.isfile(filename):
+            store.store_frequencies(filename)
+    finally:
+        store.close()
+    return updated
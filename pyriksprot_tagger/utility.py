@@ -9,10 +9,10 @@ from os.path import join as jj
 from typing import Callable, Sequence
 
 import loguru
-from pyriksprot import dedent, pretokenize
+
+from .file_index import FileIndex
 
 try:
-    from snakemake.io import expand, glob_wildcards
     from snakemake.logging import logger, setup_logger
 except ImportError:  # pylint: disable=bare-except
     loguru.logger.info("snakemake not installed")
@@ -32,16 +32,8 @@ STANZA_DATADIR = os.environ.get('STANZA_DATADIR')
 
 
 def expand_basenames(source_folder: str, source_extension: str, years: int = None):
-    opts_digits: str = r'\d*'
-    any_digits: str = r'\d+'
-    year_constraint: str = (
-        rf"{{year,{years}\d*}}"
-        if isinstance(years, (int, str))
-        else f"{{year,{'|'.join(f'{y}{opts_digits}' for y in years)}}}"
-        if isinstance(years, list)
-        else rf"{{year,{any_digits}}}"
-    )
-    source_years, target_basenames = glob_wildcards(jj(source_folder, year_constraint, f"{{file}}.{source_extension}"))
+    """Return years and basenames of `{source_folder}/{year}/{basename}.{source_extension}` (see `FileIndex`)."""
+    source_years, target_basenames = FileIndex(source_folder, source_extension).refresh().basenames(years)
     return source_years, target_basenames
 
 
@@ -50,12 +42,10 @@ def expand_target_files(
 ) -> list[str]:
     source_years, target_basenames = expand_basenames(source_folder, source_extension, years=years)
 
-    target_files = expand(
-        jj(target_folder, "{year}", f"{{basename}}.{target_extension}"),
-        zip,
-        year=source_years,
-        basename=target_basenames,
-    )
+    target_files = [
+        jj(target_folder, year, f"{basename}.{target_extension}")
+        for year, basename in zip(source_years, target_basenames)
+    ]
 
     return target_files
 
@@ -158,6 +148,8 @@ def stanza_dir(root_folder: str) -> str:
 def create_text_preprocessors(
     pipeline: str = "dedent,dehyphen,strip,pretokenize", fxs_tasks: Sequence[Callable[[str], str]] = None
 ) -> "list[Callable[[str], str]]":
+    from pyriksprot import dedent, pretokenize  # pylint: disable=import-outside-toplevel
+
     fxs: list[Callable[[str], str]] = []
     fxs_tasks: dict = {
         'dedent': dedent,
@@ -172,5 +164,12 @@ def create_text_preprocessors(
     return fxs
 
 
+def preprocess_texts(preprocessors: Sequence[Callable[[str], str]], texts: list[str]) -> list[str]:
+    """Apply `preprocessors` in sequence to all `texts`. Preprocessors with a `batch` method get all texts at once."""
+    for fx in preprocessors:
+        texts = fx.batch(texts) if hasattr(fx, 'batch') else [fx(t) for t in texts]
+    return texts
+
+
 def remove_csv_item(csv: str, item: str, sep: str = ',') -> str:
     return sep.join([p for p in csv.split(sep) if p != item])
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import gc
+import itertools
+import multiprocessing
+import os
+import time
+from queue import Empty
+from typing import Any, Iterable, Iterator
+
+from loguru import logger
+from pyriksprot import ITagger
+from pyriksprot.interface import StorageFormat
+
+from .journal import RunJournal
+from .metrics import MetricsCollector, collector
+from .scheduler import CostEstimate, Schedule, WorkerStats, longest_first
+from .tagging import glob_source_files, pending_files, tag_protocols_pooled
+
+try:
+    import torch
+except ImportError:  # pylint: disable=bare-except
+    logger.info("torch not installed")
+    torch = None
+
+"""Fork-after-load multi-worker tagging (CPU only).
+
+The tagger is created once in the parent process. Model parameters are moved to shared memory and the
+parent's heap is frozen (`gc.freeze`) so that the garbage collector doesn't touch, and hence copy, inherited
+objects. Then `workers` processes are forked, each with its own torch thread count, inheriting the loaded
+model instead of loading (and holding) a copy of their own. Workers take files, longest first, from a shared
+queue (see `scheduler`). Workers append their metric events to the run's JSONL file, and return their stage
+totals to the parent, which merges them into the active collector.
+"""
+
+
+def torch_modules(value: Any, seen: set[int] = None, depth: int = 0) -> Iterable["torch.nn.Module"]:
+    """Find torch modules reachable from `value`'s attributes (e.g. the models of a Stanza pipeline)."""
+    seen = seen if seen is not None else set()
+    if depth > 6 or id(value) in seen or isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return
+    seen.add(id(value))
+    if torch is not None and isinstance(value, torch.nn.Module):
+        yield value
+        return
+    children: Iterable[Any] = (
+        value.values()
+        if isinstance(value, dict)
+        else value
+        if isinstance(value, (list, tuple))
+        else vars(value).values()
+        if hasattr(value, '__dict__')
+        else []
+    )
+    for child in children:
+        yield from torch_modules(child, seen, depth + 1)
+
+
+def share_model_memory(tagger: ITagger) -> int:
+    """Move model parameters of `tagger` to shared memory. Return number of modules.
+    Memory-mapped pretrained embeddings (see `taggers.pretrain`) are already shared and are left as is."""
+    if torch is None:
+        return 0
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        raise ValueError("fork-after-load workers require a CPU tagger (CUDA is initialized)")
+    from .taggers.pretrain import is_memory_mapped  # pylint: disable=import-outside-toplevel
+
+    modules: list[torch.nn.Module] = list(torch_modules(getattr(tagger, 'nlp', tagger)))
+    for module in modules:
+        for tensor in itertools.chain(module.parameters(), module.buffers()):
+            if not is_memory_mapped(tensor):
+                tensor.share_memory_()
+    return len(modules)
+
+
+def _queued_files(queue: multiprocessing.Queue, stats: WorkerStats) -> Iterator[str]:
+    for cost, filename in iter(queue.get, None):
+        stats.files += 1
+        stats.cost += cost
+        yield filename
+
+
+def _run_worker(
+    tagger: ITagger,
+    threads: int,
+    queue: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    shared_stats: Any,
+    index: int,
+    opts: dict,
+) -> None:
+    metrics: MetricsCollector = collector()
+    metrics.reopen()
+
+    if torch is not None:
+        torch.set_num_threads(threads)
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+
+    cache = getattr(tagger, 'cache', None)
+    if cache is not None:
+        # SQLite connections must not be used across fork, open a new connection
+        tagger.cache = type(cache)(cache.filename, fingerprint=cache.fingerprint, max_items=cache.max_items)
+
+    lemma_table = getattr(tagger, 'lemma_table', None)
+    if lemma_table is not None:
+        lemma_table.reopen()
+
+    if opts.get('journal') is not None:
+        opts['journal'].reopen()
+
+    stats: WorkerStats = WorkerStats()
+    start: float = time.perf_counter()
+    tag_protocols_pooled(tagger=tagger, source_files=_queued_files(queue, stats), **opts)
+    shared_stats[3 * index : 3 * index + 3] = [stats.files, stats.cost, time.perf_counter() - start]
+
+    if hasattr(tagger, 'close'):
+        tagger.close()
+
+    # Workers exit without flushing inherited files, close the event file and hand stage totals to the parent
+    results.put((metrics.drain(), metrics.protocols))
+    if metrics.fp is not None:
+        metrics.fp.close()
+        metrics.fp = None
+
+
+def _merge_worker_metrics(results: multiprocessing.Queue, processes: list[multiprocessing.Process]) -> None:
+    """Merge stage totals returned by workers into the active collector (until all workers are done)."""
+    received: int = 0
+    while received < len(processes):
+        alive: bool = any(p.is_alive() for p in processes)
+        try:
+            stages, protocols = results.get(timeout=0.5)
+        except Empty:
+            if not alive:
+                break
+            continue
+        collector().merge(stages, protocols)
+        received += 1
+
+
+def tag_protocols_forked(
+    tagger: ITagger,
+    source_folder: str,
+    target_folder: str,
+    force: bool,
+    recursive: bool = False,
+    pattern: str = "**/prot-*.xml",
+    pool_size: int = 8,
+    storage_format: str | StorageFormat = StorageFormat.JSON,
+    source_files: list[str] = None,
+    workers: int = 2,
+    threads: int = None,
+    cost: CostEstimate = 'size',
+    journal: RunJournal = None,
+) -> Schedule:
+    """Tags protocols like `tag_protocols_pooled`, but split over `workers` forked processes sharing `tagger`.
+    Each worker uses `threads` torch threads (default: available CPUs divided by `workers`). Protocols are
+    scheduled longest first, `cost` is estimated from file size or number of utterances. Workers take one
+    protocol at a time from the queue (`pool_size` is not used), pooling would let a worker hold on to several
+    queued protocols at the tail of the schedule while others are idle."""
+
+    if source_files is None:
+        source_files = glob_source_files(source_folder, pattern, recursive)
+
+    schedule: Schedule = Schedule(
+        longest_first([f for f, _ in pending_files(source_files, target_folder, force, recursive, journal)], cost),
+        workers=workers,
+        cost=cost,
+    )
+
+    threads = threads or max((os.cpu_count() or workers) // workers, 1)
+
+    num_modules: int = share_model_memory(tagger)
+
+    if collector().fp is not None:
+        collector().fp.flush()
+
+    gc.collect()
+    gc.freeze()
+
+    logger.info(f"workers: forking {workers} workers ({threads} threads each, {num_modules} shared modules)")
+    logger.info(
+        f"scheduler: {len(schedule.items)} files, {schedule.cost} {schedule.total_cost:.0f}, "
+        f"predicted makespan {schedule.predicted_makespan:.0f} (ideal {schedule.ideal_makespan:.0f})"
+    )
+
+    opts: dict = dict(
+        source_folder=source_folder,
+        target_folder=target_folder,
+        force=force,
+        recursive=recursive,
+        pattern=pattern,
+        pool_size=1,
+        storage_format=storage_format,
+        journal=journal,
+    )
+    context = multiprocessing.get_context("fork")
+    queue: multiprocessing.Queue = context.Queue()
+    for item in schedule.items:
+        queue.put(item)
+    for _ in range(workers):
+        queue.put(None)
+
+    results: multiprocessing.Queue = context.Queue()
+    shared_stats: Any = context.Array('d', 3 * workers)
+    processes: list[multiprocessing.Process] = [
+        context.Process(
+            target=_run_worker,
+            args=(tagger, threads, queue, results, shared_stats, i, opts),
+            name=f"tag-worker-{i}",
+        )
+        for i in range(workers)
+    ]
+    start: float = time.perf_counter()
+    try:
+        for process in processes:
+            process.start()
+        _merge_worker_metrics(results, processes)
+        for process in processes:
+            process.join()
+    finally:
+        gc.unfreeze()
+
+    failed: list[str] = [p.name for p in processes if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"workers failed: {', '.join(failed)}")
+
+    schedule.report(
+        [WorkerStats(int(shared_stats[3 * i]), *shared_stats[3 * i + 1 : 3 * i + 3]) for i in range(workers)],
+        elapsed=time.perf_counter() - start,
+    )
+    return schedule
@@ -1,12 +1,13 @@
 # type: ignore
 # pylint: skip-file, disable-all
 """
-Computes global word frequency
+Computes global word frequency (incrementally, only changed protocols are counted, see term_frequency.py)
 """
-import glob
-from pyriksprot import compute_term_frequencies
+from pyriksprot_tagger.file_index import indexed_source_files
+from pyriksprot_tagger.frequency_index import convert_frequencies
+from pyriksprot_tagger.term_frequency import compute_term_frequencies_incremental
 
-WORD_FREQUENCY_SOURCE_FILES = glob.glob(jj(typed_config.source.folder, "*", "*.xml"))
+WORD_FREQUENCY_SOURCE_FILES = indexed_source_files(typed_config.source.folder, "xml")
 
 rule word_frequency:
     message:
@@ -16,10 +17,10 @@ rule word_frequency:
     output:
         filename=typed_config.dehyphen.tf_filename,
     run:
-        compute_term_frequencies(
-            source=input.filenames,
+        compute_term_frequencies_incremental(
+            source_files=input.filenames,
             filename=output.filename,
             segment_skip_size=10,
-            multiproc_processes=config.get('processes', 1),
-            multiproc_keep_order=False,
+            processes=config.get('processes', 1),
         )
+        convert_frequencies(output.filename)
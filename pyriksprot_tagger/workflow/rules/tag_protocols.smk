@@ -7,42 +7,57 @@ PoS tags Parla-CLARIN XML files using Stanza.
 from os import makedirs
 from os.path import join as jj
 
-from pyriksprot import tag_protocol_xml
-
 from pyriksprot.workflows.tag import TaggerProvider, TaggerRegistry
 from pyriksprot.configuration import Config
-from pyriksprot_tagger import StanzaTaggerFactory, check_cuda
+from pyriksprot_tagger import check_cuda
+from pyriksprot_tagger.tagging import tag_protocol_file
 
 typed_config: Config = typed_config
 disable_gpu: bool = config.get("disable_gpu", 0) == 1
-
-check_cuda()
+storage_format: str = config.get("storage_format", typed_config.get("target:storage_format", default="json"))
 
 makedirs(typed_config.target.folder, exist_ok=True)
 
+# torch and stanza are imported when the first protocol is tagged (not when the DAG is built)
 def create_factory():
+    check_cuda()
     typed_config.tagger_opts['use_gpu'] = not disable_gpu
     return TaggerProvider.tagger_factory().create()
 
 def tagger():
+    from pyriksprot_tagger import StanzaTaggerFactory
+
     if StanzaTaggerFactory.identifier in TaggerRegistry.instances:
         return TaggerRegistry.instances[StanzaTaggerFactory.identifier]
     return TaggerRegistry.get(create_factory())
 
+def delta_stamp(wildcards) -> list[str]:
+    """Stamp input of targets that must be retagged in incremental mode (see Snakefile)."""
+    target: str = jj(typed_config.target.folder, wildcards.year, f"{wildcards.basename}.zip")
+    return [jj(DELTA_FOLDER, wildcards.year, f"{wildcards.basename}.stamp")] if target in DELTA_UPDATED else []
+
+if DELTA_FOLDER:
+
+    rule mark_changed_protocol:
+        output:
+            touch(jj(DELTA_FOLDER, "{year}", "{basename}.stamp")),
+
+
 rule tag_protocols:
     message:
         "step: tag_protocols"
     input:
         filename=jj(typed_config.source.folder, "{year}", "{basename}.xml"),
+        stamp=delta_stamp,
     output:
         filename=jj(typed_config.target.folder, "{year}", "{basename}.zip"),
     run:
         try:
-            tag_protocol_xml(
+            tag_protocol_file(
                 input.filename,
                 output.filename,
                 tagger(),
-                storage_format="json",
+                storage_format=storage_format,
             )
         except Exception as ex:
             print(f"failed: tag_protocols {input.filename} --output-filename {output.filename}")
@@ -11,13 +11,16 @@ tag=${RIKSPROT_REPOSITORY_TAG}
 force=0
 update=1
 max_procs=1
+server=0
+incremental=0
+tag_opts=
 now_timestamp=$(date "+%Y%m%d_%H%M%S")
 log_dir=./logs
 scriptname=$(basename $0)
 
 function usage()
 {
-    echo "usage: ./${scriptname} [--data-folder folder] [--source-pattern pattern] --target-folder folder --tag tag [--force] [--update] [--max-procs n]]"
+    echo "usage: ./${scriptname} [--data-folder folder] [--source-pattern pattern] --target-folder folder --tag tag [--force] [--update] [--max-procs n] [--server] [--incremental]]"
     echo "Creates new database using source as template. Source defaults to production."
     echo ""
     echo "   --data-folder             source root folder"
@@ -26,7 +29,9 @@ function usage()
     echo "   --tag                     source corpus tag"
     echo "   --force                   drop target if exists"
     echo "   --update                  update target if exists"
-    echo "   --max-procs               max number of parallel jobs"
+    echo "   --max-procs               number of workers (forked CPU workers, or clients of --server)"
+    echo "   --server                  load tagger once in a shared tagging server"
+    echo "   --incremental             only tag protocols changed since tag in target's version.yml"
     echo ""
 }
 
@@ -56,6 +61,12 @@ do
         --update)
             update=1 ;
         ;;
+        --server)
+            server=1 ; shift
+        ;;
+        --incremental)
+            incremental=1 ; shift
+        ;;
         --help)
             usage ;
             exit 0
@@ -140,7 +151,18 @@ if [ "$tag" != "$workdir_tag" ]; then
 fi
 
 mkdir -p ${target_folder} ${log_dir}
-tag_info $repository_folder > ${target_folder}/version.yml
+
+if [ $incremental == 1 ]; then
+    if [ -f "${target_folder}/version.yml" ]; then
+        previous_tag=$(grep "^tag:" ${target_folder}/version.yml | awk '{ print $2 }')
+    fi
+    if [ "$previous_tag" != "" ]; then
+        echo "info: incremental tagging of changes since ${previous_tag}"
+        tag_opts="$tag_opts --since-tag ${previous_tag}"
+    else
+        echo "warning: no previous tag found in ${target_folder}/version.yml, tagging all"
+    fi
+fi
 
 sub_folders=`find ${corpus_folder} -maxdepth 1 -mindepth 1 -name "${source_pattern}" -type d -printf '%f\n' | sort`
 
@@ -154,6 +176,7 @@ source:
     repository_tag: ${tag}
 target:
     folder: ${target_folder}
+    journal: true
 dehyphen:
   folder: /data/riksdagen_corpus_data/dehyphen
   tf_filename: /data/riksdagen_corpus_data/word-frequencies.pkl
@@ -174,32 +197,55 @@ cp $yaml_file ${target_folder}/tag_config.yml
 echo "info: using $max_procs processes"
 echo "info: running in $force force mode"
 
+version_file=${log_dir}/version_${now_timestamp}.yml
+tag_info $repository_folder > ${version_file}
+
+if [ $server == 1 ]; then
+    server_address=$(realpath ${log_dir})/tag_server_${now_timestamp}.sock
+    PYTHONPATH=. python ./pyriksprot_tagger/scripts/tag_server.py $yaml_file --address $server_address \
+        >> $log_dir/tag_server_${now_timestamp}.log 2>&1 &
+    server_pid=$!
+    trap "kill $server_pid 2> /dev/null" EXIT
+    while [ ! -S $server_address ]; do
+        if ! kill -0 $server_pid 2> /dev/null; then
+            echo "error: tagging server failed to start (see $log_dir/tag_server_${now_timestamp}.log)"
+            exit 64
+        fi
+        sleep 1
+    done
+    echo "info: using tagging server $server_address"
+    tag_opts="$tag_opts --server-address $server_address"
+fi
+
 # if [ ! command -v "pos_tag" > /dev/null ]; then
 #     echo "error: pos_tag command not found - unable to run tagging"
 #     echo " info: install the `pyriksprot_tagger` package and make sure that the pos_tag command is available"
 #     exit 64 ;
 # fi
 
-if [[ $max_procs > 1 ]]; then
-
-    tag_command_file="$log_dir/tag_commands_${now_timestamp}.txt"
-
-    echo "command file: $tag_command_file"
+failed=0
 
-    rm -rf $tag_command_file
-
-    for sub_folder in $sub_folders; do
-        echo "poetry run python ./pyriksprot_tagger/scripts/tag.py $yaml_file ${corpus_folder}/$sub_folder ${target_folder}/$sub_folder" >> ${tag_command_file}
-        # echo "pos_tag  $yaml_file ${corpus_folder}/$sub_folder ${target_folder}/$sub_folder" >> ${tag_command_file}
-    done
+if [[ $max_procs > 1 ]]; then
 
-    echo "info: running in parallel mode using $max_procs processes"
-    cat $tag_command_file | xargs -I CMD --max-procs=$max_procs bash -c CMD
+    # All protocols are scheduled longest first over the workers (forked CPU workers sharing one model,
+    # or clients of the tagging server), instead of running year folders in parallel
+    echo "info: running in parallel mode using $max_procs workers"
+    PYTHONPATH=. python ./pyriksprot_tagger/scripts/tag.py $yaml_file ${corpus_folder} ${target_folder} \
+        --pattern "${source_pattern}/prot-*.xml" --workers $max_procs $tag_opts || failed=1
 
 else
     echo "info: running in sequential mode"
     for sub_folder in $sub_folders; do
-        PYTHONPATH=. python ./pyriksprot_tagger/scripts/tag.py $yaml_file ${corpus_folder}/$sub_folder ${target_folder}/$sub_folder
+        PYTHONPATH=. python ./pyriksprot_tagger/scripts/tag.py $yaml_file ${corpus_folder}/$sub_folder ${target_folder}/$sub_folder $tag_opts || failed=1
         # PYTHONPATH=. pos_tag $yaml_file ${corpus_folder}/$sub_folder ${target_folder}/$sub_folder 
     done
 fi
+
+if [ $failed != 0 ]; then
+    echo "error: tagging failed, ${target_folder}/version.yml not updated (see $log_dir)"
+    exit 1
+fi
+
+# Record corpus tag last (and only if all protocols were tagged), so that a failed or aborted run is
+# retagged incrementally from the previous tag
+cp ${version_file} ${target_folder}/version.yml
@@ -0,0 +1,111 @@
+import pytest
+from pyriksprot_tagger.taggers import batching
+
+
+def test_length_buckets_groups_items_of_similar_length():
+    lengths = [1, 100, 2, 90, 1, 3]
+
+    buckets: list[list[int]] = batching.length_buckets(lengths, batch_tokens=200)
+
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    assert buckets[0] == [1, 3]
+    assert set(buckets[1]) == {0, 2, 4, 5}
+
+
+def test_length_buckets_respects_budget_and_max_batch_size():
+    lengths = [10] * 10
+
+    assert [len(b) for b in batching.length_buckets(lengths, batch_tokens=30)] == [3, 3, 3, 1]
+    assert [len(b) for b in batching.length_buckets(lengths, batch_tokens=1000, max_batch_size=4)] == [4, 4, 2]
+
+
+def test_length_buckets_puts_oversized_item_in_own_batch():
+    assert batching.length_buckets([500, 1, 1], batch_tokens=10) == [[0], [1, 2]]
+
+
+def test_tag_in_buckets_returns_results_in_original_order():
+    texts = ["a b c d e", "a", "a b", "a b c d e f g h", "a b c"]
+    calls: list[list[str]] = []
+
+    def tag(batch: list[str]) -> list[str]:
+        calls.append(batch)
+        return [t.upper() for t in batch]
+
+    result = batching.tag_in_buckets(texts, tag, batch_tokens=10)
+
+    assert result == [t.upper() for t in texts]
+    assert len(calls) > 1
+
+
+def test_pool_and_unpool():
+    groups = [["a", "b"], [], ["c"]]
+    items, sizes = batching.pool(groups)
+    assert items == ["a", "b", "c"]
+    assert batching.unpool(items, sizes) == groups
+
+
+def _oom_tagger(max_padded_tokens: int, calls: list[list[str]]):
+    def tag(batch: list[str]) -> list[str]:
+        calls.append(batch)
+        if max(len(t.split()) for t in batch) * len(batch) > max_padded_tokens:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+        return [t.upper() for t in batch]
+
+    return tag
+
+
+def test_adaptive_batcher_splits_batches_on_out_of_memory_and_keeps_budget():
+    texts = ["a b c d"] * 8 + ["a"] * 4
+    calls: list[list[str]] = []
+    batcher = batching.AdaptiveBatcher(batch_tokens=1000)
+
+    assert batcher.tag(texts, _oom_tagger(8, calls)) == [t.upper() for t in texts]
+    assert batcher.batch_tokens <= 16 and batcher.backoffs > 0
+
+    calls.clear()
+    backoffs: int = batcher.backoffs
+
+    assert batcher.tag(texts, _oom_tagger(16, calls)) == [t.upper() for t in texts]
+    assert batcher.backoffs == backoffs
+    assert all(max(len(t.split()) for t in batch) * len(batch) <= 16 for batch in calls)
+
+
+def test_adaptive_batcher_retries_single_text_while_callback_frees_memory():
+    limits: list[int] = [1]
+
+    def tag(batch: list[str]) -> list[str]:
+        if len(batch[0].split()) > limits[0]:
+            raise MemoryError()
+        return batch
+
+    def on_out_of_memory() -> bool:
+        limits[0] *= 2
+        return limits[0] <= 4
+
+    batcher = batching.AdaptiveBatcher(batch_tokens=100, on_out_of_memory=on_out_of_memory)
+
+    assert batcher.tag(["a b c"], tag) == ["a b c"]
+    with pytest.raises(MemoryError):
+        batcher.tag(["a b c d e f g h i"], tag)
+
+
+def test_adaptive_batcher_does_not_catch_other_errors():
+    def tag(batch: list[str]) -> list[str]:
+        raise RuntimeError("shape mismatch")
+
+    with pytest.raises(RuntimeError):
+        batching.AdaptiveBatcher(batch_tokens=100).tag(["a", "b"], tag)
+
+
+def test_adaptive_batcher_lowers_budget_when_rss_exceeds_ceiling(monkeypatch):
+    rss: list[float] = [100.0]
+
+    def tag(batch: list[str]) -> list[str]:
+        rss[0] += 100.0 * len(batch)
+        return batch
+
+    monkeypatch.setattr(batching, "current_rss_mb", lambda: rss[0])
+    batcher = batching.AdaptiveBatcher(batch_tokens=8, max_rss_mb=250.0)
+
+    assert batcher.tag(["a b"] * 4, tag) == ["a b"] * 4
+    assert batcher.batch_tokens == 4
@@ -0,0 +1,355 @@
+"""CPU benchmark suite.
+
+    python -m tests.benchmark [--repeat N] [--output results.json] [--baseline FILE] [--update-baseline]
+
+Measures throughput (tokens/sec) of the tagging stages on the protocols in `tests/test_data/fakes`:
+
+    tokenize            `BetterSparvTokenizer.process`
+    preprocess:<name>   each preprocessor created by `create_text_preprocessors` (tokens = whitespace words)
+    to_dict             `StanzaTagger._to_dict`
+    store:<format>      serialization of a tagged protocol (`storage.store_protocol`)
+    tag_protocol_xml    end-to-end tagging of all protocols
+
+End-to-end tagging uses Stanza (on CPU) if models are found in STANZA_DATADIR, otherwise a stand-in tagger
+that tokenizes with Sparv and assigns dummy tags (reported as `tagger` in the output).
+
+Each benchmark is run in `--processes` fresh (spawned) processes, one after the other. In each process, a
+timing round calls the benchmark as many times as needed to run for at least `--min-seconds`, and the median
+of all rounds (`--repeat` per process) is reported. `peak_rss_mb` is the peak resident set size of a
+benchmark's process (setup included), and `stage_rss_mb` is how much the benchmark itself raised that peak.
+
+Results are written as JSON, and compared to the stored baseline: a benchmark is flagged as a regression if
+its throughput is below `1 - tolerance` of the baseline. Results are only compared if tagger, corpus repeat,
+minimum round time, Python version and platform are the same as in the baseline.
+"""
+from __future__ import annotations
+
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from dataclasses import asdict, dataclass
+from functools import cached_property
+from glob import glob
+from os.path import isdir, isfile
+from os.path import join as jj
+from typing import Any, Callable
+
+import click
+import stanza
+from pyriksprot import ITagger, TaggedDocument, interface, tag_protocol_xml
+from pyriksprot.corpus.parlaclarin import parse
+from pyriksprot_tagger import storage
+from pyriksprot_tagger.dehyphen import CachedDehyphenator
+from pyriksprot_tagger.taggers.stanza_tagger import BetterSparvTokenizer, StanzaTagger, StanzaTaggerFactory
+from pyriksprot_tagger.utility import create_text_preprocessors
+
+SOURCE_FOLDER: str = jj("tests", "test_data", "fakes", "v0.9.0", "parlaclarin", "protocols")
+WORD_FREQUENCIES: str = jj("tests", "test_data", "word-frequencies.pkl")
+BASELINE_FILENAME: str = jj("tests", "test_data", "benchmark_baseline.json")
+PREPROCESSORS: str = "dedent,dehyphen,strip,pretokenize"
+STAGES: list[str] = (
+    [f"preprocess:{name}" for name in PREPROCESSORS.split(",")]
+    + ["tokenize", "to_dict"]
+    + [f"store:{storage_format}" for storage_format in storage.STORAGE_FORMATS]
+    + ["tag_protocol_xml"]
+)
+METADATA_KEYS: list[str] = ['tagger', 'corpus_repeat', 'min_seconds', 'python', 'platform', 'processor']
+
+
+@dataclass
+class BenchmarkResult:
+    tokens: int
+    seconds: float
+    tokens_per_sec: float
+    number: int
+    peak_rss_mb: float
+    stage_rss_mb: float
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is in KiB on Linux, bytes on macOS)."""
+    maxrss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+@dataclass
+class StageTimings:
+    tokens: int
+    number: int
+    seconds: list[float]
+    peak_rss_mb: float
+    stage_rss_mb: float
+
+
+def measure(fx: Callable[[], Any], num_tokens: int, repeat: int = 3, min_seconds: float = 1.0) -> StageTimings:
+    """Run `repeat` rounds of calling `fx` `number` times, where `number` makes a round last at least
+    `min_seconds`. Return time of a single call in each round."""
+    rss_before: float = peak_rss_mb()
+    start: float = time.perf_counter()
+    fx()
+    elapsed: float = time.perf_counter() - start
+    number: int = max(1, math.ceil(min_seconds / elapsed)) if elapsed > 0 else 1
+    seconds: list[float] = [t / number for t in timeit.repeat(fx, number=number, repeat=repeat)]
+    rss_after: float = peak_rss_mb()
+    return StageTimings(
+        tokens=num_tokens,
+        number=number,
+        seconds=seconds,
+        peak_rss_mb=rss_after,
+        stage_rss_mb=rss_after - rss_before,
+    )
+
+
+def summarize(timings: list[StageTimings]) -> BenchmarkResult:
+    """Median over all rounds of all processes (RSS is the maximum)."""
+    seconds: float = statistics.median(t for x in timings for t in x.seconds)
+    num_tokens: int = timings[0].tokens
+    return BenchmarkResult(
+        tokens=num_tokens,
+        seconds=round(seconds, 6),
+        tokens_per_sec=round(num_tokens / seconds, 1) if seconds > 0 else 0.0,
+        number=max(x.number for x in timings),
+        peak_rss_mb=round(max(x.peak_rss_mb for x in timings), 1),
+        stage_rss_mb=round(max(x.stage_rss_mb for x in timings), 1),
+    )
+
+
+def dummy_tag(document: stanza.Document) -> stanza.Document:
+    for word in document.iter_words():
+        word.lemma, word.upos, word.xpos = word.text.lower(), 'NN', 'NN.UTR.SIN.IND.NOM'
+    return document
+
+
+class SparvOnlyTagger(ITagger):
+    """Stand-in tagger for machines without Stanza models: Sparv tokenization and dummy tags."""
+
+    def __init__(self, preprocessors: list[Callable[[str], str]]):
+        super().__init__(preprocessors=preprocessors)
+        self.tokenizer: BetterSparvTokenizer = BetterSparvTokenizer({'no_ssplit': True})
+        self.converter: StanzaTagger = create_converter()
+
+    def _tag(self, text: list[str]) -> list[TaggedDocument]:
+        return [self._to_dict(dummy_tag(self.tokenizer.process(t))) for t in text]
+
+    def _to_dict(self, tagged_document: stanza.Document) -> TaggedDocument:
+        return self.converter._to_dict(tagged_document)  # pylint: disable=protected-access
+
+
+def create_converter() -> StanzaTagger:
+    """A StanzaTagger without a pipeline, only used for `_to_dict`."""
+    converter: StanzaTagger = object.__new__(StanzaTagger)
+    converter.word_or_token, converter.ssplit = 'words', False
+    return converter
+
+
+def tagger_name() -> str:
+    stanza_datadir: str = os.environ.get("STANZA_DATADIR")
+    return "stanza" if stanza_datadir and isdir(stanza_datadir) else "sparv-only"
+
+
+def create_tagger(preprocessors: list[Callable[[str], str]]) -> ITagger:
+    if tagger_name() == "stanza":
+        factory: StanzaTaggerFactory = StanzaTaggerFactory.factory(
+            stanza_datadir=os.environ["STANZA_DATADIR"], preprocessors=PREPROCESSORS, use_gpu=False, num_threads=1
+        )
+        tagger: StanzaTagger = factory.create_tagger()
+        tagger.preprocessors = preprocessors
+        return tagger
+    return SparvOnlyTagger(preprocessors)
+
+
+class Workload:
+    """Input of the benchmarks. Only what a benchmark needs is created (in the benchmark's process)."""
+
+    def __init__(self, folder: str, corpus_repeat: int):
+        self.folder: str = folder
+        self.corpus_repeat: int = corpus_repeat
+        self.filenames: list[str] = sorted(glob(jj(SOURCE_FOLDER, "prot-*.xml")))
+        self.protocols: list[interface.Protocol] = [parse.ProtocolMapper.parse(f) for f in self.filenames]
+        self.source_texts: list[str] = [u.text for p in self.protocols for u in p.utterances if u.text] * corpus_repeat
+        self.num_words: int = sum(len(t.split()) for t in self.source_texts)
+        self.dehyphen: CachedDehyphenator = CachedDehyphenator.create(
+            data_folder=folder, word_frequencies=WORD_FREQUENCIES
+        )
+        self.preprocessors: list[Callable[[str], str]] = create_text_preprocessors(
+            pipeline=PREPROCESSORS, fxs_tasks={'dehyphen': self.dehyphen}
+        )
+
+    @cached_property
+    def texts(self) -> list[str]:
+        return [self.dehyphen(t) for t in self.source_texts]
+
+    @cached_property
+    def tokenizer(self) -> BetterSparvTokenizer:
+        return BetterSparvTokenizer({'no_ssplit': True})
+
+    @cached_property
+    def documents(self) -> list[stanza.Document]:
+        return [dummy_tag(self.tokenizer.process(t)) for t in self.texts]
+
+    @cached_property
+    def tagger(self) -> ITagger:
+        return create_tagger(self.preprocessors)
+
+    @cached_property
+    def tagged(self) -> list[interface.Protocol]:
+        tagged: list[interface.Protocol] = []
+        for protocol in [parse.ProtocolMapper.parse(f) for f in self.filenames]:
+            protocol.preprocess(self.tagger.preprocess)
+            for u in protocol.utterances:
+                u.annotation = self.tagger.to_csv(self.tagger.tag(u.text, preprocess=False)[0])
+            if protocol.has_text:
+                tagged.append(protocol)
+        return tagged
+
+    @cached_property
+    def tagged_tokens(self) -> int:
+        return sum(len(u.annotation.split('\n')) - 1 for p in self.tagged for u in p.utterances)
+
+    def stage(self, name: str) -> tuple[Callable[[], Any], int]:
+        """Return benchmark function and number of tokens of benchmark `name`."""
+        if name.startswith("preprocess:"):
+            fx: Callable[[str], str] = self.preprocessors[PREPROCESSORS.split(",").index(name.split(":")[1])]
+            return (lambda: [fx(t) for t in self.source_texts]), self.num_words
+
+        if name == "tokenize":
+            return (lambda: [self.tokenizer.process(t) for t in self.texts]), sum(d.num_tokens for d in self.documents)
+
+        if name == "to_dict":
+            to_dict: Callable = create_converter()._to_dict  # pylint: disable=protected-access
+            return (lambda: [to_dict(d) for d in self.documents]), sum(d.num_tokens for d in self.documents)
+
+        if name.startswith("store:"):
+            storage_format: str = name.split(":")[1]
+
+            def store() -> None:
+                for _ in range(self.corpus_repeat):
+                    for p in self.tagged:
+                        filename: str = jj(self.folder, f"{p.name}.{storage_format}.zip")
+                        storage.store_protocol(filename, p, checksum="x", storage_format=storage_format)
+
+            return store, self.tagged_tokens * self.corpus_repeat
+
+        if name == "tag_protocol_xml":
+
+            def tag_all() -> None:
+                for filename in self.filenames:
+                    target: str = jj(self.folder, "tagged", os.path.basename(filename).replace(".xml", ".zip"))
+                    tag_protocol_xml(filename, target, self.tagger, force=True, storage_format="json")
+
+            return tag_all, self.tagged_tokens
+
+        raise ValueError(f"unknown benchmark {name}")
+
+
+def run_stage(name: str, repeat: int, corpus_repeat: int, min_seconds: float) -> StageTimings:
+    """Set up and measure benchmark `name` (in a process of its own, see `run`)."""
+    with tempfile.TemporaryDirectory() as folder:
+        fx, num_tokens = Workload(folder, corpus_repeat).stage(name)
+        return measure(fx, num_tokens, repeat=repeat, min_seconds=min_seconds)
+
+
+def run(repeat: int = 3, corpus_repeat: int = 20, min_seconds: float = 1.0, processes: int = 3) -> dict[str, Any]:
+    """Measure each benchmark in `processes` fresh processes (one at a time), `repeat` rounds in each."""
+    results: dict[str, dict[str, Any]] = {}
+    context = multiprocessing.get_context("spawn")
+    for name in STAGES:
+        timings: list[StageTimings] = []
+        for _ in range(processes):
+            with context.Pool(1) as pool:
+                timings.append(pool.apply(run_stage, (name, repeat, corpus_repeat, min_seconds)))
+        results[name] = asdict(summarize(timings))
+
+    return {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'tagger': tagger_name(),
+        'corpus_repeat': corpus_repeat,
+        'min_seconds': min_seconds,
+        'results': results,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> dict[str, dict[str, Any]]:
+    """Compare throughput to `baseline`. Return ratio per benchmark (and whether it is a regression).
+    Raise ValueError if `baseline` was run with another tagger, corpus size or on another platform."""
+    mismatches: list[str] = [
+        f"{key} {baseline.get(key)!r} != {current.get(key)!r}"
+        for key in METADATA_KEYS
+        if baseline.get(key) != current.get(key)
+    ]
+    if mismatches:
+        raise ValueError(f"baseline not comparable: {', '.join(mismatches)}")
+
+    comparison: dict[str, dict[str, Any]] = {}
+    for name, result in current['results'].items():
+        reference: dict = baseline.get('results', {}).get(name)
+        if not reference or not reference.get('tokens_per_sec'):
+            continue
+        ratio: float = result['tokens_per_sec'] / reference['tokens_per_sec']
+        comparison[name] = {'ratio': round(ratio, 3), 'regression': ratio < 1.0 - tolerance}
+    return comparison
+
+
+@click.command()
+@click.option('--repeat', type=int, default=3, help='Timing rounds per process (median of all is kept)')
+@click.option('--processes', type=int, default=3, help='Number of fresh processes each benchmark is run in')
+@click.option('--corpus-repeat', type=int, default=20, help='Number of times the fake corpus is repeated')
+@click.option('--min-seconds', type=float, default=1.0, help='Minimum duration of a timing round')
+@click.option('--output', type=str, default=None, help='Write results JSON to this file')
+@click.option('--baseline', type=str, default=BASELINE_FILENAME, help='Baseline results to compare to')
+@click.option('--tolerance', type=float, default=0.2, help='Allowed relative throughput decrease')
+@click.option('--update-baseline', is_flag=True, default=False, help='Store results as new baseline')
+def main(
+    repeat: int,
+    processes: int,
+    corpus_repeat: int,
+    min_seconds: float,
+    output: str,
+    baseline: str,
+    tolerance: float,
+    update_baseline: bool,
+) -> None:
+    results: dict[str, Any] = run(
+        repeat=repeat, corpus_repeat=corpus_repeat, min_seconds=min_seconds, processes=processes
+    )
+    error: str = None
+
+    if isfile(baseline) and not update_baseline:
+        with open(baseline, encoding="utf-8") as fp:
+            try:
+                results['comparison'] = compare(results, json.load(fp), tolerance)
+            except ValueError as ex:
+                error = f"{ex} (store a new baseline with --update-baseline)"
+
+    data: str = json.dumps(results, indent=2)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as fp:
+            fp.write(data)
+
+    if update_baseline:
+        with open(baseline, "w", encoding="utf-8") as fp:
+            fp.write(data)
+
+    print(data)
+
+    if error:
+        raise click.ClickException(error)
+
+    if any(c['regression'] for c in results.get('comparison', {}).values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,74 @@
+"""Cold-start (import time) benchmark of the lightweight entry points.
+
+    python -m tests.benchmark_imports [--repeat N] [--scale FACTOR]
+
+Each module is imported in a fresh interpreter, best of `repeat` runs is kept. An entry point fails if its
+import time exceeds its budget (times `scale`, for slow machines) or if it imports the tagger stack
+(`HEAVY_MODULES`), which should only be loaded by code that actually tags. Exits with status 1 on failure.
+"""
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+import click
+
+# Budgets (seconds). `tag_info` and `tagging` import `pyriksprot`, which imports pandas.
+ENTRY_POINTS: dict[str, float] = {
+    'pyriksprot_tagger': 0.5,
+    'pyriksprot_tagger.utility': 0.5,
+    'pyriksprot_tagger.file_index': 0.5,
+    'pyriksprot_tagger.scripts.tag_info': 2.5,
+    'pyriksprot_tagger.tagging': 2.5,
+}
+
+HEAVY_MODULES: list[str] = ['torch', 'stanza']
+
+PROBE: str = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def cold_start(module: str) -> dict:
+    """Import `module` in a new interpreter. Return import time and loaded heavy modules."""
+    output: str = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat: int = 3, scale: float = 1.0) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+    for module, budget in ENTRY_POINTS.items():
+        probes: list[dict] = [cold_start(module) for _ in range(repeat)]
+        seconds: float = min(p['seconds'] for p in probes)
+        heavy: list[str] = probes[0]['heavy']
+        results[module] = {
+            'seconds': round(seconds, 3),
+            'budget': budget * scale,
+            'heavy': heavy,
+            'failed': seconds > budget * scale or bool(heavy),
+        }
+    return results
+
+
+@click.command()
+@click.option('--repeat', type=int, default=3, help='Number of cold starts per entry point (best is kept)')
+@click.option('--scale', type=float, default=1.0, help='Multiply budgets by this factor')
+def main(repeat: int, scale: float) -> None:
+    results: dict[str, dict] = run(repeat=repeat, scale=scale)
+    print(json.dumps(results, indent=2))
+    if any(r['failed'] for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
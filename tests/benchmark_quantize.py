@@ -0,0 +1,84 @@
+"""Accuracy and speed of int8 dynamic quantization (see `pyriksprot_tagger.taggers.quantize`).
+
+    python -m tests.benchmark_quantize [--corpus-repeat N] [--min-agreement A] [--output results.json]
+
+Tags the utterances of the protocols in `tests/test_data/fakes` with the fp32 Stanza models (CPU, models in
+STANZA_DATADIR) and with the quantized models, and reports token-level agreement (lemma, pos and xpos) and
+speed-up. Exits with status 1 if agreement is below `min_agreement`, i.e. if the `quantize: int8` tagger
+option would refuse to activate for this threshold.
+"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from glob import glob
+from os.path import isdir
+from typing import Any
+
+import click
+from pyriksprot import interface
+from pyriksprot.corpus.parlaclarin import parse
+from pyriksprot_tagger.dehyphen import CachedDehyphenator
+from pyriksprot_tagger.taggers import quantize
+from pyriksprot_tagger.taggers.stanza_tagger import StanzaTagger, StanzaTaggerFactory
+from pyriksprot_tagger.utility import create_text_preprocessors
+
+from .benchmark import PREPROCESSORS, SOURCE_FOLDER, WORD_FREQUENCIES
+
+
+def run(corpus_repeat: int = 5, mode: str = 'int8', min_agreement: float = quantize.DEFAULT_MIN_AGREEMENT) -> dict:
+    stanza_datadir: str = os.environ.get("STANZA_DATADIR")
+    if not stanza_datadir or not isdir(stanza_datadir):
+        raise click.ClickException("STANZA_DATADIR must point to the Stanza models")
+
+    protocols: list[interface.Protocol] = [
+        parse.ProtocolMapper.parse(f) for f in sorted(glob(os.path.join(SOURCE_FOLDER, "prot-*.xml")))
+    ]
+    texts: list[str] = [u.text for p in protocols for u in p.utterances if u.text] * corpus_repeat
+
+    with tempfile.TemporaryDirectory() as folder:
+        dehyphen: CachedDehyphenator = CachedDehyphenator.create(data_folder=folder, word_frequencies=WORD_FREQUENCIES)
+        tagger: StanzaTagger = StanzaTaggerFactory.factory(
+            stanza_datadir=stanza_datadir, preprocessors=PREPROCESSORS, use_gpu=False
+        ).create_tagger()
+        tagger.preprocessors = create_text_preprocessors(pipeline=PREPROCESSORS, fxs_tasks={'dehyphen': dehyphen})
+
+        report: quantize.QuantizationReport = quantize.compare_quantized(
+            tagger.nlp, tagger.tag, texts, mode=mode, min_agreement=min_agreement
+        )
+
+    return {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'processor': platform.processor() or platform.machine(),
+        'corpus_repeat': corpus_repeat,
+        'texts': len(texts),
+    } | report.to_dict()
+
+
+@click.command()
+@click.option('--corpus-repeat', type=int, default=5, help='Number of times the fake corpus is repeated')
+@click.option('--mode', type=click.Choice(list(quantize.QUANTIZE_MODES)), default='int8', help='Quantization')
+@click.option('--min-agreement', type=float, default=quantize.DEFAULT_MIN_AGREEMENT, help='Agreement threshold')
+@click.option('--output', type=str, default=None, help='Write results JSON to this file')
+def main(corpus_repeat: int, mode: str, min_agreement: float, output: str) -> None:
+    results: dict[str, Any] = run(corpus_repeat=corpus_repeat, mode=mode, min_agreement=min_agreement)
+
+    data: str = json.dumps(results, indent=2)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as fp:
+            fp.write(data)
+
+    print(data)
+
+    if not results['activated']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
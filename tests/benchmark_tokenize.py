@@ -0,0 +1,56 @@
+"""Micro-benchmark of the `tokenize_sparv` variant: per-token cost of creating Stanza documents.
+
+    python -m tests.benchmark_tokenize [protocol.xml ...]
+
+Compares `BetterSparvTokenizer.create_document_from_dicts` (one CoNLL-U dict per token, the previous
+implementation) with `BetterSparvTokenizer.create_document` on the utterances of real protocols. Defaults
+to the sample protocols in `RIKSPROT_SAMPLE_DATA_FOLDER` (falls back to the fake test protocols).
+"""
+import sys
+import timeit
+from glob import glob
+from os.path import join as jj
+from typing import Callable
+
+from pyriksprot.corpus.parlaclarin import parse
+from pyriksprot.foss import sparv_tokenize
+from pyriksprot_tagger.taggers.stanza_tagger import BetterSparvTokenizer
+
+SAMPLE_PROTOCOLS: str = jj("tests", "output", "work_folder", "riksdagen-corpus", "corpus", "protocols", "**", "*.xml")
+FAKE_PROTOCOLS: str = jj("tests", "test_data", "fakes", "v0.9.0", "parlaclarin", "protocols", "*.xml")
+
+
+def load_texts(filenames: list[str]) -> list[str]:
+    return [u.text for filename in filenames for u in parse.ProtocolMapper.parse(filename).utterances if u.text]
+
+
+def best_of(fx: Callable[[], None], number: int = 5, repeat: int = 7) -> float:
+    return min(timeit.repeat(fx, number=number, repeat=repeat)) / number
+
+
+def main(filenames: list[str]) -> None:
+    filenames = filenames or sorted(glob(SAMPLE_PROTOCOLS, recursive=True)) or sorted(glob(FAKE_PROTOCOLS))
+    texts: list[str] = load_texts(filenames)
+
+    tokenize = sparv_tokenize.SegmenterRepository.create_tokenize(sentenize=True, return_spans=True)
+    spans: list[list[list[tuple[str, int, int]]]] = [[list(s) for s in tokenize(text)] for text in texts]
+    num_tokens: int = sum(len(s) for sentences in spans for s in sentences)
+
+    def tokenize_only():
+        for text in texts:
+            list(list(s) for s in tokenize(text))
+
+    def create(fx: Callable) -> Callable[[], None]:
+        return lambda: [fx(text, sentences) for text, sentences in zip(texts, spans)]
+
+    print(f"{len(filenames)} protocols, {len(texts)} utterances, {num_tokens} tokens")
+    for name, fx in [
+        ("sparv tokenize", tokenize_only),
+        ("create document (dicts)", create(BetterSparvTokenizer.create_document_from_dicts)),
+        ("create document (fast)", create(BetterSparvTokenizer.create_document)),
+    ]:
+        print(f"{name:<26} {best_of(fx) / num_tokens * 1e9:8.0f} ns/token")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
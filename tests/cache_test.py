@@ -0,0 +1,159 @@
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+import stanza
+from pyriksprot_tagger.taggers.cache import Deduplicator, LemmaTable, TaggedDocumentCache, config_fingerprint
+from pyriksprot_tagger.taggers.stanza_tagger import BetterSparvTokenizer, CachedLemmatizer
+
+
+def fake_tag(texts: list[str]) -> list[dict]:
+    return [dict(token=t.split(), lemma=t.lower().split(), pos=[], xpos=[]) for t in texts]
+
+
+def test_cache_tags_only_misses():
+    with tempfile.TemporaryDirectory() as folder:
+        cache: TaggedDocumentCache = TaggedDocumentCache(os.path.join(folder, "cache.db"), fingerprint="x")
+        calls: list[list[str]] = []
+
+        def tag(texts: list[str]) -> list[dict]:
+            calls.append(texts)
+            return fake_tag(texts)
+
+        assert cache.tag(["Herr talman!", "Jag yrkar bifall."], tag) == fake_tag(["Herr talman!", "Jag yrkar bifall."])
+        assert cache.tag(["Herr talman!", "Nej"], tag) == fake_tag(["Herr talman!", "Nej"])
+
+        assert calls == [["Herr talman!", "Jag yrkar bifall."], ["Nej"]]
+        assert (cache.hits, cache.misses) == (1, 3)
+        cache.close()
+
+
+def test_cache_survives_reopen_but_not_fingerprint_change():
+    with tempfile.TemporaryDirectory() as folder:
+        filename: str = os.path.join(folder, "cache.db")
+
+        TaggedDocumentCache(filename, fingerprint="a").put_many(["Herr talman!"], fake_tag(["Herr talman!"]))
+
+        assert TaggedDocumentCache(filename, fingerprint="a").get_many(["Herr talman!"]) == fake_tag(["Herr talman!"])
+        assert TaggedDocumentCache(filename, fingerprint="b").get_many(["Herr talman!"]) == [None]
+
+
+def test_cache_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as folder:
+        cache: TaggedDocumentCache = TaggedDocumentCache(os.path.join(folder, "cache.db"), max_items=2)
+
+        cache.put_many(["a"], fake_tag(["a"]))
+        cache.put_many(["b"], fake_tag(["b"]))
+        cache.get_many(["a"])
+        cache.put_many(["c"], fake_tag(["c"]))
+
+        assert cache.get_many(["a", "b", "c"]) == [fake_tag(["a"])[0], None, fake_tag(["c"])[0]]
+
+
+def test_config_fingerprint_is_stable():
+    assert config_fingerprint({'a': 1, 'b': [1, 2]}, str.strip) == config_fingerprint({'b': [1, 2], 'a': 1}, str.strip)
+    assert config_fingerprint({'a': 1}) != config_fingerprint({'a': 2})
+
+
+def test_lemma_table_grows_across_runs_but_not_across_models():
+    with tempfile.TemporaryDirectory() as folder:
+        filename: str = os.path.join(folder, "lemmas.db")
+
+        table: LemmaTable = LemmaTable(filename, fingerprint="a")
+        assert not table.get_many([("talmannen", "NN")])
+        table.put_many({("talmannen", "NN"): "talman", ("yrkar", "VB"): "yrka"})
+        table.close()
+
+        table = LemmaTable(filename, fingerprint="a")
+        assert table.get_many([("talmannen", "NN"), ("yrkar", "NN")]) == {("talmannen", "NN"): "talman"}
+        assert (table.hits, table.misses, len(table)) == (1, 1, 2)
+        table.close()
+
+        table = LemmaTable(filename, fingerprint="b")
+        assert not table.get_many([("talmannen", "NN")]) and len(table) == 0
+        table.close()
+
+
+def test_cached_lemmatizer_lemmatizes_only_unseen_pairs():
+    def fake_lemmatize(pairs: list[tuple[str, str]]) -> list[str]:
+        return [word.lower() for word, _ in pairs]
+
+    with tempfile.TemporaryDirectory() as folder:
+        config: dict = {'model_path': "lemma.pt", 'cache_filename': os.path.join(folder, "lemmas.db"), 'device': "cpu"}
+        with patch("pyriksprot_tagger.taggers.stanza_tagger.LemmaTrainer", MagicMock(return_value=MagicMock(args={}))):
+            lemmatizer: CachedLemmatizer = CachedLemmatizer(config)
+        lemmatizer.lemmatize = MagicMock(side_effect=fake_lemmatize)
+
+        tokenizer: BetterSparvTokenizer = BetterSparvTokenizer({'no_ssplit': True})
+        documents: list[stanza.Document] = [tokenizer.process("Herr talman! Herr"), tokenizer.process("Herr Ove")]
+        for word in (w for d in documents for w in d.iter_words()):
+            word.upos = "NN"
+
+        lemmatizer.bulk_process(documents)
+
+        assert [w.lemma for d in documents for w in d.iter_words()] == ["herr", "talman", "!", "herr", "herr", "ove"]
+        assert lemmatizer.lemmatize.call_args.args[0] == [("Herr", "NN"), ("talman", "NN"), ("!", "NN"), ("Ove", "NN")]
+
+        document: stanza.Document = tokenizer.process("Herr Ove talman")
+        for word in document.iter_words():
+            word.upos = "NN"
+
+        lemmatizer.process(document)
+        assert lemmatizer.lemmatize.call_count == 1
+        lemmatizer.table.close()
+
+
+def test_cached_lemmatizer_bypasses_table_until_quantization_is_settled():
+    def fake_lemmatize(pairs: list[tuple[str, str]]) -> list[str]:
+        return [word.lower() for word, _ in pairs]
+
+    with tempfile.TemporaryDirectory() as folder:
+        config: dict = {'model_path': "lemma.pt", 'cache_filename': os.path.join(folder, "lemmas.db"), 'device': "cpu"}
+        with patch("pyriksprot_tagger.taggers.stanza_tagger.LemmaTrainer", MagicMock(return_value=MagicMock(args={}))):
+            lemmatizer: CachedLemmatizer = CachedLemmatizer(config | {'quantize': 'int8'})
+        lemmatizer.lemmatize = MagicMock(side_effect=fake_lemmatize)
+
+        document: stanza.Document = BetterSparvTokenizer({'no_ssplit': True}).process("Herr talman")
+        for word in document.iter_words():
+            word.upos = "NN"
+
+        # calibration: every call is lemmatized by the model
+        lemmatizer.process(document)
+        lemmatizer.process(document)
+        assert lemmatizer.table is None and lemmatizer.lemmatize.call_count == 2
+
+        lemmatizer.open_table('int8').put_many({("Herr", "NN"): "herr"})
+        lemmatizer.table.close()
+
+        # lemmas of the quantized model are not used by the fp32 model
+        with patch("pyriksprot_tagger.taggers.stanza_tagger.LemmaTrainer", MagicMock(return_value=MagicMock(args={}))):
+            fp32_lemmatizer: CachedLemmatizer = CachedLemmatizer(config)
+        assert not fp32_lemmatizer.table.get_many([("Herr", "NN")])
+        fp32_lemmatizer.table.close()
+
+
+def test_deduplicator_tags_each_distinct_text_once():
+    dedup: Deduplicator = Deduplicator(max_items=10, max_length=20)
+    calls: list[list[str]] = []
+
+    def tag(texts: list[str]) -> list[dict]:
+        calls.append(texts)
+        return fake_tag(texts)
+
+    chair: str = "Herr talman !"
+    speech: str = "Jag yrkar bifall till reservationen i dess helhet ."
+    texts: list[str] = [chair, speech, chair, "Ja", chair]
+
+    documents: list[dict] = dedup.tag(texts, tag)
+
+    assert calls == [[chair, speech, "Ja"]]
+    assert documents == fake_tag(texts)
+    assert documents[0] is documents[2] is documents[4]
+    assert dedup.batch_hits == 2 and dedup.run_hits == 0
+
+    documents = dedup.tag([speech, chair, "Nej"], tag)
+
+    assert calls[1] == [speech, "Nej"]
+    assert documents == fake_tag([speech, chair, "Nej"])
+    assert dedup.run_hits == 1 and dedup.hits == 3 and dedup.texts == 8
+    assert dedup.stats()['hit_rate'] == 0.375
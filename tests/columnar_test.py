@@ -0,0 +1,116 @@
+import pickle
+
+import numpy as np
+import pytest
+import stanza
+from pyriksprot import ITagger
+from pyriksprot_tagger.taggers.columnar import ColumnarTaggedDocument, Vocabularies, Vocabulary
+from pyriksprot_tagger.taggers.stanza_tagger import SENTENCE_MARKER, StanzaTagger
+
+DOCUMENT: dict = dict(
+    token=['Herr', 'talman', '!'],
+    lemma=['herr', 'talman', '!'],
+    pos=['NN', 'NN', 'MAD'],
+    xpos=['NN.UTR.SIN.IND.NOM', 'NN.UTR.SIN.IND.NOM', 'MAD'],
+    num_tokens=3,
+    num_words=3,
+)
+
+
+def test_columnar_document_round_trip():
+    vocabs: Vocabularies = Vocabularies()
+
+    document: ColumnarTaggedDocument = ColumnarTaggedDocument.encode(vocabs, DOCUMENT)
+
+    assert document == DOCUMENT
+    assert document.ids('token').dtype == np.int32
+    assert document.ids('pos').dtype == np.uint8
+    assert document.ids('pos').tolist() == [0, 0, 1]
+    assert pickle.loads(pickle.dumps(document)) == DOCUMENT
+
+
+def test_vocabularies_are_shared_between_documents():
+    vocabs: Vocabularies = Vocabularies()
+
+    first = ColumnarTaggedDocument.encode(vocabs, DOCUMENT)
+    second = ColumnarTaggedDocument.encode(vocabs, dict(DOCUMENT, token=['Fru', 'talman', '!']))
+
+    assert first.ids('token').tolist() == [0, 1, 2]
+    assert second.ids('token').tolist() == [3, 1, 2]
+    assert len(vocabs['lemma']) == 3
+
+
+def test_small_vocabulary_widens_dtype_when_full():
+    vocab: Vocabulary = Vocabulary(np.uint8)
+    ids: np.ndarray = vocab.encode(str(i) for i in range(300))
+    assert ids.dtype == np.uint16
+    assert vocab.decode(ids) == [str(i) for i in range(300)]
+
+
+def test_small_vocabulary_widens_dtype_more_than_one_step():
+    vocab: Vocabulary = Vocabulary(np.uint8)
+    ids: np.ndarray = vocab.encode([str(i) for i in range(70_000)])
+    assert ids.dtype == np.int64
+    assert ids[-1] == 69_999
+
+
+def test_columnar_document_does_not_keep_decoded_columns():
+    document: ColumnarTaggedDocument = ColumnarTaggedDocument.encode(Vocabularies(), DOCUMENT)
+
+    assert document['token'] == DOCUMENT['token']
+    assert document['token'] is not document['token']
+    assert document.to_csv() == ITagger.to_csv(DOCUMENT)
+
+    empty: dict = dict(DOCUMENT, token=[], lemma=[], pos=[], xpos=[])
+    assert ColumnarTaggedDocument.encode(Vocabularies(), empty).to_csv() == ITagger.to_csv(empty)
+
+
+def _converter(ssplit: bool) -> StanzaTagger:
+    converter: StanzaTagger = object.__new__(StanzaTagger)
+    converter.word_or_token, converter.ssplit, converter.vocabs = 'words', ssplit, Vocabularies()
+    return converter
+
+
+def _stanza_document() -> stanza.Document:
+    sentences: list[list[tuple[str, str, str]]] = [
+        [("Herr", "herr", "NN"), ("talman", "talman", "NN"), ("!", "!", "MAD")],
+        [("Jag", "jag", "PN"), ("yrkar", "yrka", "VB")],
+    ]
+    return stanza.Document(
+        [
+            [dict(id=i + 1, text=text, lemma=lemma, upos=pos, xpos=pos) for i, (text, lemma, pos) in enumerate(s)]
+            for s in sentences
+        ]
+    )
+
+
+@pytest.mark.parametrize("ssplit,add_sentence_marker", [(False, False), (True, False), (True, True)])
+def test_to_columnar_equals_to_dict(ssplit: bool, add_sentence_marker: bool):
+    converter: StanzaTagger = _converter(ssplit)
+    document: stanza.Document = _stanza_document()
+
+    expected: dict = converter._to_dict(document, add_sentence_marker=add_sentence_marker)
+    columnar: ColumnarTaggedDocument = converter._to_columnar(document, add_sentence_marker=add_sentence_marker)
+
+    assert columnar.to_dict() == expected
+    assert StanzaTagger.to_csv(columnar) == ITagger.to_csv(expected)
+
+    if add_sentence_marker:
+        assert expected['token'] == ["Herr", "talman", "!", SENTENCE_MARKER, "Jag", "yrkar", SENTENCE_MARKER]
+        assert expected['lemma'][3] == SENTENCE_MARKER and expected['pos'][3] == 'MAD'
+        assert 'sentence_id' not in expected
+    else:
+        assert expected['token'] == ["Herr", "talman", "!", "Jag", "yrkar"]
+        assert expected.get('sentence_id') == ([0, 0, 0, 1, 1] if ssplit else None)
+
+
+def test_to_columnar_widens_dtype_within_a_document():
+    converter: StanzaTagger = _converter(False)
+    document: stanza.Document = stanza.Document(
+        [[dict(id=i + 1, text=f"w{i}", lemma=f"w{i}", upos=f"P{i}", xpos="NN") for i in range(300)]]
+    )
+
+    columnar: ColumnarTaggedDocument = converter._to_columnar(document)
+
+    assert columnar.columns['pos'].dtype == np.uint16 and columnar.columns['xpos'].dtype == np.uint8
+    assert columnar.to_dict() == converter._to_dict(document)
@@ -0,0 +1,152 @@
+import gzip
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+from pyriksprot import interface
+from pyriksprot_tagger import cwb, storage
+
+
+def _annotation(rows: list[tuple[str, str, str, str]]) -> str:
+    return "token\tlemma\tpos\txpos\n" + "\n".join("\t".join(row) for row in rows)
+
+
+def _protocol(name: str) -> interface.Protocol:
+    utterances: list[interface.Utterance] = [
+        interface.Utterance(u_id="u1", who="alice", next_id="u2", paragraphs=["Herr talman !"], page_number=1),
+        interface.Utterance(u_id="u2", who="alice", prev_id="u1", paragraphs=["Jag yrkar. Tack."], page_number=1),
+        interface.Utterance(u_id="u3", who="bob", paragraphs=["A & B"], page_number=2),
+    ]
+    utterances[0].annotation = _annotation([("Herr", "herr", "NN", "NN"), ("talman", "talman", "NN", "NN")])
+    utterances[1].annotation = _annotation(
+        [
+            ("Jag", "jag", "PN", "PN"),
+            ("yrkar", "yrka", "VB", "VB"),
+            (".", ".", "MAD", "MAD"),
+            ("Tack", "tack", "IN", "IN"),
+        ]
+    )
+    utterances[2].annotation = _annotation([("A", "a", "NN", "NN"), ("&", "&", "MID", "MID"), ("B", "b", "NN", "NN")])
+    return interface.Protocol(
+        date=f"{name[5:9]}-01-01", name=name, utterances=utterances, speaker_notes={}, page_references=[]
+    )
+
+
+def test_sentences_of_uses_sentence_id_marker_or_mad():
+    rows = {'token': ['a', 'b', 'c'], 'lemma': ['a', 'b', 'c'], 'pos': ['X', 'MAD', 'X'], 'xpos': ['X', 'MAD', 'X']}
+
+    assert [len(s) for s in cwb.sentences_of(rows)] == [2, 1]
+    assert [len(s) for s in cwb.sentences_of(rows | {'sentence_id': ['0', '0', '0']})] == [3]
+    marked = {k: v[:1] + [cwb.SENTENCE_MARKER] + v[1:] for k, v in rows.items()}
+    assert [len(s) for s in cwb.sentences_of(marked)] == [1, 1, 1]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_corpus_to_vrt(processes: int):
+    with tempfile.TemporaryDirectory() as folder:
+        for year, storage_format in [("1958", "json"), ("1959", "parquet")]:
+            os.makedirs(os.path.join(folder, "tagged", year))
+            name: str = f"prot-{year}-fk-1"
+            filename: str = os.path.join(folder, "tagged", year, f"{name}.zip")
+            storage.store_protocol(filename, _protocol(name), checksum="x", storage_format=storage_format)
+
+        results = cwb.corpus_to_vrt(os.path.join(folder, "tagged"), os.path.join(folder, "vrt"), processes=processes)
+
+        assert [(r.protocols, r.speeches, r.sentences, r.tokens) for r in results] == [(1, 2, 4, 9)] * 2
+
+        with gzip.open(os.path.join(folder, "vrt", "1958.vrt.gz"), "rt", encoding="utf-8") as fp:
+            json_vrt: str = fp.read()
+        with gzip.open(os.path.join(folder, "vrt", "1959.vrt.gz"), "rt", encoding="utf-8") as fp:
+            parquet_vrt: str = fp.read()
+
+    lines: list[str] = json_vrt.splitlines()
+    assert lines[0] == '<text id="1958" year="1958">'
+    assert lines[1] == '<protocol title="prot-1958-fk-1" date="1958-01-01">'
+    assert lines[2].startswith('<speech id="u1" who="alice"')
+    assert lines[3:6] == ['<s>', 'Herr\therr\tNN\tNN', 'talman\ttalman\tNN\tNN']
+    assert '&amp;\t&amp;\tMID\tMID' in lines
+    assert lines[-3:] == ['</speech>', '</protocol>', '</text>']
+    assert parquet_vrt == json_vrt.replace("1958", "1959")
+
+
+def test_df_to_vrt():
+    df = pd.DataFrame({'token': ['A', '<'], 'lemma': ['a', '<'], 'pos': ['NN', 'MID']})
+
+    assert cwb.df_to_vrt(df) == 'A\ta\tNN\n&lt;\t&lt;\tMID\n'
+
+
+def _read_ints(filename: str) -> list[int]:
+    return np.fromfile(filename, dtype='>i4').tolist()
+
+
+def test_write_positional_matches_cwb_file_layout():
+    with tempfile.TemporaryDirectory() as folder:
+        cwb.write_positional(folder, "word", ["b", "a"], np.array([0, 1, 0], dtype=np.int32))
+
+        with open(os.path.join(folder, "word.lexicon"), "rb") as fp:
+            assert fp.read() == b"b\0a\0"
+        with open(os.path.join(folder, "word.corpus"), "rb") as fp:
+            assert fp.read() == b"\0\0\0\0\0\0\0\x01\0\0\0\0"
+
+        assert _read_ints(os.path.join(folder, "word.lexicon.idx")) == [0, 2]
+        assert _read_ints(os.path.join(folder, "word.lexicon.srt")) == [1, 0]
+        assert _read_ints(os.path.join(folder, "word.corpus.cnt")) == [2, 1]
+        assert _read_ints(os.path.join(folder, "word.corpus.rev")) == [0, 2, 1]
+        assert _read_ints(os.path.join(folder, "word.corpus.rdx")) == [0, 2]
+
+
+def test_int_stream_grows_and_truncates():
+    with tempfile.TemporaryDirectory() as folder:
+        filename: str = os.path.join(folder, "word.corpus")
+        stream: cwb.IntStream = cwb.IntStream(filename, capacity=2)
+        for values in [[1], [2, 3, 4], [], [5, 6, 7, 8, 9]]:
+            stream.extend(values)
+        stream.close()
+
+        assert _read_ints(filename) == list(range(1, 10))
+
+
+REFERENCE_FOLDER: str = os.path.join("tests", "test_data", "cwb")
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_corpus_to_cwb_equals_cwb_encode(processes: int):
+    # Reference corpus is encoded by cwb-encode and cwb-makeall, see tests/test_data/cwb/encode.sh
+    with tempfile.TemporaryDirectory() as folder:
+        for year, storage_format in [("1958", "json"), ("1959", "parquet")]:
+            os.makedirs(os.path.join(folder, "tagged", year))
+            name: str = f"prot-{year}-fk-1"
+            filename: str = os.path.join(folder, "tagged", year, f"{name}.zip")
+            storage.store_protocol(filename, _protocol(name), checksum="x", storage_format=storage_format)
+
+        cwb.corpus_to_vrt(os.path.join(folder, "tagged"), os.path.join(folder, "vrt"))
+        vrt: str = ""
+        for year in ["1958", "1959"]:
+            with gzip.open(os.path.join(folder, "vrt", f"{year}.vrt.gz"), "rt", encoding="utf-8") as fp:
+                vrt += fp.read()
+        with open(os.path.join(REFERENCE_FOLDER, "riksprot.vrt"), encoding="utf-8") as fp:
+            assert vrt == fp.read()
+
+        data_folder: str = os.path.join(folder, "data")
+        corpus_size: int = cwb.corpus_to_cwb(
+            os.path.join(folder, "tagged"),
+            data_folder,
+            registry_folder=os.path.join(folder, "registry"),
+            processes=processes,
+        )
+
+        assert corpus_size == 18
+
+        reference_files: list[str] = sorted(os.listdir(os.path.join(REFERENCE_FOLDER, "data")))
+        assert reference_files == sorted(f for f in os.listdir(data_folder) if f != ".info")
+        for basename in reference_files:
+            with open(os.path.join(REFERENCE_FOLDER, "data", basename), "rb") as fp:
+                expected: bytes = fp.read()
+            with open(os.path.join(data_folder, basename), "rb") as fp:
+                assert fp.read() == expected, basename
+
+        with open(os.path.join(folder, "registry", "riksprot"), encoding="utf-8") as fp:
+            registry: str = fp.read()
+        assert "ATTRIBUTE lemma" in registry and "STRUCTURE speech_who" in registry
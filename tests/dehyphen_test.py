@@ -0,0 +1,130 @@
+import os
+import pickle
+import tempfile
+
+from pyriksprot import SwedishDehyphenator
+from pyriksprot_tagger.dehyphen import CachedDehyphenator
+from pyriksprot_tagger.frequency_index import FrequencyIndex, convert_frequencies, index_filename
+from pyriksprot_tagger.utility import preprocess_texts
+
+WORD_FREQUENCIES: dict[str, int] = {
+    'socialdemokratiska': 10,
+    'social-demokratiska': 1,
+    'riksdags-mannen': 5,
+    'riksdagsmannen': 2,
+    'herr': 100,
+}
+
+TEXTS: list[str] = [
+    "Det social-\ndemokratiska partiet och herr riksdags-\nmannen.",
+    "Det social- demokratiska partiet.\n\n\n\nNytt stycke med social- och kulturfrågor.",
+    "Text utan avstavning.",
+    "Ett helt okänt- ord och EU-frågor och 1970-talet.",
+]
+
+
+def _dehyphenator(folder: str) -> SwedishDehyphenator:
+    return SwedishDehyphenator(data_folder=folder, word_frequencies=dict(WORD_FREQUENCIES))
+
+
+def test_cached_dehyphenator_equals_swedish_dehyphenator():
+    with tempfile.TemporaryDirectory() as folder:
+        expected: list[str] = [_dehyphenator(folder).dehyphen_text(t) for t in TEXTS]
+
+        dehyphen: CachedDehyphenator = CachedDehyphenator(_dehyphenator(folder), cache_size=16)
+
+        assert [dehyphen(t) for t in TEXTS] == expected
+        assert dehyphen(TEXTS) == expected
+        assert "socialdemokratiska" in expected[0]
+        assert "riksdags-mannen" in expected[0]
+
+        info = dehyphen.cache_info()
+        assert info.hits > 0
+        assert info.currsize <= 16
+
+
+def test_preprocess_texts_uses_batch():
+    with tempfile.TemporaryDirectory() as folder:
+        dehyphen: CachedDehyphenator = CachedDehyphenator(_dehyphenator(folder))
+
+        texts: list[str] = preprocess_texts([str.strip, dehyphen, str.upper], ["  social- demokratiska  "])
+
+        assert texts == ["SOCIALDEMOKRATISKA"]
+
+
+def test_frequency_index_lookup():
+    with tempfile.TemporaryDirectory() as folder:
+        tf_filename: str = os.path.join(folder, "word-frequencies.pkl")
+        frequencies: dict[str, int] = WORD_FREQUENCIES | {'åtta': 8, 'ö': 3, 'a': 1}
+        with open(tf_filename, 'wb') as fp:
+            pickle.dump(frequencies, fp)
+
+        index: FrequencyIndex = FrequencyIndex(convert_frequencies(tf_filename))
+
+        assert os.path.isfile(index_filename(tf_filename))
+        assert len(index) == len(frequencies)
+        assert set(index) == set(frequencies)
+        assert all(index.get(w) == c and index[w] == c for w, c in frequencies.items())
+        assert index.get('okänt', 0) == 0 and 'okänt' not in index and 'b' not in index
+        index.close()
+
+
+def test_cached_dehyphenator_with_memory_mapped_frequencies():
+    with tempfile.TemporaryDirectory() as folder:
+        expected: list[str] = [_dehyphenator(folder).dehyphen_text(t) for t in TEXTS]
+        with open(os.path.join(folder, "word-frequencies.pkl"), 'wb') as fp:
+            pickle.dump(WORD_FREQUENCIES, fp)
+
+        tf_filename: str = os.path.join(folder, "word-frequencies.pkl")
+        with open(tf_filename, 'wb') as fp:
+            pickle.dump(WORD_FREQUENCIES, fp)
+
+        # No index next to the pickle: unpickled frequencies are used and no index is written
+        dehyphen: CachedDehyphenator = CachedDehyphenator.create(
+            data_folder=folder, word_frequencies="word-frequencies.pkl", memmap_frequencies=True
+        )
+
+        assert not isinstance(dehyphen.dehyphenator.word_frequencies, FrequencyIndex)
+        assert not os.path.isfile(index_filename(tf_filename))
+        assert dehyphen(TEXTS) == expected
+
+        # Index in a configured location is created if missing
+        filename: str = os.path.join(folder, "index", "word-frequencies.pkl.idx")
+        dehyphen = CachedDehyphenator.create(
+            data_folder=folder,
+            word_frequencies="word-frequencies.pkl",
+            memmap_frequencies=True,
+            frequency_index=filename,
+        )
+
+        assert isinstance(dehyphen.dehyphenator.word_frequencies, FrequencyIndex)
+        assert os.path.isfile(filename)
+        assert dehyphen(TEXTS) == expected
+
+        # Index next to the pickle (built by the `word_frequency` rule) is used
+        convert_frequencies(tf_filename)
+        dehyphen = CachedDehyphenator.create(
+            data_folder=folder, word_frequencies="word-frequencies.pkl", memmap_frequencies=True
+        )
+
+        assert dehyphen.dehyphenator.word_frequencies.filename == index_filename(tf_filename)
+        assert dehyphen(TEXTS) == expected
+
+
+def test_cached_dehyphenator_falls_back_if_index_not_writable():
+    with tempfile.TemporaryDirectory() as folder:
+        expected: list[str] = [_dehyphenator(folder).dehyphen_text(t) for t in TEXTS]
+        with open(os.path.join(folder, "word-frequencies.pkl"), 'wb') as fp:
+            pickle.dump(WORD_FREQUENCIES, fp)
+        with open(os.path.join(folder, "not-a-folder"), 'w') as fp:
+            fp.write("")
+
+        dehyphen: CachedDehyphenator = CachedDehyphenator.create(
+            data_folder=folder,
+            word_frequencies="word-frequencies.pkl",
+            memmap_frequencies=True,
+            frequency_index=os.path.join(folder, "not-a-folder", "word-frequencies.pkl.idx"),
+        )
+
+        assert not isinstance(dehyphen.dehyphenator.word_frequencies, FrequencyIndex)
+        assert dehyphen(TEXTS) == expected
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import tempfile
+from os.path import join as jj
+
+import pygit2
+from pyriksprot.utility import read_yaml
+from pyriksprot_tagger.delta import VERSION_FILENAME, protocol_delta, read_version_tag, write_version_file
+
+
+def _write(folder: str, filename: str, text: str):
+    path: str = jj(folder, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf8") as fp:
+        fp.write(text)
+
+
+def _commit_and_tag(repository: pygit2.Repository, tag: str):
+    repository.index.add_all()
+    repository.index.write()
+    tree = repository.index.write_tree()
+    signature = pygit2.Signature("test", "test@example.com")
+    parents = [] if repository.head_is_unborn else [repository.head.target]
+    commit = repository.create_commit("HEAD", signature, signature, tag, tree, parents)
+    repository.references.create(f"refs/tags/{tag}", commit)
+
+
+def test_protocol_delta_between_tags():
+    with tempfile.TemporaryDirectory() as folder:
+        repository: pygit2.Repository = pygit2.init_repository(folder)
+        protocols: str = jj(folder, "corpus", "protocols")
+
+        _write(protocols, "1958/prot-1958-a.xml", "a")
+        _write(protocols, "1958/prot-1958-b.xml", "b")
+        _write(protocols, "1960/prot-1960-c.xml", "c")
+        _write(folder, "corpus/metadata/person.csv", "x")
+        _commit_and_tag(repository, "v1")
+
+        _write(protocols, "1958/prot-1958-a.xml", "a modified")
+        os.remove(jj(protocols, "1960", "prot-1960-c.xml"))
+        _write(protocols, "1960/prot-1960-d.xml", "d")
+        _write(folder, "corpus/metadata/person.csv", "y")
+        _commit_and_tag(repository, "v2")
+
+        delta = protocol_delta(protocols, "v1", "v2")
+
+        assert sorted(os.path.relpath(f, protocols) for f in delta.updated) == [
+            jj("1958", "prot-1958-a.xml"),
+            jj("1960", "prot-1960-d.xml"),
+        ]
+        assert [os.path.relpath(f, protocols) for f in delta.deleted] == [jj("1960", "prot-1960-c.xml")]
+
+        assert protocol_delta(protocols, "v0", "v2") is None
+
+        # pattern is relative to the source folder (e.g. a year filter), as in `glob_source_files`
+        delta = protocol_delta(protocols, "v1", "v2", pattern="1960*/prot-*.xml")
+
+        assert [os.path.relpath(f, protocols) for f in delta.updated] == [jj("1960", "prot-1960-d.xml")]
+        assert [os.path.relpath(f, protocols) for f in delta.deleted] == [jj("1960", "prot-1960-c.xml")]
+        assert not protocol_delta(protocols, "v1", "v2", pattern="prot-*.xml")
+
+
+def test_read_version_tag():
+    with tempfile.TemporaryDirectory() as folder:
+        os.makedirs(jj(folder, "1958"))
+        _write(folder, "version.yml", "tag: v0.9.0\nsha: abc\n")
+
+        assert read_version_tag(folder) == "v0.9.0"
+        assert read_version_tag(jj(folder, "1958")) == "v0.9.0"
+        assert read_version_tag(jj(folder, "1958"), levels=0) is None
+
+
+def test_protocol_delta_fetches_missing_tag_in_shallow_clone():
+    with tempfile.TemporaryDirectory() as folder:
+        origin: str = jj(folder, "origin")
+        repository: pygit2.Repository = pygit2.init_repository(origin)
+        _write(origin, "corpus/protocols/1958/prot-1958-a.xml", "a")
+        _commit_and_tag(repository, "v1")
+        _write(origin, "corpus/protocols/1958/prot-1958-a.xml", "a modified")
+        _commit_and_tag(repository, "v2")
+
+        clone: str = jj(folder, "clone")
+        subprocess.run(
+            ["git", "clone", "--quiet", "--depth", "1", "--branch", "v2", f"file://{origin}", clone],
+            check=True,
+            capture_output=True,
+        )
+        protocols: str = jj(clone, "corpus", "protocols")
+
+        assert protocol_delta(protocols, "v1") is None
+
+        delta = protocol_delta(protocols, "v1", fetch=True)
+
+        assert [os.path.relpath(f, protocols) for f in delta.updated] == [jj("1958", "prot-1958-a.xml")]
+
+        target_folder: str = jj(folder, "tagged")
+        write_version_file(protocols, target_folder)
+
+        assert read_yaml(jj(target_folder, VERSION_FILENAME))["tag"] == "v2"
+        assert read_version_tag(target_folder, levels=0) == "v2"
@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+from pyriksprot_tagger.file_index import FileIndex
+
+BASENAMES: list[str] = ['prot-1936--ak--8', 'prot-1961--ak--5', 'prot-1961--fk--6', 'prot-198687--11']
+
+
+def _touch(folder: str, basename: str, extension: str = "xml") -> None:
+    year: str = basename.split("-")[1]
+    os.makedirs(os.path.join(folder, year), exist_ok=True)
+    with open(os.path.join(folder, year, f"{basename}.{extension}"), 'w', encoding='utf8') as fp:
+        fp.write('')
+
+
+def test_file_index_filters_years():
+    with tempfile.TemporaryDirectory() as folder:
+        source_folder: str = os.path.join(folder, "protocols")
+        for basename in BASENAMES:
+            _touch(source_folder, basename)
+        _touch(source_folder, "prot-1961--ak--5", "zip")
+        os.makedirs(os.path.join(source_folder, "metadata"))
+
+        index: FileIndex = FileIndex(source_folder, "xml", filename=os.path.join(folder, "index.json")).refresh()
+
+        assert index.basenames() == (['1936', '1961', '1961', '198687'], BASENAMES)
+        assert index.basenames(1961) == (['1961', '1961'], BASENAMES[1:3])
+        assert index.basenames([1936, 1986]) == (['1936', '198687'], [BASENAMES[0], BASENAMES[3]])
+        assert index.files(1936) == [os.path.join(source_folder, "1936", "prot-1936--ak--8.xml")]
+
+
+def test_file_index_rescans_only_changed_folders():
+    with tempfile.TemporaryDirectory() as folder:
+        source_folder: str = os.path.join(folder, "protocols")
+        filename: str = os.path.join(folder, "index.json")
+        for basename in BASENAMES:
+            _touch(source_folder, basename)
+
+        assert FileIndex(source_folder, "xml", filename=filename).refresh().rescanned == 3
+
+        index: FileIndex = FileIndex(source_folder, "xml", filename=filename).refresh()
+        assert index.rescanned == 0 and index.basenames()[1] == BASENAMES
+
+        _touch(source_folder, "prot-1961--ak--6")
+        os.remove(os.path.join(source_folder, "1936", "prot-1936--ak--8.xml"))
+
+        index = FileIndex(source_folder, "xml", filename=filename).refresh()
+        assert index.rescanned == 2
+        assert index.basenames() == (
+            ['1961', '1961', '1961', '198687'],
+            ['prot-1961--ak--5', 'prot-1961--ak--6', 'prot-1961--fk--6', 'prot-198687--11'],
+        )
+
+        _touch(source_folder, "prot-200405--7")
+
+        index = FileIndex(source_folder, "xml", filename=filename).refresh()
+        assert index.rescanned == 1 and index.basenames(2004) == (['200405'], ['prot-200405--7'])
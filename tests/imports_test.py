@@ -0,0 +1,19 @@
+import pytest
+
+from tests.benchmark_imports import ENTRY_POINTS, cold_start
+
+
+@pytest.mark.parametrize("module", list(ENTRY_POINTS))
+def test_entry_point_does_not_import_tagger_stack(module: str):
+    assert cold_start(module)['heavy'] == []
+
+
+def test_tagger_stack_is_imported_on_first_use():
+    import pyriksprot_tagger  # pylint: disable=import-outside-toplevel
+    from pyriksprot_tagger.taggers import stanza_tagger  # pylint: disable=import-outside-toplevel
+
+    assert pyriksprot_tagger.StanzaTagger is stanza_tagger.StanzaTagger
+    assert pyriksprot_tagger.taggers.tagger_factory is stanza_tagger.tagger_factory
+
+    with pytest.raises(AttributeError):
+        _ = pyriksprot_tagger.NoSuchTagger
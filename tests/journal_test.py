@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import tempfile
+from glob import glob
+from typing import Any
+
+from pyriksprot import ITagger, TaggedDocument
+from pyriksprot_tagger.journal import DONE, EMPTY, JOURNAL_FILENAME, RunJournal
+from pyriksprot_tagger.tagging import tag_protocols_pooled
+
+SOURCE_FOLDER: str = "tests/test_data/fakes/v0.9.0/parlaclarin/protocols"
+PATTERN: str = "prot-*.xml"
+
+
+class CountingTagger(ITagger):
+    def __init__(self):
+        super().__init__(preprocessors=[str.strip])
+        self.calls: int = 0
+
+    def _tag(self, text: list[str]) -> list[TaggedDocument]:
+        self.calls += 1
+        return [self._to_dict(t) for t in text]
+
+    def _to_dict(self, tagged_document: Any) -> TaggedDocument:
+        tokens: list[str] = tagged_document.split()
+        return dict(token=tokens, lemma=[t.lower() for t in tokens], pos=['X'] * len(tokens), xpos=['X'] * len(tokens))
+
+
+def _tag(target_folder: str, fingerprint: str = "a") -> CountingTagger:
+    tagger: CountingTagger = CountingTagger()
+    journal: RunJournal = RunJournal.create(target_folder, fingerprint=fingerprint)
+    tag_protocols_pooled(
+        tagger=tagger,
+        source_folder=SOURCE_FOLDER,
+        target_folder=target_folder,
+        force=False,
+        pattern=PATTERN,
+        journal=journal,
+    )
+    journal.close()
+    return tagger
+
+
+def _statuses(target_folder: str) -> list[str]:
+    with sqlite3.connect(os.path.join(target_folder, JOURNAL_FILENAME)) as db:
+        return [status for (status,) in db.execute("select status from entries order by id")]
+
+
+def test_journal_skips_verified_protocols_on_restart():
+    num_files: int = len(glob(os.path.join(SOURCE_FOLDER, PATTERN)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        assert _tag(folder).calls > 0
+
+        statuses: list[str] = _statuses(folder)
+        assert len(statuses) == num_files and set(statuses) <= {DONE, EMPTY}
+        assert not glob(os.path.join(folder, ".*.zip"))
+
+        assert _tag(folder).calls == 0
+        assert len(_statuses(folder)) == num_files
+
+
+def test_journal_retags_truncated_output_and_changed_fingerprint():
+    with tempfile.TemporaryDirectory() as folder:
+        _tag(folder)
+
+        journal: RunJournal = RunJournal.create(folder, fingerprint="a")
+        entry = next(e for e in journal.entries.values() if e.status == DONE)
+        journal.close()
+
+        with open(entry.target_file, 'r+b') as fp:
+            fp.truncate(entry.output_size // 2)
+
+        assert _tag(folder).calls == 1
+
+        journal = RunJournal.create(folder, fingerprint="a")
+        assert journal.is_done(entry.source_file, entry.target_file)
+        assert journal.entries[entry.source_file].output_hash == entry.output_hash
+        journal.close()
+
+        journal = RunJournal.create(folder, fingerprint="b")
+        assert not journal.entries and not journal.is_done(entry.source_file, entry.target_file)
+        journal.close()
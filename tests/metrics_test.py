@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+from typing import Any
+
+from pyriksprot import ITagger, TaggedDocument
+from pyriksprot_tagger.metrics import MetricsCollector, TimedPreprocessor, set_collector, to_prometheus
+from pyriksprot_tagger.tagging import tag_protocols_pooled
+
+SOURCE_FOLDER: str = "tests/test_data/fakes/v0.9.0/parlaclarin/protocols"
+
+
+class SplitTagger(ITagger):
+    def __init__(self):
+        super().__init__(preprocessors=[TimedPreprocessor(str.strip, "strip")])
+
+    def _tag(self, text: list[str]) -> list[TaggedDocument]:
+        return [self._to_dict(t) for t in text]
+
+    def _to_dict(self, tagged_document: Any) -> TaggedDocument:
+        tokens: list[str] = tagged_document.split()
+        return dict(
+            token=tokens, lemma=tokens, pos=['X'] * len(tokens), xpos=['X'] * len(tokens), num_tokens=len(tokens)
+        )
+
+
+def _events(filename: str) -> list[dict]:
+    with open(filename, encoding="utf-8") as fp:
+        return [json.loads(line) for line in fp]
+
+
+def test_disabled_collector_records_nothing():
+    metrics: MetricsCollector = MetricsCollector(enabled=False)
+
+    with metrics.stage("parse") as timer:
+        timer.tokens = 10
+
+    assert not metrics.stages
+
+
+def test_collector_writes_jsonl_and_prometheus():
+    with tempfile.TemporaryDirectory() as folder:
+        jsonl_filename: str = os.path.join(folder, "metrics.jsonl")
+        prometheus_filename: str = os.path.join(folder, "metrics.prom")
+        metrics: MetricsCollector = MetricsCollector(jsonl_filename, prometheus_filename)
+
+        with metrics.stage("tokenize", items=2) as timer:
+            timer.tokens = 5
+        metrics.timed(lambda x: x, "pos", tokens=len)([1, 2, 3])
+        metrics.protocol(name="prot-1", utterances=2, tokens=8, size=100, seconds=0.1)
+        metrics.close()
+
+        events: list[dict] = _events(jsonl_filename)
+        with open(prometheus_filename, encoding="utf-8") as fp:
+            prometheus: str = fp.read()
+
+    assert [e['event'] for e in events] == ["protocol", "stages"]
+    assert events[0]['bytes'] == 100
+    assert events[1]['stages']['tokenize']['items'] == 2 and events[1]['stages']['tokenize']['tokens'] == 5
+    assert events[1]['stages']['pos']['tokens'] == 3
+    assert 'riksprot_tagger_stage_tokens_total{stage="tokenize"} 5' in prometheus
+    assert "riksprot_tagger_protocols_total 1" in prometheus
+    assert prometheus == to_prometheus(events[1])
+
+
+def test_tagging_records_stages_and_protocols():
+    with tempfile.TemporaryDirectory() as folder:
+        jsonl_filename: str = os.path.join(folder, "metrics.jsonl")
+        metrics: MetricsCollector = MetricsCollector(jsonl_filename)
+        previous: MetricsCollector = set_collector(metrics)
+        try:
+            tag_protocols_pooled(
+                tagger=SplitTagger(),
+                source_folder=SOURCE_FOLDER,
+                target_folder=os.path.join(folder, "tagged"),
+                force=True,
+                pattern="prot-*.xml",
+                pool_size=1,
+            )
+        finally:
+            set_collector(previous)
+        metrics.close()
+
+        events: list[dict] = _events(jsonl_filename)
+
+    protocols: list[dict] = [e for e in events if e['event'] == "protocol"]
+    stages: dict = events[-1]['stages']
+
+    assert protocols and all(e['bytes'] > 0 and e['tokens'] > 0 for e in protocols)
+    assert {"parse", "preprocess:strip", "tag", "store"} <= set(stages)
+    assert stages['tag']['tokens'] == sum(e['tokens'] for e in protocols)
+    assert stages['store']['calls'] == len(protocols)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+from glob import glob
+from typing import Any
+
+from pyriksprot import ITagger, ITaggerFactory, TaggedDocument
+from pyriksprot.corpus.tagged import persist
+from pyriksprot_tagger.metrics import MetricsCollector, set_collector
+from pyriksprot_tagger.pipeline import tag_protocols_staged
+from pyriksprot_tagger.tagging import tag_protocols_pooled
+
+SOURCE_FOLDER: str = "tests/test_data/fakes/v0.9.0/parlaclarin/protocols"
+PATTERN: str = "prot-*.xml"
+
+
+class UpperCaseTagger(ITagger):
+    def __init__(self):
+        super().__init__(preprocessors=[str.strip])
+
+    def _tag(self, text: list[str]) -> list[TaggedDocument]:
+        return [self._to_dict(t) for t in text]
+
+    def _to_dict(self, tagged_document: Any) -> TaggedDocument:
+        tokens: list[str] = tagged_document.split()
+        return dict(token=tokens, lemma=[t.upper() for t in tokens], pos=['X'] * len(tokens), xpos=['X'] * len(tokens))
+
+
+class UpperCaseTaggerFactory(ITaggerFactory):
+    def create(self) -> ITagger:
+        return UpperCaseTagger()
+
+    def create_preprocessor_tasks(self) -> list:
+        return [str.strip]
+
+
+def _annotations(folder: str) -> dict[str, list[str]]:
+    return {
+        os.path.basename(filename): [u.annotation for u in persist.load_protocol(filename).utterances]
+        for filename in sorted(glob(os.path.join(folder, "*.zip")))
+        if os.path.getsize(filename) > 0
+    }
+
+
+def test_staged_tagging_equals_pooled_tagging():
+    with tempfile.TemporaryDirectory() as folder:
+        pooled_folder: str = os.path.join(folder, "pooled")
+        staged_folder: str = os.path.join(folder, "staged")
+
+        tag_protocols_pooled(
+            tagger=UpperCaseTagger(),
+            source_folder=SOURCE_FOLDER,
+            target_folder=pooled_folder,
+            force=True,
+            pattern=PATTERN,
+            pool_size=2,
+        )
+
+        stats = tag_protocols_staged(
+            tagger=UpperCaseTagger(),
+            factory=UpperCaseTaggerFactory(),
+            source_folder=SOURCE_FOLDER,
+            target_folder=staged_folder,
+            force=True,
+            pattern=PATTERN,
+            pool_size=2,
+            processes=2,
+            queue_size=2,
+        )
+
+        assert _annotations(staged_folder) == _annotations(pooled_folder)
+        assert len(_annotations(staged_folder)) == 2
+        # every protocol passes parse, protocols with text pass tag and store
+        assert stats['parse'].items == len(glob(os.path.join(SOURCE_FOLDER, PATTERN)))
+        assert stats['tag'].items == stats['store'].items == len(_annotations(pooled_folder))
+        assert all(stage.busy > 0.0 for stage in stats.values())
+
+
+def test_staged_tagging_records_worker_stages():
+    metrics: MetricsCollector = MetricsCollector()
+    previous: MetricsCollector = set_collector(metrics)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            tag_protocols_staged(
+                tagger=UpperCaseTagger(),
+                factory=UpperCaseTaggerFactory(),
+                source_folder=SOURCE_FOLDER,
+                target_folder=folder,
+                force=True,
+                pattern=PATTERN,
+                processes=2,
+            )
+    finally:
+        set_collector(previous)
+
+    # parse is recorded in the (spawned) worker processes
+    assert metrics.stages['parse'].calls == len(glob(os.path.join(SOURCE_FOLDER, PATTERN)))
+    assert metrics.stages['store'].calls == 2
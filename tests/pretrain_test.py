@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+import numpy as np
+import torch
+from stanza.models.common.pretrain import PretrainedWordVocab
+
+from pyriksprot_tagger.taggers.pretrain import MemmapFoundationCache, is_converted, is_memory_mapped, sidecar_filenames
+
+
+def test_memmap_pretrain_loads_sidecars():
+    with tempfile.TemporaryDirectory() as folder:
+        filename: str = os.path.join(folder, "sv.pretrain.pt")
+        emb: np.ndarray = np.random.rand(6, 4).astype(np.float32)
+        torch.save({'vocab': PretrainedWordVocab(['a', 'b']).state_dict(), 'emb': emb}, filename)
+
+        pretrain = MemmapFoundationCache().load_pretrain(filename)
+
+        assert is_converted(filename)
+        assert all(os.path.isfile(f) for f in sidecar_filenames(filename))
+        assert isinstance(pretrain.emb, np.memmap)
+        assert np.array_equal(pretrain.emb, emb)
+        assert pretrain.vocab.unit2id('b') != pretrain.vocab.unit2id('a')
+
+        tensor: torch.Tensor = torch.from_numpy(pretrain.emb)
+        assert is_memory_mapped(tensor)
+        assert not is_memory_mapped(torch.from_numpy(emb))
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from pyriksprot_tagger.taggers import quantize
+
+
+class TinyTagger(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.emb = torch.nn.Embedding.from_pretrained(torch.rand(20, 8), freeze=True)
+        self.lstm = torch.nn.LSTM(8, 16, batch_first=True, bidirectional=True)
+        self.clf = torch.nn.Linear(32, 4)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.clf(self.lstm(self.emb(x))[0])
+
+
+def create_nlp() -> SimpleNamespace:
+    torch.manual_seed(0)
+    trainer = SimpleNamespace(model=TinyTagger().eval())
+    return SimpleNamespace(processors={'pos': SimpleNamespace(_trainer=trainer)})
+
+
+def create_tag(nlp: SimpleNamespace):
+    def tag(texts: list[str]) -> list[dict]:
+        documents: list[dict] = []
+        with torch.no_grad():
+            for text in texts:
+                ids: torch.Tensor = torch.tensor([[len(w) % 20 for w in text.split()]])
+                tags: list[str] = [str(t) for t in nlp.processors['pos']._trainer.model(ids).argmax(-1)[0].tolist()]
+                documents.append(dict(token=text.split(), lemma=text.lower().split(), pos=tags, xpos=tags))
+        return documents
+
+    return tag
+
+
+def test_quantize_module_shares_frozen_parameters():
+    model: TinyTagger = TinyTagger().eval()
+    quantized: torch.nn.Module = quantize.quantize_module(model)
+
+    assert quantized.emb.weight is model.emb.weight
+    assert isinstance(model.clf, torch.nn.Linear) and not isinstance(quantized.clf, torch.nn.Linear)
+
+    with pytest.raises(ValueError):
+        quantize.quantize_module(model, mode='int4')
+
+
+def test_token_agreement():
+    reference: list[dict] = [dict(lemma=['a', 'b', 'c', 'd'], pos=['X'] * 4, xpos=['Y'] * 4)]
+    candidate: list[dict] = [dict(lemma=['a', 'b', 'x', 'd'], pos=['X'] * 4, xpos=['Y'] * 3)]
+
+    assert quantize.token_agreement(reference, candidate) == dict(lemma=0.75, pos=1.0, xpos=0.75)
+
+
+def test_compare_quantized_activates_or_restores_models():
+    texts: list[str] = quantize.DEFAULT_CALIBRATION_TEXTS
+
+    nlp: SimpleNamespace = create_nlp()
+    original: torch.nn.Module = nlp.processors['pos']._trainer.model
+    report: quantize.QuantizationReport = quantize.compare_quantized(nlp, create_tag(nlp), texts, min_agreement=0.5)
+
+    assert report.activated
+    assert report.tokens == sum(len(t.split()) for t in texts)
+    assert nlp.processors['pos']._trainer.model is not original
+    assert set(report.to_dict()) >= {'agreement', 'speedup', 'activated'}
+
+    nlp = create_nlp()
+    original = nlp.processors['pos']._trainer.model
+    report = quantize.compare_quantized(nlp, create_tag(nlp), texts, min_agreement=1.01)
+
+    assert not report.activated
+    assert nlp.processors['pos']._trainer.model is original
@@ -0,0 +1,38 @@
+import os
+from glob import glob
+
+import pytest
+from pyriksprot_tagger.scheduler import Schedule, WorkerStats, longest_first, predict_makespan, utterance_count
+
+SOURCE_FOLDER: str = "tests/test_data/fakes/v0.9.0/parlaclarin/protocols"
+
+
+def test_predict_makespan_hands_out_to_first_idle_worker():
+    assert predict_makespan([10, 6, 5, 4, 3], 2) == 14
+    assert predict_makespan([10, 6, 5, 4, 3], 1) == 28
+    assert predict_makespan([], 4) == 0
+
+
+def test_longest_first():
+    files: list[str] = glob(os.path.join(SOURCE_FOLDER, "prot-*.xml"))
+
+    items: list[tuple[float, str]] = longest_first(files, 'size')
+    assert sorted(f for _, f in items) == sorted(files)
+    assert [c for c, _ in items] == sorted((os.path.getsize(f) for f in files), reverse=True)
+
+    items = longest_first(files, 'utterances')
+    assert all(c == utterance_count(f) for c, f in items)
+    assert max(c for c, _ in items) > 0
+
+    with pytest.raises(ValueError):
+        longest_first(files, 'words')
+
+
+def test_schedule_report():
+    schedule: Schedule = Schedule([(10, "a"), (6, "b"), (5, "c"), (4, "d"), (3, "e")], workers=2)
+
+    assert (schedule.total_cost, schedule.predicted_makespan, schedule.ideal_makespan) == (28, 14, 14)
+
+    report: dict = schedule.report([WorkerStats(2, 14, 7.0), WorkerStats(3, 14, 7.0)], elapsed=7.5)
+
+    assert report == dict(predicted=7.0, actual=7.0, elapsed=7.5)
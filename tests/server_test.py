@@ -0,0 +1,65 @@
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+import pytest
+
+from pyriksprot import ITagger, TaggedDocument
+from pyriksprot_tagger.server import TaggingClient, TaggingServer
+
+
+class UpperCaseTagger(ITagger):
+    def __init__(self):
+        super().__init__(preprocessors=[])
+        self.calls: list[list[str]] = []
+
+    def _tag(self, text: list[str]) -> list[TaggedDocument]:
+        self.calls.append(list(text))
+        return [self._to_dict(t) for t in text]
+
+    def _to_dict(self, tagged_document: Any) -> TaggedDocument:
+        tokens: list[str] = tagged_document.split()
+        return dict(token=tokens, lemma=[t.upper() for t in tokens], pos=['X'] * len(tokens), xpos=['X'] * len(tokens))
+
+
+def test_tagging_server_serves_many_clients():
+    with tempfile.TemporaryDirectory() as folder:
+        address: str = os.path.join(folder, "tagger.sock")
+        tagger: UpperCaseTagger = UpperCaseTagger()
+        server: TaggingServer = TaggingServer(tagger=tagger, address=address, max_wait=0.5)
+
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        deadline: float = time.monotonic() + 10.0
+        while not os.path.exists(address):
+            if time.monotonic() > deadline or not thread.is_alive():
+                pytest.fail(f"tagging server did not start listening on {address}")
+            time.sleep(0.01)
+
+        results: dict[int, list[TaggedDocument]] = {}
+        barrier: threading.Barrier = threading.Barrier(4, timeout=10)
+
+        def client_job(i: int):
+            client: TaggingClient = TaggingClient(address=address)
+            assert client.connection is not None
+            # send all requests at once, so that the server can merge them into a batch
+            barrier.wait()
+            results[i] = client.tag([f"hej {i}", "herr talman"], preprocess=False)
+            client.close()
+
+        clients = [threading.Thread(target=client_job, args=(i,)) for i in range(4)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+
+        server.shutdown()
+        thread.join(timeout=5)
+
+        assert all(results[i][0]['lemma'] == ['HEJ', str(i)] for i in range(4))
+        assert all(results[i][1]['token'] == ['herr', 'talman'] for i in range(4))
+        assert sum(len(c) for c in tagger.calls) == 8
+        assert len(tagger.calls) < 4
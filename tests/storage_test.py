@@ -0,0 +1,102 @@
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from pyriksprot import interface
+from pyriksprot.corpus.tagged import persist
+from pyriksprot_tagger import storage
+
+
+def _annotation(rows: list[tuple[str, str, str, str]]) -> str:
+    return "token\tlemma\tpos\txpos\n" + "\n".join("\t".join(row) for row in rows)
+
+
+def _protocol() -> interface.Protocol:
+    utterances: list[interface.Utterance] = [
+        interface.Utterance(
+            u_id="u1", who="alice", next_id="u2", paragraphs=["Herr talman !"], page_number=1, speaker_note_id="n1"
+        ),
+        interface.Utterance(
+            u_id="u2", who="alice", prev_id="u1", paragraphs=["Jag yrkar bifall ."], page_number=1, speaker_note_id="n1"
+        ),
+        interface.Utterance(u_id="u3", who="bob", paragraphs=["Tack ."], page_number=2, speaker_note_id="n2"),
+        interface.Utterance(u_id="u4", who="bob", paragraphs=[], page_number=2, speaker_note_id="n2"),
+    ]
+    utterances[0].annotation = _annotation(
+        [("Herr", "herr", "NN", "NN.UTR"), ("talman", "talman", "NN", "NN.UTR"), ("!", "!", "MID", "MID")]
+    )
+    utterances[1].annotation = _annotation(
+        [("Jag", "jag", "PN", "PN.UTR"), ("yrkar", "yrka", "VB", "VB.PRS"), ("bifall", "bifall", "NN", "NN.NEU")]
+        + [(".", ".", "MAD", "MAD")]
+    )
+    utterances[2].annotation = _annotation([("Tack", "tack", "IN", "IN"), (".", ".", "MAD", "MAD")])
+    for u in utterances:
+        u.num_tokens = u.num_words = len(storage.parse_annotation(u.annotation).get('token', []))
+    return interface.Protocol(
+        date="1958-01-01", name="prot-1958-fk-1", utterances=utterances, speaker_notes={}, page_references=[]
+    )
+
+
+def test_speech_groups_keeps_all_utterances_in_order():
+    groups = storage.speech_groups(_protocol().utterances)
+
+    assert [[u.u_id for u in g] for g in groups] == [["u1", "u2"], ["u3"], ["u4"]]
+
+
+def test_store_and_load_parquet_protocol():
+    protocol: interface.Protocol = _protocol()
+
+    with tempfile.TemporaryDirectory() as folder:
+        filename: str = os.path.join(folder, "prot-1958-fk-1.zip")
+
+        storage.store_protocol(filename, protocol=protocol, checksum="abc", storage_format="parquet")
+
+        with zipfile.ZipFile(filename) as fp:
+            assert set(fp.namelist()) == {"metadata.json", "prot-1958-fk-1.parquet"}
+
+        assert persist.validate_checksum(filename, "abc")
+        assert storage.validate_checksum(filename, "abc", "parquet")
+        assert not storage.validate_checksum(filename, "abc", "json")
+
+        table = storage.read_table(filename)
+        assert table.num_rows == 4
+        assert pq.ParquetFile(_parquet_reader(filename)).num_row_groups == 3
+
+        loaded: interface.Protocol = storage.load_protocol(filename)
+
+        assert loaded.name == protocol.name
+        assert [u.u_id for u in loaded.utterances] == ["u1", "u2", "u3", "u4"]
+        assert [u.annotation for u in loaded.utterances[:3]] == [u.annotation for u in protocol.utterances[:3]]
+        assert [u.paragraphs for u in loaded.utterances] == [u.paragraphs for u in protocol.utterances]
+        assert [u.num_tokens for u in loaded.utterances] == [3, 4, 2, 0]
+
+        frame: pd.DataFrame = storage.load_tagged_frame(filename, columns=["u_id", "token", "lemma", "pos"])
+
+        assert len(frame) == 9
+        assert frame.pos.dtype == "category"
+        assert frame.lemma.tolist()[:3] == ["herr", "talman", "!"]
+
+
+def _parquet_reader(filename: str) -> pa.BufferReader:
+    with zipfile.ZipFile(filename) as fp:
+        return pa.BufferReader(fp.read("prot-1958-fk-1.parquet"))
+
+
+def test_store_json_protocol_delegates_to_pyriksprot():
+    with tempfile.TemporaryDirectory() as folder:
+        filename: str = os.path.join(folder, "prot-1958-fk-1.zip")
+
+        storage.store_protocol(filename, protocol=_protocol(), checksum="abc", storage_format="json")
+
+        assert storage.validate_checksum(filename, "abc", "json")
+        assert not storage.validate_checksum(filename, "abc", "parquet")
+        assert [u.u_id for u in storage.load_protocol(filename).utterances] == ["u1", "u2", "u3", "u4"]
+
+
+def test_unknown_storage_format():
+    with pytest.raises(ValueError):
+        storage.storage_format_of("xml")
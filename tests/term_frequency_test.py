@@ -0,0 +1,52 @@
+import os
+import pickle
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from pyriksprot_tagger import term_frequency
+from pyriksprot_tagger.term_frequency import TermFrequencyStore, compute_term_frequencies_incremental
+
+FAKE_FOLDER: str = "tests/test_data/fake"
+
+
+def load_frequencies(filename: str) -> dict:
+    with open(filename, 'rb') as fp:
+        return pickle.load(fp)
+
+
+def test_term_frequencies_counts_only_changed_protocols():
+    with tempfile.TemporaryDirectory() as folder:
+        source_files: list[str] = []
+        for name in ["prot-1958-fake.xml", "prot-1960-fake.xml"]:
+            source_files.append(shutil.copy(os.path.join(FAKE_FOLDER, name), folder))
+        filename: str = os.path.join(folder, "word-frequencies.pkl")
+
+        assert compute_term_frequencies_incremental(source_files, filename) == 2
+        assert os.path.isfile(os.path.join(folder, "word-frequencies.db"))
+        frequencies: dict = load_frequencies(filename)
+        expected: dict = term_frequency.count_protocol_terms(source_files[0])
+        for term, count in term_frequency.count_protocol_terms(source_files[1]).items():
+            expected[term] = expected.get(term, 0) + count
+        assert dict(frequencies) == expected
+
+        with patch.object(term_frequency, 'count_protocol_terms', wraps=term_frequency.count_protocol_terms) as fx:
+            assert compute_term_frequencies_incremental(source_files, filename) == 0
+            os.utime(source_files[0], ns=(0, 0))
+            assert compute_term_frequencies_incremental(source_files, filename) == 0
+            assert fx.call_count == 0
+
+            with open(source_files[1], encoding="utf-8") as fp:
+                data: str = fp.read()
+            with open(source_files[1], "w", encoding="utf-8") as fp:
+                fp.write(data.replace("Jag talar.", "Jag talar zyxzyx.", 1))
+            assert compute_term_frequencies_incremental(source_files, filename) == 1
+            assert fx.call_count == 1
+
+        assert load_frequencies(filename)["zyxzyx"] == 1
+
+        assert compute_term_frequencies_incremental(source_files[:1], filename) == 1
+        store: TermFrequencyStore = TermFrequencyStore(os.path.join(folder, "word-frequencies.db"))
+        assert list(store.protocols()) == ["prot-1958-fake"]
+        assert dict(store.frequencies()) == term_frequency.count_protocol_terms(source_files[0])
+        store.close()
@@ -0,0 +1,18 @@
+#!/bin/bash
+# Re-create the reference CWB corpus in `data` (used by tests/cwb_test.py) from `riksprot.vrt` with the CWB
+# tools. `riksprot.vrt` is the VRT export of the test corpus in tests/cwb_test.py (all years concatenated).
+
+set -e
+
+cd "$(dirname "$0")"
+
+rm -rf data registry
+mkdir -p data registry
+
+cwb-encode -x -c utf8 -d data -f riksprot.vrt -R registry/riksprot \
+    -P lemma -P pos -P xpos \
+    -S text:0+id+year -S protocol:0+title+date -S speech:0+id+who+speaker_note_id+page_number -S s:0
+
+cwb-makeall -r registry -V RIKSPROT
+
+rm -rf registry
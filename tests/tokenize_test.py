@@ -0,0 +1,31 @@
+import pytest
+import stanza
+from pyriksprot_tagger.taggers.stanza_tagger import BetterSparvTokenizer
+
+TEXT: str = "Herr talman! Jag yrkar bifall till motionen. Tack."
+
+
+@pytest.mark.parametrize("no_ssplit", [True, False])
+def test_sparv_tokenizer_fast_path_equals_dict_documents(no_ssplit: bool):
+    tokenizer: BetterSparvTokenizer = BetterSparvTokenizer({'no_ssplit': no_ssplit})
+
+    document: stanza.Document = tokenizer.process(TEXT)
+
+    sentences: list = [list(tokenizer.tokenize(TEXT))] if no_ssplit else [list(s) for s in tokenizer.tokenize(TEXT)]
+    expected: stanza.Document = BetterSparvTokenizer.create_document_from_dicts(TEXT, sentences)
+
+    assert document.to_dict() == expected.to_dict()
+    assert [s.text for s in document.sentences] == [s.text for s in expected.sentences]
+    assert (document.num_tokens, document.num_words) == (expected.num_tokens, expected.num_words)
+    assert len(document.sentences) == (1 if no_ssplit else 3)
+
+    word = document.sentences[0].words[1]
+    assert word.parent.words == [word] and word.sent is document.sentences[0]
+
+
+def test_sparv_tokenizer_bulk_process():
+    tokenizer: BetterSparvTokenizer = BetterSparvTokenizer({'no_ssplit': True})
+
+    documents: list[stanza.Document] = tokenizer.bulk_process([stanza.Document([], text=t) for t in [TEXT, "", "Ja."]])
+
+    assert [d.num_tokens for d in documents] == [11, 0, 2]
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+from glob import glob
+from typing import Any
+
+import torch
+from pyriksprot import ITagger, TaggedDocument
+from pyriksprot.corpus.tagged import persist
+from pyriksprot_tagger.metrics import MetricsCollector, StageMetric, set_collector
+from pyriksprot_tagger.tagging import tag_protocols_pooled
+from pyriksprot_tagger.scheduler import Schedule
+from pyriksprot_tagger.workers import share_model_memory, tag_protocols_forked, torch_modules
+
+SOURCE_FOLDER: str = "tests/test_data/fakes/v0.9.0/parlaclarin/protocols"
+PATTERN: str = "prot-*.xml"
+
+
+class Pipeline:
+    def __init__(self):
+        self.processors: dict = {'pos': type("Trainer", (), {})()}
+        self.processors['pos'].model = torch.nn.Linear(4, 2)
+
+
+class ModelTagger(ITagger):
+    def __init__(self):
+        super().__init__(preprocessors=[str.strip])
+        self.nlp: Pipeline = Pipeline()
+
+    def _tag(self, text: list[str]) -> list[TaggedDocument]:
+        return [self._to_dict(t) for t in text]
+
+    def _to_dict(self, tagged_document: Any) -> TaggedDocument:
+        tokens: list[str] = tagged_document.split()
+        return dict(token=tokens, lemma=[t.lower() for t in tokens], pos=['X'] * len(tokens), xpos=['X'] * len(tokens))
+
+
+def _annotations(folder: str) -> dict[str, list[str]]:
+    return {
+        os.path.basename(filename): [u.annotation for u in persist.load_protocol(filename).utterances]
+        for filename in sorted(glob(os.path.join(folder, "*.zip")))
+        if os.path.getsize(filename) > 0
+    }
+
+
+def test_share_model_memory():
+    tagger: ModelTagger = ModelTagger()
+
+    assert list(torch_modules(tagger.nlp)) == [tagger.nlp.processors['pos'].model]
+    assert share_model_memory(tagger) == 1
+    assert tagger.nlp.processors['pos'].model.weight.is_shared()
+
+
+def test_forked_tagging_equals_pooled_tagging():
+    with tempfile.TemporaryDirectory() as folder:
+        pooled_folder: str = os.path.join(folder, "pooled")
+        forked_folder: str = os.path.join(folder, "forked")
+
+        tag_protocols_pooled(
+            tagger=ModelTagger(), source_folder=SOURCE_FOLDER, target_folder=pooled_folder, force=True, pattern=PATTERN
+        )
+        schedule: Schedule = tag_protocols_forked(
+            tagger=ModelTagger(),
+            source_folder=SOURCE_FOLDER,
+            target_folder=forked_folder,
+            force=True,
+            pattern=PATTERN,
+            workers=2,
+            threads=1,
+        )
+
+        assert len(schedule.items) == len(glob(os.path.join(SOURCE_FOLDER, PATTERN)))
+        assert _annotations(forked_folder) == _annotations(pooled_folder)
+        assert len(os.listdir(forked_folder)) == len(os.listdir(pooled_folder))
+
+
+def test_forked_workers_return_metrics_to_parent():
+    with tempfile.TemporaryDirectory() as folder:
+        jsonl_filename: str = os.path.join(folder, "metrics.jsonl")
+        metrics: MetricsCollector = MetricsCollector(jsonl_filename)
+        previous: MetricsCollector = set_collector(metrics)
+        try:
+            tag_protocols_forked(
+                tagger=ModelTagger(),
+                source_folder=SOURCE_FOLDER,
+                target_folder=os.path.join(folder, "tagged"),
+                force=True,
+                pattern=PATTERN,
+                workers=2,
+                threads=1,
+            )
+        finally:
+            set_collector(previous)
+
+        stages: dict[str, StageMetric] = dict(metrics.stages)
+        metrics.close()
+        with open(jsonl_filename, encoding="utf-8") as fp:
+            events: list[dict] = [json.loads(line) for line in fp]
+
+    protocols: list[dict] = [e for e in events if e['event'] == "protocol"]
+
+    # protocol events are written by the workers, stage totals are merged into the parent's collector
+    assert len(protocols) == metrics.protocols == stages['store'].calls == 2
+    assert stages['parse'].calls == len(glob(os.path.join(SOURCE_FOLDER, PATTERN)))
+    assert events[-1]['event'] == "stages" and events[-1]['stages']['store']['calls'] == 2